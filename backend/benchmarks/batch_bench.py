@@ -0,0 +1,65 @@
+"""/procesar-facturas (lotes) frente a una llamada a /procesar-factura por pedido.
+
+Reporta caracteres de prompt por factura (~4 caracteres por token) y el
+tiempo total del lote contra el modelo falso.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.batch_bench --orders 200 --batch-size 10
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+import main
+from benchmarks.sample_orders import FREE_TEXT
+from benchmarks.stub_model import StubModel
+
+
+async def run_single(client: httpx.AsyncClient, texts) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client.post("/procesar-factura", json={"texto_factura": t, "usar_cache": False}) for t in texts
+    ))
+    return time.perf_counter() - start
+
+
+async def run_batch(client: httpx.AsyncClient, texts, batch_size: int) -> float:
+    start = time.perf_counter()
+    r = await client.post("/procesar-facturas", json={"textos": texts, "tamano_lote": batch_size, "usar_cache": False})
+    r.raise_for_status()
+    assert all(item["ok"] for item in r.json()["resultados"])
+    return time.perf_counter() - start
+
+
+async def bench(args):
+    # Pedidos distintos en texto libre para que no entren por caché ni por reglas
+    texts = [f"{FREE_TEXT[i % len(FREE_TEXT)]} (pedido {i})" for i in range(args.orders)]
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for label, runner in (
+            ("uno por pedido", lambda: run_single(client, texts)),
+            (f"lotes de {args.batch_size}", lambda: run_batch(client, texts, args.batch_size)),
+        ):
+            main.model = StubModel(latency=args.latency, per_document_latency=args.per_document)
+            elapsed = await runner()
+            per_invoice = main.model.prompt_chars / args.orders
+            print(f"{label:<16} llamadas={main.model.calls:>4}  prompt/factura={per_invoice:7.0f} chars"
+                  f" (~{per_invoice / 4:5.0f} tokens)  tiempo={elapsed:6.2f}s")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=1.0, help="latencia base simulada por llamada (s)")
+    parser.add_argument("--per-document", type=float, default=0.1, help="latencia extra por documento (s)")
+    parser.add_argument("--concurrency", type=int, default=8, help="tamaño del semáforo de Gemini (cuota)")
+    args = parser.parse_args()
+    main.gemini_semaphore = asyncio.Semaphore(args.concurrency)
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main_cli()
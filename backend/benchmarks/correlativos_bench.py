@@ -0,0 +1,83 @@
+"""Benchmark del asignador de correlativos (correlativos.py) con varios procesos.
+
+Cada proceso simula un worker de uvicorn: pide números para la misma serie y
+devuelve los que obtuvo. Se verifica que no haya duplicados, se reporta el
+throughput total y, con --crash, se mata un proceso a mitad de camino para
+comprobar que su bloque pase a `huecos` y no se reasigne.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.correlativos_bench
+    python -m benchmarks.correlativos_bench --workers 8 --per-worker 20000 --bloque 1,50,500 --crash
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+from correlativos import CorrelativoAllocator
+
+RUC, SERIE = "20111945860", "F001"
+
+
+def worker(path: str, bloque: int, count: int, queue, liberar: bool):
+    allocator = CorrelativoAllocator(path, bloque=bloque)
+    numeros = [allocator.siguiente(RUC, SERIE) for _ in range(count)]
+    if liberar:
+        allocator.liberar()
+    queue.put(numeros)
+
+
+def crashing_worker(path: str, bloque: int, count: int):
+    allocator = CorrelativoAllocator(path, bloque=bloque)
+    for _ in range(count):
+        allocator.siguiente(RUC, SERIE)
+    os._exit(1)  # sin liberar: simula un worker caído
+
+
+def run(workers: int, per_worker: int, bloque: int, crash: bool):
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "correlativos.sqlite3")
+        CorrelativoAllocator(path, bloque=bloque)  # crea el esquema antes de medir
+
+        if crash:
+            p = ctx.Process(target=crashing_worker, args=(path, bloque, bloque // 2 + 1))
+            p.start()
+            p.join()
+
+        queue = ctx.Queue()
+        procs = [ctx.Process(target=worker, args=(path, bloque, per_worker, queue, True)) for _ in range(workers)]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        results = [queue.get() for _ in procs]
+        elapsed = time.perf_counter() - start
+        for p in procs:
+            p.join()
+
+        numeros = [n for r in results for n in r]
+        assert len(numeros) == len(set(numeros)), "números duplicados"
+        # Un proceso nuevo recupera el bloque del caído
+        auditor = CorrelativoAllocator(path, bloque=bloque)
+        huecos = auditor.huecos()
+        reservados = {n for h in huecos for n in range(h["desde"], h["hasta"] + 1)}
+        assert not reservados & set(numeros), "se reasignó un número de un hueco"
+        print(f"bloque={bloque:>4}  {len(numeros):>7} números en {elapsed:6.2f}s "
+              f"-> {len(numeros) / elapsed:>9.0f}/s (incluye arranque de procesos), "
+              f"máximo={max(numeros)}, huecos={[(h['desde'], h['hasta']) for h in huecos]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--per-worker", type=int, default=10000)
+    parser.add_argument("--bloque", default="1,50,500")
+    parser.add_argument("--crash", action="store_true")
+    args = parser.parse_args()
+    for bloque in (int(b) for b in args.bloque.split(",")):
+        run(args.workers, args.per_worker, bloque, args.crash)
+
+
+if __name__ == "__main__":
+    main()
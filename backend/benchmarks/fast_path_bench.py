@@ -0,0 +1,48 @@
+"""Latencia del extractor por reglas frente al camino LLM (modelo falso).
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.fast_path_bench --latency 1.5
+"""
+import argparse
+import asyncio
+import time
+
+import main
+from benchmarks.sample_orders import CORPUS
+from benchmarks.stub_model import StubModel
+from fast_extractor import fast_extract
+
+
+def bench_fast_path(text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fast_extract(text)
+    return (time.perf_counter() - start) / repeat
+
+
+async def bench_llm(text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await main.extract_invoice_data_async(text)
+    return (time.perf_counter() - start) / repeat
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=1.5, help="latencia simulada de Gemini (s)")
+    args = parser.parse_args()
+    main.model = StubModel(latency=args.latency)
+
+    print(f"{'pedido':<40} {'conf':>5} {'camino':>9} {'reglas':>10} {'LLM':>10}")
+    for text in CORPUS:
+        result = fast_extract(text)
+        path = "fast-path" if result.data and result.confidence >= main.FAST_PATH_MIN_CONFIDENCE else "llm"
+        fast = bench_fast_path(text, args.repeat)
+        llm = asyncio.run(bench_llm(text, 1))
+        label = text.splitlines()[0][:40]
+        print(f"{label:<40} {result.confidence:>5.2f} {path:>9} {fast * 1e6:>8.1f}µs {llm * 1e3:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main_cli()
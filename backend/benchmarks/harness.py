@@ -0,0 +1,124 @@
+"""Harness de carga: endpoints a concurrencia fija con p50/p95/p99, throughput y RSS pico.
+
+Por defecto corre en el mismo proceso (ASGI) con el modelo falso; con --url
+apunta a un servidor ya levantado (p. ej. benchmarks.serve_stub) y con
+--server-pid reporta también el RSS pico de ese proceso.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.harness --concurrency 1,8,32 --requests 200 --latency lognormal:-0.7,0.5
+    python -m benchmarks.harness --url http://127.0.0.1:8000 --server-pid 1234
+"""
+import argparse
+import asyncio
+import itertools
+import resource
+import statistics
+import time
+
+import httpx
+
+from benchmarks.sample_orders import FREE_TEXT
+from benchmarks.stub_model import CANNED_INVOICE, StubModel
+
+_counter = itertools.count()
+
+
+def _unique_text() -> str:
+    # Textos distintos en cada petición para que no los sirva la caché ni el extractor por reglas
+    i = next(_counter)
+    return f"{FREE_TEXT[i % len(FREE_TEXT)]} (pedido {i})"
+
+
+ENDPOINTS = {
+    "procesar-factura": lambda: ("/procesar-factura", {"texto_factura": _unique_text(), "usar_cache": False}),
+    "generar-pdf": lambda: ("/generar-pdf", CANNED_INVOICE),
+    "factura-pdf": lambda: ("/factura-pdf", {"texto_factura": _unique_text(), "usar_cache": False}),
+    "procesar-facturas": lambda: (
+        "/procesar-facturas",
+        {"textos": [_unique_text() for _ in range(10)], "usar_cache": False},
+    ),
+}
+
+
+def peak_rss_mb(pid: int = None) -> float:
+    if pid is None:
+        # En Linux ru_maxrss viene en KiB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+async def drive(client: httpx.AsyncClient, endpoint: str, concurrency: int, total: int) -> dict:
+    make_request = ENDPOINTS[endpoint]
+    latencies = []
+    errors = 0
+    remaining = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while next(remaining) < total:
+            path, payload = make_request()
+            start = time.perf_counter()
+            r = await client.post(path, json=payload)
+            latencies.append(time.perf_counter() - start)
+            if r.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "mean": statistics.fmean(latencies) if latencies else 0.0,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "errors": errors,
+    }
+
+
+async def run(args):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+    else:
+        import main
+        main.model = StubModel(latency=args.latency, per_document_latency=args.per_document)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=None)
+
+    print(f"{'endpoint':<18} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'err':>4} {'RSS MB':>8}")
+    async with client:
+        for endpoint in args.endpoints.split(","):
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                r = await drive(client, endpoint, concurrency, args.requests)
+                print(f"{endpoint:<18} {concurrency:>5} {r['p50'] * 1e3:>9.1f} {r['p95'] * 1e3:>9.1f}"
+                      f" {r['p99'] * 1e3:>9.1f} {r['rps']:>8.1f} {r['errors']:>4} {peak_rss_mb(args.server_pid):>8.1f}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoints", default="procesar-factura,generar-pdf,procesar-facturas",
+                        help=f"separados por coma; disponibles: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=200, help="peticiones por nivel de concurrencia")
+    parser.add_argument("--latency", default="lognormal:-0.7,0.5", help="latencia del modelo falso (en proceso)")
+    parser.add_argument("--per-document", type=float, default=0.02)
+    parser.add_argument("--url", help="servidor ya levantado; si se omite, se prueba en proceso")
+    parser.add_argument("--server-pid", type=int, help="PID del servidor para medir su RSS pico")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
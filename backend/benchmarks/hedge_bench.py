@@ -0,0 +1,95 @@
+"""Hedging y enrutado por latencia (model_router.py) contra modelos falsos de cola pesada.
+
+Dos modelos con latencia Pareto independientes por llamada. Se compara:
+- un solo modelo, sin hedge;
+- hedge al secundario en el p95 / p90 del primario;
+- degradación: a mitad de la corrida el primario se vuelve --slowdown veces más
+  lento; sin router todo sigue yendo al primario, con router el primario cambia.
+
+Reporta p50/p95/p99 de la extracción completa y las llamadas extra a Gemini.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.hedge_bench --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import main
+from benchmarks.stub_model import StubModel, latency_sampler
+from model_router import ModelRouter
+from upstream import AdaptiveRateLimiter, SingleFlight
+
+MODELOS = ["gemini-2.5-flash", "gemini-flash-latest"]
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+    return statistics.median(ordered), pick(95), pick(99)
+
+
+def configure(args, router: ModelRouter, degraded: dict):
+    def slow_primary(base=latency_sampler(f"pareto:{args.scale},{args.alpha}", seed=1)):
+        return base() * (args.slowdown if degraded["on"] else 1)
+
+    main.model = None
+    main.models = {
+        MODELOS[0]: StubModel(latency=slow_primary),
+        MODELOS[1]: StubModel(latency=f"pareto:{args.scale * 1.1},{args.alpha}", seed=2),
+    }
+    main.router = router
+    main.limiter = AdaptiveRateLimiter(0)
+    main.single_flight = SingleFlight()
+    main.gemini_semaphore = asyncio.Semaphore(10_000)
+
+
+async def scenario(args, label: str, router: ModelRouter, degrade: bool = False):
+    degraded = {"on": False}
+    configure(args, router, degraded)
+    gate = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with gate:
+            if degrade and i == args.requests // 2:
+                degraded["on"] = True
+            start = time.perf_counter()
+            data, _ = await main.extract_invoice_data_async(f"Pedido {i}: 1 martillo a 20 soles")
+            assert "error_message" not in data, data
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    calls = sum(m.calls for m in main.models.values())
+    p50, p95, p99 = percentiles(latencies)
+    print(f"{label:<34} p50={p50 * 1000:6.0f}ms  p95={p95 * 1000:6.0f}ms  p99={p99 * 1000:6.0f}ms  "
+          f"llamadas extra={100 * (calls - args.requests) / args.requests:5.1f}%  "
+          f"primario final={router.snapshot()['primario']}")
+
+
+async def run(args):
+    solo = lambda: ModelRouter(MODELOS, hedge=False, explore=0)
+    hedged = lambda p: ModelRouter(MODELOS, percentile=p, default_delay=args.scale * 4)
+    await scenario(args, "un modelo, sin hedge", solo())
+    await scenario(args, "hedge en p95", hedged(95))
+    await scenario(args, "hedge en p90", hedged(90))
+    print(f"\nEl primario se vuelve {args.slowdown:g}x más lento a mitad de la corrida:")
+    await scenario(args, "un modelo, sin hedge", solo(), degrade=True)
+    await scenario(args, "router + hedge en p95", hedged(95), degrade=True)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--scale", type=float, default=0.05, help="escala Pareto (s)")
+    parser.add_argument("--alpha", type=float, default=1.5, help="alfa Pareto (menor = cola más pesada)")
+    parser.add_argument("--slowdown", type=float, default=4)
+    args = parser.parse_args()
+    main.GEMINI_COALESCE = False
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,95 @@
+"""Arranque en frío: desglose de `python -X importtime -c "import main"`.
+
+Lanza varios intérpretes nuevos, toma la mediana del tiempo acumulado de cada
+módulo importado directamente por main y mide además el tiempo hasta /ready
+y la primera respuesta de /generar-pdf, indicando si en ese momento ya se
+había importado el SDK de Gemini.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.import_time --runs 5 --top 15
+    python -m benchmarks.import_time --warmup pdf
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+FIRST_PDF = """
+import time, sys
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+from benchmarks.stub_model import CANNED_INVOICE
+with TestClient(main.app) as client:
+    while client.get("/ready").status_code != 200:
+        time.sleep(0.005)
+    t2 = time.perf_counter()
+    r = client.post("/generar-pdf", json=CANNED_INVOICE)
+    t3 = time.perf_counter()
+assert r.status_code == 200, r.text
+print(t1 - t0, t2 - t1, t3 - t2, "google.generativeai" in sys.modules)
+"""
+
+
+def importtime_run(env: dict) -> dict:
+    """Tiempo acumulado (ms) por módulo de primer nivel bajo main y total."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    tiempos, hijos = {}, {}
+    for line in proc.stderr.splitlines():
+        m = LINE.match(line)
+        if not m:
+            continue
+        cumulative, level, name = int(m[2]) / 1000, (len(m[3]) - 1) // 2, m[4]
+        # importtime escribe los hijos antes que el padre
+        if level == 1:
+            hijos[name] = cumulative
+        elif level == 0:
+            if name == "main":
+                tiempos = dict(hijos, **{"main (total)": cumulative})
+            hijos = {}
+    assert tiempos, proc.stderr[-500:]
+    return tiempos
+
+
+def first_pdf_run(env: dict):
+    proc = subprocess.run([sys.executable, "-c", FIRST_PDF], capture_output=True, text=True, env=env, check=True)
+    import_s, ready_s, pdf_s, sdk = proc.stdout.split()[-4:]
+    return float(import_s), float(ready_s), float(pdf_s), sdk == "True"
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--warmup", default="", help="valor de WARMUP para la medición de /generar-pdf")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1", GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "x"),
+               WARMUP=args.warmup)
+    runs = defaultdict(list)
+    for _ in range(args.runs):
+        for name, ms in importtime_run(env).items():
+            runs[name].append(ms)
+    medianas = sorted(((statistics.median(v), k) for k, v in runs.items()), reverse=True)
+    print(f"import main: mediana de {args.runs} intérpretes (ms acumulados, incluye dependencias)")
+    for ms, name in medianas[: args.top]:
+        print(f"  {ms:9.1f}  {name}")
+
+    first = [first_pdf_run(env) for _ in range(max(1, args.runs // 2))]
+    print(f"WARMUP={args.warmup!r}: import main {statistics.median(f[0] for f in first) * 1000:.0f} ms, "
+          f"hasta /ready {statistics.median(f[1] for f in first) * 1000:.0f} ms, "
+          f"primer /generar-pdf {statistics.median(f[2] for f in first) * 1000:.0f} ms, "
+          f"SDK de Gemini importado: {'sí' if any(f[3] for f in first) else 'no'}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,68 @@
+"""Prueba de carga de /procesar-factura contra un modelo falso.
+
+Compara el endpoint asíncrono con el camino síncrono anterior (que ocupa un
+hilo del threadpool de Starlette por cada llamada a Gemini).
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.load_test --requests 400 --latency 0.5
+"""
+import argparse
+import asyncio
+import time
+
+import anyio.to_thread
+import httpx
+from fastapi import HTTPException
+
+import main
+from benchmarks.stub_model import StubModel
+
+SAMPLE_TEXT = "Boleta para Juan Perez, DNI 45454545. 1 Martillo a 20 soles."
+
+
+def process_invoice_sync(request: main.InvoiceRequest):
+    """Réplica del endpoint síncrono original, solo para comparar."""
+    raw_data = main.extract_invoice_data(request.texto_factura)
+    if "error_message" in raw_data:
+        raise HTTPException(status_code=400, detail=raw_data["error_message"])
+    return main.InvoiceData(**raw_data)
+
+
+main.app.post("/procesar-factura-sync", response_model=main.InvoiceData)(process_invoice_sync)
+
+
+async def run(path: str, total: int) -> float:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one():
+            r = await client.post(path, json={"texto_factura": SAMPLE_TEXT})
+            r.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - start
+
+
+async def thread_limit() -> int:
+    return int(anyio.to_thread.current_default_thread_limiter().total_tokens)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.5, help="latencia simulada de Gemini (s)")
+    parser.add_argument("--concurrency", type=int, default=200, help="tamaño del semáforo de Gemini")
+    args = parser.parse_args()
+
+    main.model = StubModel(latency=args.latency)
+    main.gemini_semaphore = asyncio.Semaphore(args.concurrency)
+    threads = asyncio.run(thread_limit())
+
+    print(f"{args.requests} peticiones, latencia simulada {args.latency}s, semáforo {args.concurrency}, threadpool {threads}")
+    for label, path in (("sync  (threadpool)", "/procesar-factura-sync"), ("async (semáforo)  ", "/procesar-factura")):
+        elapsed = asyncio.run(run(path, args.requests))
+        print(f"{label}: {elapsed:6.2f}s  ->  {args.requests / elapsed:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main_cli()
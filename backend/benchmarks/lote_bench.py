@@ -0,0 +1,139 @@
+"""Procesamiento masivo (facturar_lote.py) con el modelo falso: ritmo, memoria y reanudación.
+
+1. Entradas de --tamanos registros (70% texto libre que va al LLM, 20% con formato que
+   resuelve el extractor por reglas, 10% InvoiceData): registros/s y RSS pico de cada
+   corrida, cada una en su propio proceso. El RSS no debería crecer con el tamaño.
+2. Corte y reanudación: la corrida más grande se mata con SIGKILL a mitad de camino y
+   se relanza con la misma salida; se verifica que resultados.jsonl tenga cada línea
+   exactamente una vez, que haya un PDF por registro correcto y que el registro de
+   facturas tenga una sola fila por pedido emitido (sin números repetidos).
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.lote_bench --tamanos 1000,10000 --latency 0.2
+"""
+import argparse
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.sample_orders import FREE_TEXT, STRUCTURED
+from benchmarks.stub_model import CANNED_INVOICE
+
+
+def write_input(path: str, n: int):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            kind = i % 10
+            if kind == 0:
+                record = dict(CANNED_INVOICE, id=f"dato-{i}", serie_correlativo=f"F001-{i:08d}")
+            elif kind <= 2:
+                record = {"id": f"reglas-{i}", "texto_factura": STRUCTURED[i % len(STRUCTURED)]}
+            else:
+                record = {"request_id": f"llm-{i}", "body": f"{FREE_TEXT[i % len(FREE_TEXT)]} Pedido {i}."}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def command(entrada: str, salida: str, args) -> list:
+    return [sys.executable, "-m", "benchmarks.lote_bench", "--correr", entrada, salida,
+            "--latency", args.latency, "--concurrencia", str(args.concurrencia)]
+
+
+def isolated_env(tmp: str) -> dict:
+    # Sin caché ni registros compartidos con otras corridas
+    return dict(os.environ, CACHE_DB_PATH="", MAESTROS_PATH="",
+                FACTURAS_DB_PATH=os.path.join(tmp, "facturas.sqlite3"),
+                CORRELATIVOS_DB_PATH=os.path.join(tmp, "correlativos.sqlite3"))
+
+
+def last_lines(output: str, n: int = 3) -> str:
+    return "\n".join("   " + line for line in output.strip().splitlines()[-n:])
+
+
+def verify(salida: str, n: int, tmp: str):
+    lines, ok, emitidos = [], 0, 0
+    with open(os.path.join(salida, "resultados.jsonl"), encoding="utf-8") as f:
+        for raw in f:
+            resultado = json.loads(raw)
+            lines.append(resultado["linea"])
+            ok += resultado["ok"]
+            # Los InvoiceData de la entrada ya traen su número y no pasan por la emisión
+            emitidos += resultado["ok"] and resultado.get("camino") != "datos"
+    pdfs = len(os.listdir(os.path.join(salida, "pdf")))
+    duplicated = len(lines) - len(set(lines))
+    missing = n - len(set(lines))
+    print(f"   resultados.jsonl: {len(lines):,} líneas, {duplicated} duplicadas, {missing} faltantes; "
+          f"{pdfs:,} PDFs para {ok:,} registros correctos")
+    with sqlite3.connect(os.path.join(tmp, "facturas.sqlite3")) as db:
+        filas, numeros = db.execute("SELECT COUNT(*), COUNT(DISTINCT serie_correlativo) FROM facturas").fetchone()
+    print(f"   registro: {filas:,} filas, {numeros:,} números distintos para {emitidos:,} pedidos emitidos")
+
+
+def run(args):
+    for n in args.tamanos:
+        with tempfile.TemporaryDirectory() as tmp:
+            entrada = os.path.join(tmp, "entrada.jsonl")
+            write_input(entrada, n)
+            salida = os.path.join(tmp, "salida")
+            start = time.perf_counter()
+            out = subprocess.run(command(entrada, salida, args), env=isolated_env(tmp),
+                                 capture_output=True, text=True).stdout
+            print(f"{n:,} registros en {time.perf_counter() - start:.1f}s (incluye arranque):")
+            print(last_lines(out, 2))
+
+    n = max(args.tamanos)
+    print(f"\nCorte con SIGKILL y reanudación ({n:,} registros):")
+    with tempfile.TemporaryDirectory() as tmp:
+        entrada = os.path.join(tmp, "entrada.jsonl")
+        write_input(entrada, n)
+        salida = os.path.join(tmp, "salida")
+        proc = subprocess.Popen(command(entrada, salida, args), env=isolated_env(tmp),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        resultados = os.path.join(salida, "resultados.jsonl")
+        while proc.poll() is None:
+            time.sleep(0.2)
+            if os.path.exists(resultados) and os.path.getsize(resultados) > 0:
+                with open(resultados, "rb") as f:
+                    if sum(1 for _ in f) >= n // 2:
+                        proc.send_signal(signal.SIGKILL)
+                        break
+        proc.wait()
+        out = subprocess.run(command(entrada, salida, args), env=isolated_env(tmp),
+                             capture_output=True, text=True).stdout
+        print(last_lines(out, 4))
+        verify(salida, n, tmp)
+
+
+def run_child(entrada: str, salida: str, args):
+    import main
+    import facturar_lote
+    from benchmarks.stub_model import StubModel
+    from model_router import ModelRouter
+    from upstream import AdaptiveRateLimiter
+
+    main.model = StubModel(latency=args.latency)
+    main.router = ModelRouter(main.GEMINI_MODELS[:1], hedge=False, explore=0)
+    main.limiter = AdaptiveRateLimiter(0)
+    main.GEMINI_COALESCE = False
+    return facturar_lote.main_cli([entrada, "--salida", salida, "--sin-cache",
+                                   "--concurrencia", str(args.concurrencia), "--progreso", "3600"])
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanos", type=lambda v: [int(x) for x in v.split(",")], default=[1000, 10000])
+    parser.add_argument("--latency", default="0.2", help="latencia del modelo falso")
+    parser.add_argument("--concurrencia", type=int, default=64)
+    parser.add_argument("--correr", nargs=2, metavar=("ENTRADA", "SALIDA"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.correr:
+        sys.exit(run_child(*args.correr, args))
+    run(args)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,137 @@
+"""Datos maestros (maestros.py): latencia de búsqueda, recarga y tokens ahorrados.
+
+1. Índice sintético de --clientes clientes y --emisores emisores: microsegundos
+   por búsqueda con RUC/DNI conocido, con el nombre exacto en el texto, con el
+   nombre mal escrito tras "Cliente:" y con una parte desconocida.
+2. Recarga en caliente: hasta que se ve un cliente nuevo y la búsqueda más
+   lenta mientras se reconstruye el índice en otro hilo.
+3. Extracción con el modelo falso: tokens de salida (y caracteres de prompt)
+   con y sin datos maestros para un cliente y emisor conocidos.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.maestros_bench --clientes 100000
+"""
+import argparse
+import asyncio
+import csv
+import os
+import random
+import tempfile
+import time
+
+import main
+from benchmarks.stub_model import StubModel
+from maestros import MasterData
+from model_router import ModelRouter
+from upstream import AdaptiveRateLimiter, SingleFlight
+
+NOMBRES = ["Juan", "María", "José", "Rosa", "Luis", "Carmen", "Carlos", "Ana", "Jorge", "Lucía",
+           "Pedro", "Elena", "Miguel", "Sofía", "Víctor", "Julia", "Raúl", "Teresa", "César", "Pilar"]
+APELLIDOS = ["Pérez", "Quispe", "Flores", "Rodríguez", "Sánchez", "García", "Rojas", "Huamán", "Chávez",
+             "Vargas", "Torres", "Ramírez", "Mendoza", "Castillo", "Espinoza", "Díaz", "Gutiérrez",
+             "Ccori", "Mamani", "Salazar", "Vásquez", "Cruz", "Reyes", "Paredes", "Medina", "Aguilar",
+             "Córdova", "Cárdenas", "Ríos", "Palomino", "Valdivia", "Zapata", "Ticona", "Condori"]
+RUBROS = ["Ferretería", "Bodega", "Librería", "Distribuidora", "Inversiones", "Comercial", "Farmacia"]
+
+
+def write_csv(path: str, clientes: int, emisores: int, rng: random.Random):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["tipo", "documento", "nombre", "direccion"])
+        for i in range(emisores):
+            nombre = f"{rng.choice(RUBROS)} {rng.choice(APELLIDOS)} {i} S.A.C."
+            writer.writerow(["emisor", f"20{i:09d}", nombre, f"Av. Principal {i} Lima"])
+        for i in range(clientes):
+            nombre = f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)} {i}"
+            documento = f"{10000000 + i}" if i % 3 else f"10{i:09d}"
+            writer.writerow(["cliente", documento, nombre, f"Calle {i} Los Olivos"])
+
+
+def per_call_us(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def lookups(maestros: MasterData, repeat: int):
+    index = maestros.index
+    cliente = index.indices["cliente"].por_documento["10000001"]
+    emisor = index.indices["emisor"].por_documento["20000000001"]
+    typo = cliente.nombre.replace("a", "e", 1)
+    items = "\n- 2 Cajas de Clavos (CJA) a 15 soles c/u.\n- 1 Martillo a 20 soles."
+    casos = {
+        "RUC y DNI conocidos": f"Boleta {emisor.nombre}, RUC {emisor.documento}. Cliente: X, DNI {cliente.documento}.{items}",
+        "nombre exacto, sin documento": f"Para {cliente.nombre}, lo de siempre.{items}",
+        "nombre mal escrito (Cliente:)": f"Boleta de venta. Cliente: {typo}, dirección Calle 1.{items}",
+        "parte desconocida": f"Boleta. Cliente: Nadie Conocido, DNI 99999999.{items}",
+    }
+    for label, texto in casos.items():
+        encontrado = maestros.buscar(texto).roles()
+        print(f"   {label:<32} {per_call_us(lambda: maestros.buscar(texto), repeat):7.1f} µs  "
+              f"encontrado={','.join(encontrado) or '-'}")
+    return emisor, cliente
+
+
+async def tokens(emisor, cliente, maestros: MasterData):
+    main.model = StubModel(latency=0)
+    main.router = ModelRouter(main.GEMINI_MODELS[:1], hedge=False, explore=0)
+    main.limiter = AdaptiveRateLimiter(0)
+    main.single_flight = SingleFlight()
+    texto = (f"Boleta de venta de {emisor.nombre}, RUC {emisor.documento}. Para {cliente.nombre} "
+             f"DNI {cliente.documento}, lo de siempre: 1 martillo a 20 soles y 2 cajas de clavos a 15")
+    for label, activo in (("sin datos maestros", None), ("con datos maestros", maestros)):
+        main.maestros = activo
+        main.model.prompt_chars = 0
+        data, usage = await main.extract_invoice_data_async(texto)
+        print(f"   {label:<20} tokens de salida={usage['output_tokens']:>4}  prompt={main.model.prompt_chars:>5} caracteres  "
+              f"cliente={data['client']!r}")
+
+
+def run(args):
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "maestros.csv")
+        write_csv(path, args.clientes, args.emisores, rng)
+        start = time.perf_counter()
+        maestros = MasterData([path], intervalo=3600)
+        print(f"Carga inicial: {time.perf_counter() - start:.2f}s  ({maestros.index.tamanos()})")
+
+        print(f"\n1) Búsqueda en el texto ({args.repeat} repeticiones)")
+        emisor, cliente = lookups(maestros, args.repeat)
+
+        print("\n2) Recarga en caliente")
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(["cliente", "77777777", "Cliente Recién Agregado", "Jr. Nuevo 1"])
+        # La búsqueda que nota el cambio lanza la recarga en otro hilo y no la espera
+        maestros.intervalo = 0
+        texto = f"DNI {cliente.documento}"
+        start = time.perf_counter()
+        tiempos = []
+        while not tiempos or maestros._recarga.locked() or maestros.buscar("DNI 77777777").cliente is None:
+            t = time.perf_counter()
+            maestros.buscar(texto)
+            tiempos.append(time.perf_counter() - t)
+        tiempos.sort()
+        p99 = tiempos[int(len(tiempos) * 0.99)]
+        print(f"   nuevo cliente visible a los {time.perf_counter() - start:.2f}s; mientras tanto {len(tiempos)} búsquedas, "
+              f"p99 {p99 * 1e6:.0f} µs, la más lenta {tiempos[-1] * 1e3:.0f} ms (el hilo de recarga comparte el GIL)")
+        maestros.intervalo = 3600
+
+        print("\n3) Tokens por extracción")
+        asyncio.run(tokens(emisor, cliente, maestros))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clientes", type=int, default=100_000)
+    parser.add_argument("--emisores", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    main.GEMINI_COALESCE = False
+    main.correlativos = main.registro = None
+    run(args)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,92 @@
+"""Micro-benchmarks: create_invoice_pdf por número de ítems y decodificación de ítems (model/Item.py).
+
+Para el PDF se mide el documento completo en memoria (create_invoice_pdf) y el
+envío en trozos (iter_invoice_pdf, como lo sirve /generar-pdf).
+Para los ítems se compara items_from_json (un objeto Item por línea) con
+batch_from_json (ItemBatch columnar) y su conversión a schemas.Item, con la
+memoria que queda retenida por el resultado.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.micro
+    python -m benchmarks.micro --pdf-items 1,1000,100000 --json-items 100000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from pdf_generator import create_invoice_pdf, iter_invoice_pdf
+from schemas import InvoiceData
+from benchmarks.stub_model import CANNED_INVOICE
+
+# model/ vive en la raíz del repositorio, fuera de backend/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+from model.Item import items_from_json, batch_from_json, orjson  # noqa: E402
+from schemas import Item as SchemaItem  # noqa: E402
+
+
+def measure(fn, repeat: int):
+    """Mejor tiempo de `repeat` ejecuciones y pico de memoria de Python de la última."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / (1024 * 1024)
+
+
+def retained_mb(fn) -> float:
+    """Memoria de Python que sigue ocupada por el resultado de fn()."""
+    tracemalloc.start()
+    result = fn()  # noqa: F841 (se mantiene vivo hasta medir)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / (1024 * 1024)
+
+
+def invoice_with_items(n: int) -> InvoiceData:
+    items = [
+        {"descripcion": f"Producto {i}", "cantidad": (i % 7) + 1, "unidad_medida": "UNI", "precio_unitario": 1.5 + i % 100}
+        for i in range(n)
+    ]
+    return InvoiceData(**dict(CANNED_INVOICE, items=items))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf-items", default="1,100,1000,10000,100000")
+    parser.add_argument("--json-items", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'benchmark':<32} {'mejor':>10} {'pico MB':>9}")
+    for n in (int(x) for x in args.pdf_items.split(",")):
+        data = invoice_with_items(n)
+        seconds, peak = measure(lambda: create_invoice_pdf(data), args.repeat)
+        print(f"{f'create_invoice_pdf[{n} ítems]':<32} {seconds * 1e3:>8.1f}ms {peak:>9.1f}")
+        seconds, peak = measure(lambda: sum(len(chunk) for chunk in iter_invoice_pdf(data)), args.repeat)
+        print(f"{f'iter_invoice_pdf[{n} ítems]':<32} {seconds * 1e3:>8.1f}ms {peak:>9.1f}")
+
+    payload = json.dumps([
+        {"description": f"Producto {i}", "quantity": (i % 7) + 1, "price": 1.5 + i % 100}
+        for i in range(args.json_items)
+    ])
+    title = f"{args.json_items} ítems ({'orjson' if orjson else 'json'})"
+    print(f"\n{title:<32} {'mejor':>10} {'pico MB':>9} {'retenido MB':>12}")
+    batch = batch_from_json(payload)
+    for name, fn in (
+        ("items_from_json", lambda: items_from_json(payload)),
+        ("batch_from_json", lambda: batch_from_json(payload)),
+        ("batch.to_pydantic", lambda: batch.to_pydantic(SchemaItem)),
+    ):
+        seconds, peak = measure(fn, args.repeat)
+        print(f"{name:<32} {seconds * 1e3:>8.1f}ms {peak:>9.1f} {retained_mb(fn):>12.1f}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,80 @@
+"""Caché de PDFs (pdf_cache.py): diagramar de nuevo vs. servir de la caché vs. 304.
+
+Para facturas de --items ítems, por cada descarga:
+- sin caché: iter_invoice_pdf completo (diagramado + serialización);
+- clave: JSON canónico + SHA-256 del InvoiceData (lo que se paga siempre);
+- acierto en memoria y en disco (clave + lectura);
+- y de punta a punta por HTTP (TestClient): primera descarga, repetida y con
+  If-None-Match (304 sin cuerpo).
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.pdf_cache_bench --items 10,200,2000
+"""
+import argparse
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.stub_model import CANNED_INVOICE
+from pdf_cache import PdfCache, SpillDir, pdf_key
+from pdf_generator import create_invoice_pdf
+from schemas import InvoiceData
+
+
+def invoice(items: int, variante: int = 0) -> InvoiceData:
+    base = CANNED_INVOICE["items"]
+    data = dict(CANNED_INVOICE, items=[dict(base[i % 2], cantidad=i + 1) for i in range(items)])
+    data["client"] = f"Cliente {variante}"
+    return InvoiceData(**data)
+
+
+def per_call_ms(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(args):
+    main.registro = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for items in args.items:
+            inv = invoice(items)
+            key = pdf_key(inv)
+            pdf = create_invoice_pdf(inv)
+            memory = PdfCache(64 * 2**20)
+            memory.put(key, pdf)
+            disk = PdfCache(64 * 2**20, SpillDir(tmp, 2**30))
+            disk.spill.put(key, pdf)
+            print(f"{items} ítems ({len(pdf) / 1024:.0f} KB):")
+            print(f"   sin caché (diagramar)   {per_call_ms(lambda: create_invoice_pdf(inv), args.repeat):8.3f} ms")
+            print(f"   clave (JSON + SHA-256)  {per_call_ms(lambda: pdf_key(inv), args.repeat):8.3f} ms")
+            print(f"   acierto en memoria      {per_call_ms(lambda: memory.get(pdf_key(inv)), args.repeat):8.3f} ms")
+            print(f"   acierto en disco        {per_call_ms(lambda: disk.spill.get(pdf_key(inv)), args.repeat):8.3f} ms")
+
+            body = inv.model_dump()
+            with TestClient(main.app) as client:
+                main.pdf_cache = PdfCache(64 * 2**20)
+                inicio = time.perf_counter()
+                etag = client.post("/generar-pdf", json=body).headers["etag"]
+                primera = (time.perf_counter() - inicio) * 1000
+                repetida = per_call_ms(lambda: client.post("/generar-pdf", json=body), args.repeat)
+                condicional = per_call_ms(
+                    lambda: client.post("/generar-pdf", json=body, headers={"If-None-Match": etag}), args.repeat)
+                main.pdf_cache = None
+                sin_cache = per_call_ms(lambda: client.post("/generar-pdf", json=body), args.repeat)
+            print(f"   HTTP: sin caché {sin_cache:.2f} ms, primera {primera:.2f} ms, repetida {repetida:.2f} ms, "
+                  f"304 {condicional:.2f} ms")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=lambda v: [int(x) for x in v.split(",")], default=[10, 200, 2000])
+    parser.add_argument("--repeat", type=int, default=100)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,111 @@
+"""Benchmark del registro de facturas (registro_facturas.py) con muchos documentos.
+
+Carga N facturas sintéticas (varios emisores, clientes y fechas) y mide la
+latencia de las consultas que usa GET /facturas: por RUC emisor con rango de
+fechas, por cliente, por serie y el recorrido de varias páginas con cursor.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.registro_bench
+    python -m benchmarks.registro_bench --facturas 1000000 --db /tmp/facturas_bench.sqlite3
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from registro_facturas import RegistroFacturas
+from schemas import InvoiceData
+from benchmarks.stub_model import CANNED_INVOICE
+
+EMISORES = [f"20{n:09d}" for n in range(200)]
+CLIENTES = [f"{n:08d}" for n in range(50_000)]
+
+
+def poblar(store: RegistroFacturas, total: int, seed: int):
+    """Inserta en lotes con executemany; el JSON es el mismo documento con otros índices."""
+    rng = random.Random(seed)
+    data = InvoiceData(**CANNED_INVOICE).model_dump_json()
+    inicio = date(2023, 1, 1)
+    lote = []
+    now = time.time()
+    for i in range(total):
+        emisor = rng.choice(EMISORES)
+        serie = rng.choice(("F001", "B001"))
+        lote.append((
+            emisor, serie, f"{serie}-{i:08d}", "Cliente", rng.choice(CLIENTES),
+            (inicio + timedelta(days=rng.randrange(730))).isoformat(),
+            rng.randrange(100, 10_000_000), "SOLES", data, now, now,
+        ))
+        if len(lote) == 50_000:
+            store._conn.executemany(_INSERT, lote)
+            lote.clear()
+    if lote:
+        store._conn.executemany(_INSERT, lote)
+
+
+_INSERT = (
+    "INSERT INTO facturas (emisor_ruc, serie, serie_correlativo, client, client_ruc_dni,"
+    " fecha, total_cents, moneda, data, creado, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def medir(nombre: str, fn, repeat: int):
+    tiempos = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - start) * 1000)
+    tiempos.sort()
+    print(f"{nombre:<40} p50 {statistics.median(tiempos):6.2f}ms   p95 {tiempos[int(len(tiempos) * 0.95) - 1]:6.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--facturas", type=int, default=200_000)
+    parser.add_argument("--db", default="", help="ruta de la base (por defecto, temporal)")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, "facturas.sqlite3")
+        store = RegistroFacturas(path)
+        faltan = args.facturas - len(store)
+        if faltan > 0:
+            start = time.perf_counter()
+            store._conn.execute("BEGIN")
+            poblar(store, faltan, args.seed)
+            store._conn.execute("COMMIT")
+            print(f"Cargadas {faltan} facturas en {time.perf_counter() - start:.1f}s")
+        total = len(store)
+        print(f"Registro con {total} facturas\n")
+
+        rng = random.Random(args.seed + 1)
+        medir("por RUC emisor + rango de fechas", lambda: store.buscar(
+            ruc=rng.choice(EMISORES), desde="2024-01-01", hasta="2024-03-31"), args.repeat)
+        medir("por cliente", lambda: store.buscar(cliente=rng.choice(CLIENTES)), args.repeat)
+        medir("por RUC + serie", lambda: store.buscar(ruc=rng.choice(EMISORES), serie="F001"), args.repeat)
+        medir("solo rango de fechas", lambda: store.buscar(desde="2024-06-01", hasta="2024-06-30"), args.repeat)
+
+        def paginas(n=20):
+            cursor = None
+            ruc = rng.choice(EMISORES)
+            for _ in range(n):
+                _, cursor = store.buscar(ruc=ruc, cursor=cursor)
+                if cursor is None:
+                    break
+        medir("20 páginas seguidas con cursor", paginas, max(1, args.repeat // 10))
+        medir("reimpresión: obtener por id", lambda: store.obtener(rng.randrange(1, total + 1)), args.repeat)
+
+        plan = store._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM facturas WHERE emisor_ruc = ? AND (fecha, id) < (?, ?)"
+            " ORDER BY fecha DESC, id DESC LIMIT 51", (EMISORES[0], "2024-01-01", 10**9),
+        ).fetchall()
+        print("\nPlan con cursor:", "; ".join(row[-1] for row in plan))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Corpus de pedidos de ejemplo para benchmarks (formatos reales del tráfico)."""
+
+README_FORMAT = """Boleta de Venta electrónica Ferretería Carlos,
+Dirección Av. Arequipa 500 Lima,
+RUC 20111945860.
+Fecha 2024-12-30.
+Cliente: Juan Perez, DNI 45454545, Dirección Calle 1 Los Olivos.
+Item: Martillo Precio: 20 soles. Cantidad 1"""
+
+PEGAR_EJEMPLO = """Boleta de Venta electrónica Ferretería Carlos, Dirección Av. Arequipa 500 Lima, RUC 20111945860. 
+Cliente: Juan Perez, DNI 45454545, Dirección Calle 1 Los Olivos. 
+Fecha: Hoy. Forma de pago: Contado.
+Items:
+- 1 Martillo (UNI) a 20 soles.
+- 2 Cajas de Clavos (CJA) a 15 soles c/u."""
+
+FACTURA_BULLETS = """Factura electrónica Distribuidora Andina SAC, Dirección Jr. Callao 123 Lima, RUC 20600011122.
+Cliente: Comercial Rivera EIRL, RUC 20555666777, Dirección Av. Brasil 900 Magdalena.
+Fecha: 15/01/2025. Forma de pago: Crédito. Vencimiento: 15/02/2025.
+Items:
+- 10 Sacos de cemento (SAC) a 28.50 soles c/u.
+- 4 Varillas de fierro 1/2 (UNI) a 45 soles c/u.
+- 2 Galones de pintura (GLN) a 60 soles c/u."""
+
+FREE_TEXT = [
+    "Factura para Empresa XYZ, RUC 20555123456, por 5 laptops a 3000 soles cada una.",
+    "Hazme una boleta a nombre de María López por 3 polos a 25 soles y una gorra de 15.",
+    "Vendí 2 sillas de oficina a 350 dólares a Inversiones Sol, ruc 20123456789, pago al crédito.",
+]
+
+CORPUS = [README_FORMAT, PEGAR_EJEMPLO, FACTURA_BULLETS] + FREE_TEXT
+STRUCTURED = [README_FORMAT, PEGAR_EJEMPLO, FACTURA_BULLETS]
@@ -0,0 +1,27 @@
+"""Levanta la API real con el modelo Gemini falso, para medir con benchmarks.harness --url.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.serve_stub --latency lognormal:-0.5,0.6 --port 8000
+"""
+import argparse
+
+import uvicorn
+
+import main
+from benchmarks.stub_model import StubModel
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", default="0.5", help="latencia o distribución (ver stub_model.py)")
+    parser.add_argument("--per-document", type=float, default=0.0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    main.model = StubModel(latency=args.latency, per_document_latency=args.per_document)
+    uvicorn.run(main.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main_cli()
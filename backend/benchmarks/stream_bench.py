@@ -0,0 +1,90 @@
+"""Streaming de la extracción (/procesar-factura/stream) contra el modelo falso.
+
+Compara, para pedidos que van al LLM:
+- sin stream: el cliente no ve nada hasta que llega la respuesta completa;
+- con stream: tiempo hasta el primer `campo`, hasta el primer `item` y hasta
+  la `factura` final validada.
+
+El modelo falso entrega el primer trozo a `--first-chunk` de la latencia total
+(tiempo hasta el primer token) y el resto repartido hasta completarla.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.stream_bench --requests 50 --latency lognormal:1,0.3
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import main
+from benchmarks.stub_model import StubModel
+from model_router import ModelRouter
+from upstream import AdaptiveRateLimiter, SingleFlight
+
+
+def configure(args):
+    main.model = StubModel(latency=args.latency, first_chunk=args.first_chunk, chunk_chars=args.chunk_chars)
+    main.router = ModelRouter(main.GEMINI_MODELS[:1], hedge=False, explore=0)
+    main.limiter = AdaptiveRateLimiter(0)
+    main.single_flight = SingleFlight()
+    main.gemini_semaphore = asyncio.Semaphore(10_000)
+    main.correlativos = None
+    main.registro = None
+
+
+def texts(args):
+    # Textos que el extractor por reglas no resuelve: todos van al LLM
+    return [f"Pedido {i} de la ferretería, lo de siempre para el cliente" for i in range(args.requests)]
+
+
+async def blocking(text: str) -> float:
+    start = time.perf_counter()
+    data, _ = await main.extract_invoice_data_async(text)
+    assert "error_message" not in data, data
+    return time.perf_counter() - start
+
+
+async def streamed(text: str) -> dict:
+    start = time.perf_counter()
+    marks = {}
+    request = main.InvoiceRequest(texto_factura=text, usar_cache=False)
+    async for raw in main.stream_extraction(request):
+        event = raw.decode("utf-8").split("\n", 1)[0].removeprefix("event: ")
+        assert event != "error", raw
+        marks.setdefault(event, time.perf_counter() - start)
+    return marks
+
+
+def describe(label: str, samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"   {label:<28} p50={statistics.median(ordered) * 1000:6.0f}ms  p95={p95 * 1000:6.0f}ms")
+
+
+async def run(args):
+    configure(args)
+    print(f"{args.requests} pedidos al LLM, latencia {args.latency}, primer trozo al {args.first_chunk:.0%}")
+    print("Sin stream:")
+    describe("respuesta completa", await asyncio.gather(*(blocking(t) for t in texts(args))))
+
+    configure(args)
+    marks = await asyncio.gather(*(streamed(t) for t in texts(args)))
+    print("Con stream:")
+    describe("primer campo", [m["campo"] for m in marks])
+    describe("primer ítem", [m["item"] for m in marks])
+    describe("factura validada", [m["factura"] for m in marks])
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", default="lognormal:1,0.3", help="latencia total del modelo falso")
+    parser.add_argument("--first-chunk", type=float, default=0.1)
+    parser.add_argument("--chunk-chars", type=int, default=40)
+    args = parser.parse_args()
+    main.GEMINI_COALESCE = False
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,186 @@
+"""Modelo Gemini falso para pruebas de carga locales.
+
+Imita la interfaz de `genai.GenerativeModel` que usa main.py
+(`generate_content` y `generate_content_async`) con una respuesta JSON
+enlatada, sin tocar la red. Si el prompt es de lote (marcadores
+<<DOCUMENTO n>>) responde un arreglo con un objeto por documento.
+
+La latencia puede ser un número fijo o una distribución:
+    "fixed:0.5"            siempre 0.5 s
+    "uniform:0.2,1.0"      uniforme entre 0.2 y 1.0 s
+    "lognormal:-0.5,0.6"   lognormal (mu, sigma del logaritmo en segundos)
+    "pareto:0.3,2.5"       cola pesada: escala 0.3 s, alfa 2.5
+
+Con `stream=True` devuelve la respuesta en trozos de `chunk_chars` caracteres,
+como generate_content_async(stream=True): el primero a `first_chunk` de la
+latencia (tiempo hasta el primer token) y el resto repartido hasta completarla.
+
+Para probar el limitador y los reintentos puede simular una cuota
+(`quota` llamadas por segundo, ventana deslizante de 1 s: lo que la supera
+recibe un 429) y errores 503 aleatorios (`error_rate`).
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from collections import deque
+
+from llm_contract import DERIVED_FIELDS, SYSTEM_INSTRUCTION
+
+CANNED_INVOICE = {
+    "document_type": "Boleta de Venta",
+    "serie_correlativo": "B001-00001",
+    "emisor_nombre": "Ferretería Carlos",
+    "emisor_ruc": "20111945860",
+    "emisor_direccion": "Av. Arequipa 500 Lima",
+    "client": "Juan Perez",
+    "client_address": "Calle 1 Los Olivos",
+    "client_ruc_dni": "45454545",
+    "fecha_emision": "30/12/2024",
+    "fecha_vencimiento": "30/12/2024",
+    "forma_pago": "Contado",
+    "moneda": "SOLES",
+    "items": [
+        {"descripcion": "Martillo", "cantidad": 1, "unidad_medida": "UNI", "precio_unitario": 20.0},
+        {"descripcion": "Cajas de Clavos", "cantidad": 2, "unidad_medida": "CJA", "precio_unitario": 15.0},
+    ],
+    "monto_letras": "SESENTA Y OCHO CON 44/100 SOLES",
+}
+
+
+# Lo que devuelve Gemini: sin los campos que se calculan localmente
+CANNED_EXTRACTION = {k: v for k, v in CANNED_INVOICE.items() if k not in DERIVED_FIELDS}
+
+
+class StubUsage:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class StubResponse:
+    def __init__(self, text: str, prompt: str = ""):
+        self.text = text
+        # Aproximación habitual: ~4 caracteres por token
+        self.usage_metadata = StubUsage(len(prompt) // 4, len(text) // 4)
+
+
+def latency_sampler(spec, seed: int = 42):
+    """Devuelve una función sin argumentos que produce latencias en segundos."""
+    if callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+    rng = random.Random(seed)
+    kind, _, params = str(spec).partition(":")
+    args = [float(p) for p in params.split(",") if p]
+    if kind == "fixed":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(args[0], args[1])
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(args[0], args[1])
+    if kind == "pareto":
+        return lambda: args[0] * rng.paretovariate(args[1])
+    try:
+        value = float(spec)
+    except ValueError:
+        raise ValueError(f"Distribución de latencia desconocida: {spec}") from None
+    return lambda: value
+
+
+class StubAPIError(Exception):
+    """Como las excepciones de google.api_core: el código HTTP va en `code`."""
+
+    def __init__(self, code: int, message: str, retry_after: float = None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.retry_after = retry_after
+
+
+class StubStreamResponse:
+    """Respuesta en streaming: se itera con `async for` y al final expone text y usage_metadata."""
+
+    def __init__(self, response: StubResponse, delay: float, first_chunk: float, chunk_chars: int):
+        self.text = response.text
+        self.usage_metadata = response.usage_metadata
+        self._delay = delay
+        self._first = first_chunk
+        self._chunks = [response.text[i:i + chunk_chars] for i in range(0, len(response.text), chunk_chars)]
+
+    async def __aiter__(self):
+        await asyncio.sleep(self._delay * self._first)
+        rest = self._delay * (1 - self._first) / max(1, len(self._chunks) - 1)
+        for i, chunk in enumerate(self._chunks):
+            if i:
+                await asyncio.sleep(rest)
+            yield StubResponse(chunk)
+
+
+_DOCUMENT_MARKER = re.compile(r"<<DOCUMENTO (\d+)>>")
+
+
+class StubModel:
+    def __init__(self, latency=0.5, payload: dict = None, per_document_latency: float = 0.0,
+                 system_instruction: str = SYSTEM_INSTRUCTION, seed: int = 42,
+                 quota: float = 0, error_rate: float = 0.0, first_chunk: float = 0.1, chunk_chars: int = 40):
+        self.latency = latency_sampler(latency, seed)
+        self.quota = quota
+        self.first_chunk = first_chunk
+        self.chunk_chars = chunk_chars
+        self.error_rate = error_rate
+        self._rng = random.Random(seed + 1)
+        self._recent = deque()
+        self.throttled = 0
+        self.errors = 0
+        self.per_document_latency = per_document_latency
+        self.system_instruction = system_instruction
+        self.invoice = payload or CANNED_EXTRACTION
+        self.payload = json.dumps(self.invoice, ensure_ascii=False)
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def _check_quota(self):
+        """Lanza 429 si se supera la cuota o 503 con probabilidad error_rate."""
+        now = time.monotonic()
+        if self.quota:
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.quota:
+                self.throttled += 1
+                raise StubAPIError(429, "Resource has been exhausted (e.g. check quota).")
+            self._recent.append(now)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+            raise StubAPIError(503, "The service is currently unavailable.")
+
+    def _respond(self, prompt: str, generation_config: dict = None):
+        self._check_quota()
+        # Gemini cuenta la instrucción de sistema como parte del prompt en cada llamada
+        prompt = self.system_instruction + prompt
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        indices = [int(i) for i in _DOCUMENT_MARKER.findall(prompt)]
+        if not indices:
+            payload = self.payload
+            properties = ((generation_config or {}).get("response_schema") or {}).get("properties")
+            if properties is not None and set(self.invoice) - set(properties):
+                # Esquema parcial (datos maestros): solo los campos pedidos
+                payload = json.dumps({k: v for k, v in self.invoice.items() if k in properties}, ensure_ascii=False)
+            return self.latency() + self.per_document_latency, StubResponse(payload, prompt)
+        batch = [dict(self.invoice, indice=i) for i in indices]
+        delay = self.latency() + self.per_document_latency * len(indices)
+        return delay, StubResponse(json.dumps(batch, ensure_ascii=False), prompt)
+
+    def generate_content(self, prompt, generation_config=None, **kwargs):
+        delay, response = self._respond(prompt, generation_config)
+        time.sleep(delay)
+        return response
+
+    async def generate_content_async(self, prompt, generation_config=None, stream: bool = False, **kwargs):
+        delay, response = self._respond(prompt, generation_config)
+        if stream:
+            return StubStreamResponse(response, delay, self.first_chunk, self.chunk_chars)
+        await asyncio.sleep(delay)
+        return response
@@ -0,0 +1,124 @@
+"""Benchmark del motor de totales (totales.py) frente a los bucles por ítem anteriores.
+
+Compara, para facturas de 100, 10 000 y 100 000 líneas:
+- float_loop: el bucle original con floats (pdf_generator / Streamlit).
+- round_loop: el bucle original de funciones.py (round por línea).
+- decimal:    el motor en su camino Decimal (exacto, sin NumPy).
+- vectorial:  el motor con NumPy (enteros int64).
+y el cálculo de muchas facturas pequeñas con calcular_lote.
+
+También cuenta en cuántas facturas aleatorias los bucles con float difieren
+del resultado exacto en al menos un céntimo.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.totals_bench
+    python -m benchmarks.totals_bench --lines 100,10000,100000 --invoices 10000
+"""
+import argparse
+import random
+import time
+
+import totales
+from totales import calcular, calcular_lote
+
+
+def float_loop(cantidades, precios):
+    subtotal = 0.0
+    for q, p in zip(cantidades, precios):
+        subtotal += q * p
+    igv = subtotal * 0.18
+    return round(subtotal, 2), round(igv, 2), round(subtotal + igv, 2)
+
+
+def round_loop(cantidades, precios):
+    subtotal = 0.0
+    for q, p in zip(cantidades, precios):
+        subtotal += round(q * p, 2)
+    igv = round(subtotal * 0.18, 2)
+    return subtotal, igv, round(subtotal + igv, 2)
+
+
+def engine_decimal(cantidades, precios):
+    umbral = totales.UMBRAL_VECTORIAL
+    totales.UMBRAL_VECTORIAL = float("inf")
+    try:
+        return calcular(cantidades, precios)
+    finally:
+        totales.UMBRAL_VECTORIAL = umbral
+
+
+def engine_vectorial(cantidades, precios):
+    umbral = totales.UMBRAL_VECTORIAL
+    totales.UMBRAL_VECTORIAL = 0
+    try:
+        return calcular(cantidades, precios)
+    finally:
+        totales.UMBRAL_VECTORIAL = umbral
+
+
+def random_lines(n: int, rng: random.Random):
+    cantidades = [float(rng.randint(1, 50)) if rng.random() < 0.8 else rng.randint(1, 5000) / 1000 for _ in range(n)]
+    precios = [rng.randint(1, 999_999) / 100 if rng.random() < 0.9 else rng.randint(1, 99_999) / 10000 for _ in range(n)]
+    return cantidades, precios
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def mismatches(samples: int, rng: random.Random) -> dict:
+    """Facturas en las que los bucles float no coinciden con el total exacto."""
+    diff = {"float_loop": 0, "round_loop": 0}
+    for _ in range(samples):
+        cantidades, precios = random_lines(rng.randint(1, 30), rng)
+        exacto = engine_decimal(cantidades, precios)
+        esperado = (float(exacto.subtotal), float(exacto.igv), float(exacto.total))
+        for name, fn in (("float_loop", float_loop), ("round_loop", round_loop)):
+            got = fn(cantidades, precios)
+            if any(abs(a - b) >= 0.005 for a, b in zip(got, esperado)):
+                diff[name] += 1
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", default="100,10000,100000")
+    parser.add_argument("--invoices", type=int, default=10000, help="facturas para calcular_lote")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print(f"NumPy disponible: {totales._numpy() is not None}")
+    print(f"{'líneas':>8} {'float_loop':>12} {'round_loop':>12} {'decimal':>12} {'vectorial':>12}")
+    for n in (int(x) for x in args.lines.split(",")):
+        cantidades, precios = random_lines(n, rng)
+        exacto = engine_decimal(cantidades, precios)
+        if totales._numpy() is not None:
+            assert engine_vectorial(cantidades, precios).total_cents == exacto.total_cents
+        row = [best_of(lambda f=f: f(cantidades, precios), args.repeat) * 1000
+               for f in (float_loop, round_loop, engine_decimal)]
+        row.append(best_of(lambda: engine_vectorial(cantidades, precios), args.repeat) * 1000
+                   if totales._numpy() is not None else float("nan"))
+        print(f"{n:>8} " + " ".join(f"{ms:>10.2f}ms" for ms in row))
+
+    facturas = [random_lines(rng.randint(1, 30), rng) for _ in range(args.invoices)]
+    lote = calcular_lote(facturas)
+    assert [t.total_cents for t in lote] == [engine_decimal(c, p).total_cents for c, p in facturas]
+    por_factura = best_of(lambda: [float_loop(c, p) for c, p in facturas], args.repeat)
+    por_decimal = best_of(lambda: [engine_decimal(c, p) for c, p in facturas], args.repeat)
+    por_lote = best_of(lambda: calcular_lote(facturas), args.repeat)
+    print(f"\n{args.invoices} facturas: float_loop {por_factura * 1000:.1f}ms, "
+          f"decimal por factura {por_decimal * 1000:.1f}ms, calcular_lote {por_lote * 1000:.1f}ms")
+
+    diff = mismatches(5000, rng)
+    print(f"\nFacturas (de 5000) con diferencia de al menos un céntimo frente al cálculo exacto: {diff}")
+
+
+if __name__ == "__main__":
+    main()
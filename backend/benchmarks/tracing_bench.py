@@ -0,0 +1,116 @@
+"""Costo de las trazas (tracing.py) y del perfilado a pedido (profiling.py).
+
+1. Por llamada: `with span(...)` y una función con @traced, sin tracer y con tracer.
+2. De punta a punta por HTTP (TestClient), una extracción por reglas y un PDF de
+   --items ítems, con el mismo app envuelto de cuatro formas: sin nada (lo que corre
+   sin TRACE_FILE ni ADMIN_TOKEN), con el middleware de perfilado sin pedir perfil,
+   con trazas a un archivo OTLP/JSON, y perfilando cada petición.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.tracing_bench --repeat 500
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+import tracing
+from benchmarks.sample_orders import PEGAR_EJEMPLO
+from benchmarks.stub_model import CANNED_INVOICE
+from profiling import Profiler, ProfilingMiddleware
+from tracing import Tracer, TracingMiddleware, span, traced
+
+
+def per_call_ns(fn, repeat: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter_ns() - start) / repeat
+
+
+def con_span():
+    with span("bench"):
+        pass
+
+
+@traced("bench")
+def decorada():
+    pass
+
+
+def sin_nada():
+    pass
+
+
+def per_request_ms(client, path: str, body: dict, headers: dict, repeat: int) -> float:
+    client.post(path, json=body, headers=headers)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        client.post(path, json=body, headers=headers)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        n = args.repeat * 200
+        # El hilo exportador no despierta durante el bucle: se mide lo que paga la petición
+        micro = Tracer(os.path.join(tmp, "micro.jsonl"), max_queue=2 * n, interval=3600)
+        print("Por llamada:")
+        for label, activo in (("sin tracer", None), ("con tracer", micro)):
+            tracing._tracer = activo
+            base = per_call_ns(sin_nada, n)
+            print(f"   {label}: with span() {per_call_ns(con_span, n):7.0f} ns, "
+                  f"@traced {per_call_ns(decorada, n) - base:7.0f} ns extra")
+        tracing._tracer = None
+        inicio = time.perf_counter()
+        micro.cerrar(timeout=None)
+        print(f"   exportar {micro.stats['exportados']:,} spans a OTLP/JSON (hilo aparte): "
+              f"{(time.perf_counter() - inicio) / micro.stats['exportados'] * 1e6:.1f} µs por span")
+
+        tracer = Tracer(os.path.join(tmp, "trazas.jsonl"))
+
+        # Sin registro, correlativos ni caché de PDFs: se mide solo el camino de la petición
+        main.registro = main.correlativos = main.pdf_cache = main.maestros = None
+        profiler = Profiler("bench", os.path.join(tmp, "profiles"), keep=args.repeat * 4)
+        routes = main.app.router.routes
+        variantes = (
+            ("sin trazas ni perfilado", main.app, None, {}),
+            ("middleware de perfilado, sin pedir", ProfilingMiddleware(main.app, profiler), None, {}),
+            ("trazas a archivo (OTLP/JSON)", TracingMiddleware(main.app, routes), tracer, {}),
+            ("perfilando cada petición", ProfilingMiddleware(main.app, profiler), None,
+             {"X-Profile": "1", "X-Admin-Token": "bench"}),
+        )
+        pedido = {"texto_factura": PEGAR_EJEMPLO, "usar_cache": False}
+        factura = dict(CANNED_INVOICE, items=[CANNED_INVOICE["items"][i % 2] for i in range(args.items)])
+        # Rondas alternando las variantes; se queda el mejor tiempo de cada una (menos ruido)
+        mejores = {}
+        for _ in range(args.rounds):
+            for label, app, activo, headers in variantes:
+                tracing._tracer = activo
+                with TestClient(app) as client:
+                    reglas = per_request_ms(client, "/procesar-factura", pedido, headers, args.repeat)
+                    pdf = per_request_ms(client, "/generar-pdf", factura, headers, args.repeat)
+                previo = mejores.get(label, (reglas, pdf))
+                mejores[label] = (min(previo[0], reglas), min(previo[1], pdf))
+        print(f"\nPor petición (TestClient, mejor de {args.rounds} rondas de {args.repeat} peticiones):")
+        print(f"   {'':<36} {'reglas':>10} {f'PDF {args.items} ítems':>14}")
+        for label, (reglas, pdf) in mejores.items():
+            print(f"   {label:<36} {reglas:8.3f} ms {pdf:11.3f} ms")
+        tracing._tracer = None
+        tracer.cerrar()
+        print(f"\n   spans exportados: {tracer.stats['exportados']:,}, descartados: {tracer.stats['descartados']:,}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,120 @@
+"""XML UBL 2.1 firmado (ubl_sunat.py): documentos por minuto y por núcleo.
+
+Con un certificado autofirmado RSA-2048 de prueba:
+1. Por documento (facturas de --items ítems): solo la plantilla, plantilla + digest +
+   firma, y el paquete ZIP de envío. Como referencia, lo que costaría pasar por un DOM:
+   parsear el XML y canonicalizarlo (ElementTree), y firmar con signxml/lxml si está instalado.
+2. Verificación independiente de la firma con signxml (si está instalado).
+3. Lote: stream_zip con el pool de procesos (lo que hace /generar-xmls), XML + ZIP por documento.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.ubl_bench --items 10,100 --lote 5000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+
+from benchmarks.stub_model import CANNED_INVOICE
+from schemas import InvoiceData
+import ubl_sunat
+from ubl_sunat import Firmante, generar_xml, generar_certificado_prueba, nombre_archivo, paquete_sunat
+
+
+def invoice(items: int, numero: int = 1) -> InvoiceData:
+    base = CANNED_INVOICE["items"]
+    return InvoiceData(**dict(CANNED_INVOICE, serie_correlativo=f"F001-{numero:08d}", document_type="Factura",
+                              items=[dict(base[i % 2], cantidad=i + 1) for i in range(items)]))
+
+
+def per_call_us(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def line(label: str, us: float):
+    print(f"   {label:<42} {us:9.1f} µs  -> {60e6 / us:>10,.0f} docs/min por núcleo")
+
+
+def signxml_tools():
+    try:
+        from lxml import etree
+        from signxml import XMLSigner, XMLVerifier, methods
+    except ImportError:
+        return None
+    return etree, XMLSigner, XMLVerifier, methods
+
+
+def run(args, cert_path: str):
+    firmante = Firmante.desde_archivo(cert_path)
+    with open(cert_path, "rb") as f:
+        pem = f.read()
+    cert_pem = pem[pem.index(b"-----BEGIN CERTIFICATE-----"):]
+    tools = signxml_tools()
+
+    for items in args.items:
+        inv = invoice(items)
+        xml = generar_xml(inv, firmante)
+        nombre = nombre_archivo(inv)
+        print(f"{items} ítems ({len(xml) / 1024:.1f} KB firmado):")
+        line("plantilla (sin firma)", per_call_us(lambda: generar_xml(inv), args.repeat))
+        line("plantilla + digest + firma RSA", per_call_us(lambda: generar_xml(inv, firmante), args.repeat))
+        line("... + ZIP de envío", per_call_us(lambda: paquete_sunat(nombre, generar_xml(inv, firmante)), args.repeat))
+        line("referencia: parsear + C14N (ElementTree)",
+             per_call_us(lambda: ET.canonicalize(xml_data=generar_xml(inv).decode("utf-8")), args.repeat))
+        if tools is not None:
+            etree, XMLSigner, _, methods = tools
+            key = pem[:pem.index(b"-----BEGIN CERTIFICATE-----")]
+            signer = XMLSigner(method=methods.enveloped, c14n_algorithm=ubl_sunat.C14N)
+            line("referencia: signxml (DOM lxml)", per_call_us(
+                lambda: etree.tostring(signer.sign(etree.fromstring(generar_xml(inv)), key=key, cert=cert_pem)),
+                max(args.repeat // 10, 10)))
+
+    print("\nVerificación independiente:")
+    if tools is None:
+        print("   signxml no está instalado (pip install signxml)")
+    else:
+        etree, _, XMLVerifier, _ = tools
+        for items in args.items:
+            XMLVerifier().verify(generar_xml(invoice(items), firmante), x509_cert=cert_pem.decode("ascii"))
+        print(f"   signxml verifica la firma (digest y SignatureValue) para {', '.join(map(str, args.items))} ítems")
+
+    print(f"\nLote de {args.lote:,} documentos de {args.items[0]} ítems en el pool (XML + ZIP por documento):")
+    asyncio.run(batch(args))
+
+
+async def batch(args):
+    from pdf_bulk import PDF_WORKERS, shutdown_pdf_pool, stream_zip
+
+    invoices = [invoice(args.items[0], i + 1) for i in range(args.lote)]
+    size = 0
+    start = time.perf_counter()
+    async for chunk in stream_zip(invoices, ubl_sunat.xml_entries, ubl_sunat.xml_filename, "XMLs",
+                                  compression=zipfile.ZIP_DEFLATED):
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    shutdown_pdf_pool()
+    print(f"   {elapsed:.2f}s, ZIP de {size / 2**20:.1f} MB -> {args.lote / elapsed * 60:,.0f} docs/min "
+          f"con {PDF_WORKERS} procesos ({args.lote / elapsed * 60 / PDF_WORKERS:,.0f} por núcleo)")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=lambda v: [int(x) for x in v.split(",")], default=[10, 100])
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--lote", type=int, default=5000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        cert_path = generar_certificado_prueba(os.path.join(tmp, "prueba.pem"))
+        # Los procesos del pool cargan el certificado desde el entorno
+        os.environ["UBL_CERT_PATH"] = cert_path
+        run(args, cert_path)
+
+
+if __name__ == "__main__":
+    main_cli()
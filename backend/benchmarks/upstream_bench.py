@@ -0,0 +1,78 @@
+"""Coalescencia y limitador adaptativo frente a un modelo falso con cuota (upstream.py).
+
+1. Ráfaga de pedidos idénticos (varias cajas con la misma plantilla): llamadas a
+   Gemini con y sin coalescencia.
+2. Ráfaga de pedidos distintos contra una cuota de `--quota` llamadas/s que
+   responde 429 al superarla: sin reintentos, con reintentos (espera
+   exponencial con jitter) y con reintentos + limitador adaptativo que arranca
+   por encima de la cuota.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.upstream_bench --requests 300 --templates 10 --quota 20
+"""
+import argparse
+import asyncio
+import time
+
+import main
+from benchmarks.stub_model import StubModel
+from model_router import ModelRouter
+from upstream import AdaptiveRateLimiter, SingleFlight
+
+
+async def burst(texts):
+    results = await asyncio.gather(*(main.extract_invoice_data_async(t) for t in texts))
+    return sum("error_message" not in data for data, _ in results)
+
+
+def configure(quota=0, rate=0.0, retries=0, coalesce=True, latency=0.2, concurrency=64):
+    main.model = StubModel(latency=latency, quota=quota)
+    main.limiter = AdaptiveRateLimiter(rate, max_rate=rate)
+    main.single_flight = SingleFlight()
+    # Un solo modelo: sin hedge ni fallback, para medir solo el limitador
+    main.router = ModelRouter(main.GEMINI_MODELS[:1], hedge=False, explore=0)
+    main.GEMINI_MAX_RETRIES = retries
+    main.GEMINI_COALESCE = coalesce
+    main.gemini_semaphore = asyncio.Semaphore(concurrency)
+
+
+async def run(args):
+    print(f"1) {args.requests} pedidos a la vez con {args.templates} textos distintos")
+    texts = [f"Boleta para cliente {i % args.templates}, 1 martillo a 20 soles" for i in range(args.requests)]
+    for coalesce in (False, True):
+        configure(coalesce=coalesce)
+        start = time.perf_counter()
+        ok = await burst(texts)
+        print(f"   coalescencia={'sí' if coalesce else 'no':<3} ok={ok:>4}  llamadas a Gemini={main.model.calls:>4}  "
+              f"compartidas={main.single_flight.stats['compartidas']:>4}  tiempo={time.perf_counter() - start:5.2f}s")
+
+    print(f"\n2) {args.requests} pedidos distintos, cuota de {args.quota:g} llamadas/s")
+    texts = [f"Boleta para cliente {i}, 1 martillo a 20 soles" for i in range(args.requests)]
+    escenarios = (
+        ("sin reintentos", dict(retries=0)),
+        ("reintentos", dict(retries=args.retries)),
+        ("reintentos + limitador", dict(retries=args.retries, rate=args.quota * 2.5)),
+    )
+    for label, kwargs in escenarios:
+        configure(quota=args.quota, **kwargs)
+        start = time.perf_counter()
+        ok = await burst(texts)
+        elapsed = time.perf_counter() - start
+        stats = main.limiter.snapshot()
+        print(f"   {label:<24} ok={ok:>4}/{args.requests}  429 recibidos={main.model.throttled:>4}  "
+              f"llamadas={main.model.calls:>4}  tiempo={elapsed:5.2f}s  ritmo final={stats['ritmo']:.1f}/s")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--templates", type=int, default=10)
+    parser.add_argument("--quota", type=float, default=20)
+    parser.add_argument("--retries", type=int, default=5)
+    args = parser.parse_args()
+    main.GEMINI_BACKOFF_BASE, main.GEMINI_BACKOFF_MAX = 0.25, 4.0
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,186 @@
+"""Asignación de números correlativos por (RUC emisor, serie).
+
+El contador vive en SQLite (WAL) y es compartido por todos los workers. Cada
+proceso reserva bloques de CORRELATIVO_BLOQUE números en una transacción y los
+entrega desde memoria, así la base solo se toca una vez por bloque.
+
+Huecos:
+- Al cerrar el proceso (shutdown) lo que queda de cada bloque vuelve a la tabla
+  `libres` y se reutiliza antes de avanzar el contador.
+- Si un worker muere sin cerrar, no se sabe qué números llegó a emitir: al
+  arrancar otro worker en la misma máquina su bloque pasa a la tabla `huecos`
+  y nunca se reasigna (evita duplicados; los huecos se comunican de baja).
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from schemas import InvoiceData
+
+FORMATO = "{serie}-{numero:08d}"
+
+
+def proceso_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class CorrelativoAllocator:
+    def __init__(self, path: str, bloque: int = 50):
+        self.bloque = bloque
+        self.pid = os.getpid()
+        self.host = socket.gethostname()
+        self._lock = threading.Lock()
+        # (ruc, serie) -> [siguiente, fin, id del bloque]
+        self._bloques: Dict[Tuple[str, str], List[int]] = {}
+        self.stats = {"asignados": 0, "reservas": 0, "recuperados": 0}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: un contador que retrocede tras un corte de luz repetiría números
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS series ("
+            " ruc TEXT NOT NULL, serie TEXT NOT NULL, siguiente INTEGER NOT NULL,"
+            " PRIMARY KEY (ruc, serie));"
+            "CREATE TABLE IF NOT EXISTS bloques ("
+            " id INTEGER PRIMARY KEY, ruc TEXT NOT NULL, serie TEXT NOT NULL,"
+            " inicio INTEGER NOT NULL, fin INTEGER NOT NULL,"
+            " host TEXT NOT NULL, pid INTEGER NOT NULL, reservado REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS libres ("
+            " ruc TEXT NOT NULL, serie TEXT NOT NULL, inicio INTEGER NOT NULL, fin INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_libres_serie ON libres(ruc, serie, inicio);"
+            "CREATE TABLE IF NOT EXISTS huecos ("
+            " ruc TEXT NOT NULL, serie TEXT NOT NULL, inicio INTEGER NOT NULL, fin INTEGER NOT NULL,"
+            " detectado REAL NOT NULL);"
+        )
+        self.recuperar()
+
+    def siguiente(self, ruc: str, serie: str) -> int:
+        key = (ruc, serie)
+        with self._lock:
+            actual = self._bloques.get(key)
+            if actual is None or actual[0] >= actual[1]:
+                actual = self._reservar(ruc, serie, actual[2] if actual else None)
+                self._bloques[key] = actual
+            numero = actual[0]
+            actual[0] += 1
+            self.stats["asignados"] += 1
+            return numero
+
+    def _reservar(self, ruc: str, serie: str, agotado: Optional[int]) -> List[int]:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if agotado is not None:
+                conn.execute("DELETE FROM bloques WHERE id = ?", (agotado,))
+            libre = conn.execute(
+                "SELECT rowid, inicio, fin FROM libres WHERE ruc = ? AND serie = ? ORDER BY inicio LIMIT 1",
+                (ruc, serie),
+            ).fetchone()
+            if libre is not None:
+                rowid, inicio, fin_libre = libre
+                fin = min(fin_libre, inicio + self.bloque)
+                if fin < fin_libre:
+                    conn.execute("UPDATE libres SET inicio = ? WHERE rowid = ?", (fin, rowid))
+                else:
+                    conn.execute("DELETE FROM libres WHERE rowid = ?", (rowid,))
+            else:
+                inicio = conn.execute(
+                    "INSERT INTO series (ruc, serie, siguiente) VALUES (?, ?, ?)"
+                    " ON CONFLICT (ruc, serie) DO UPDATE SET siguiente = siguiente + ?"
+                    " RETURNING siguiente",
+                    (ruc, serie, 1 + self.bloque, self.bloque),
+                ).fetchone()[0] - self.bloque
+                fin = inicio + self.bloque
+            bloque_id = conn.execute(
+                "INSERT INTO bloques (ruc, serie, inicio, fin, host, pid, reservado) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ruc, serie, inicio, fin, self.host, self.pid, time.time()),
+            ).lastrowid
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.stats["reservas"] += 1
+        return [inicio, fin, bloque_id]
+
+    def liberar(self):
+        """Devuelve a `libres` lo no usado de cada bloque (al apagar el proceso)."""
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for (ruc, serie), (siguiente, fin, bloque_id) in self._bloques.items():
+                    if siguiente < fin:
+                        conn.execute(
+                            "INSERT INTO libres (ruc, serie, inicio, fin) VALUES (?, ?, ?, ?)",
+                            (ruc, serie, siguiente, fin),
+                        )
+                    conn.execute("DELETE FROM bloques WHERE id = ?", (bloque_id,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._bloques.clear()
+
+    def recuperar(self) -> int:
+        """Pasa a `huecos` los bloques de procesos muertos de esta máquina."""
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                muertos = [
+                    row for row in conn.execute(
+                        "SELECT id, ruc, serie, inicio, fin, pid FROM bloques WHERE host = ?", (self.host,)
+                    )
+                    if row[5] != self.pid and not proceso_vivo(row[5])
+                ]
+                now = time.time()
+                for bloque_id, ruc, serie, inicio, fin, _ in muertos:
+                    conn.execute(
+                        "INSERT INTO huecos (ruc, serie, inicio, fin, detectado) VALUES (?, ?, ?, ?, ?)",
+                        (ruc, serie, inicio, fin, now),
+                    )
+                    conn.execute("DELETE FROM bloques WHERE id = ?", (bloque_id,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if muertos:
+            print(f"🕳️ {len(muertos)} bloques de correlativos de procesos caídos pasaron a huecos")
+        self.stats["recuperados"] += len(muertos)
+        return len(muertos)
+
+    def huecos(self, ruc: Optional[str] = None) -> List[dict]:
+        sql = "SELECT ruc, serie, inicio, fin, detectado FROM huecos"
+        params = ()
+        if ruc:
+            sql += " WHERE ruc = ?"
+            params = (ruc,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY ruc, serie, inicio", params).fetchall()
+        return [
+            {"ruc": r[0], "serie": r[1], "desde": r[2], "hasta": r[3] - 1, "detectado": r[4]}
+            for r in rows
+        ]
+
+    def asignar(self, invoice: InvoiceData) -> InvoiceData:
+        """Reemplaza el correlativo provisional (p. ej. "F001-00001") por el siguiente de la serie."""
+        serie = invoice.serie_correlativo.split("-")[0] or "B001"
+        numero = self.siguiente(invoice.emisor_ruc, serie)
+        invoice.serie_correlativo = FORMATO.format(serie=serie, numero=numero)
+        return invoice
+
+
+def allocator_from_env() -> Optional[CorrelativoAllocator]:
+    path = os.getenv("CORRELATIVOS_DB_PATH", "correlativos.sqlite3")
+    if not path:
+        return None
+    return CorrelativoAllocator(path, bloque=int(os.getenv("CORRELATIVO_BLOQUE", "50")))
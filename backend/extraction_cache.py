@@ -0,0 +1,211 @@
+"""Caché de extracciones en dos niveles, indexado por el texto normalizado.
+
+Nivel 1: LRU en memoria con TTL (por proceso).
+Nivel 2: SQLite en disco, sobrevive a reinicios del contenedor.
+
+Las fechas relativas ("Hoy", "mañana", "a 30 días") se guardan como un
+desplazamiento en días respecto al día de la extracción y se vuelven a
+resolver al servir la entrada, para que una boleta cacheada ayer no salga
+con la fecha de ayer.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Optional
+
+DATE_FIELDS = ("fecha_emision", "fecha_vencimiento")
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y")
+_DATE_IN_TEXT = re.compile(r"\b(\d{1,2}[/-]\d{1,2}[/-]\d{4}|\d{4}-\d{1,2}-\d{1,2})\b")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sin tildes y con los espacios colapsados."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _SPACES.sub(" ", text.lower()).strip()
+
+
+def cache_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def _parse_date(value: str):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt).date(), fmt
+        except (ValueError, AttributeError):
+            continue
+    return None, None
+
+
+def _explicit_dates(text: str) -> set:
+    found = set()
+    for token in _DATE_IN_TEXT.findall(text):
+        parsed, _ = _parse_date(token)
+        if parsed:
+            found.add(parsed)
+    return found
+
+
+def to_relative(text: str, data: dict, today: date) -> dict:
+    """Convierte las fechas que no aparecen literalmente en el texto en desplazamientos."""
+    explicit = _explicit_dates(text)
+    relative = {}
+    for field in DATE_FIELDS:
+        parsed, fmt = _parse_date(str(data.get(field, "")))
+        if parsed and parsed not in explicit:
+            relative[field] = [(parsed - today).days, fmt]
+    return relative
+
+
+def resolve_relative(data: dict, relative: dict, today: date) -> dict:
+    if not relative:
+        return data
+    data = dict(data)
+    for field, (offset, fmt) in relative.items():
+        data[field] = date.fromordinal(today.toordinal() + offset).strftime(fmt)
+    return data
+
+
+class MemoryLRU:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: dict):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteStore:
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extracciones ("
+            " clave TEXT PRIMARY KEY, valor TEXT NOT NULL,"
+            " creado REAL NOT NULL, accedido REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_extracciones_accedido ON extracciones(accedido)")
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT valor, creado FROM extracciones WHERE clave = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] + self.ttl < now:
+                self._conn.execute("DELETE FROM extracciones WHERE clave = ?", (key,))
+                return None
+            self._conn.execute("UPDATE extracciones SET accedido = ? WHERE clave = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extracciones (clave, valor, creado, accedido) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM extracciones WHERE creado < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM extracciones WHERE clave IN ("
+            " SELECT clave FROM extracciones ORDER BY accedido DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM extracciones").fetchone()[0]
+
+
+class ExtractionCache:
+    def __init__(self, memory: MemoryLRU, disk: Optional[SQLiteStore] = None):
+        self.memory = memory
+        self.disk = disk
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypass": 0}
+
+    def get(self, text: str) -> Optional[dict]:
+        key = cache_key(text)
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.stats["memory_hits"] += 1
+        elif self.disk is not None and (entry := self.disk.get(key)) is not None:
+            self.stats["disk_hits"] += 1
+            self.memory.put(key, entry)
+        else:
+            self.stats["misses"] += 1
+            return None
+        return resolve_relative(entry["data"], entry.get("relative"), date.today())
+
+    def put(self, text: str, data: dict):
+        key = cache_key(text)
+        entry = {"data": data, "relative": to_relative(text, data, date.today())}
+        self.memory.put(key, entry)
+        if self.disk is not None:
+            self.disk.put(key, entry)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self.disk) if self.disk is not None else 0,
+        }
+
+
+def cache_from_env() -> ExtractionCache:
+    memory = MemoryLRU(
+        max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+        ttl=float(os.getenv("CACHE_TTL", "3600")),
+    )
+    path = os.getenv("CACHE_DB_PATH", "cache_facturas.sqlite3")
+    disk = None
+    if path:
+        disk = SQLiteStore(
+            path,
+            max_entries=int(os.getenv("CACHE_DISK_MAX_ENTRIES", "100000")),
+            ttl=float(os.getenv("CACHE_DISK_TTL", str(7 * 24 * 3600))),
+        )
+    return ExtractionCache(memory, disk)
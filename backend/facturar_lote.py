@@ -0,0 +1,392 @@
+"""Procesamiento masivo sin HTTP: JSONL de pedidos o facturas -> PDFs + resultados.jsonl.
+
+Cada línea de la entrada es:
+- un pedido en texto: una cadena JSON o un objeto con "texto_factura", "texto" o "body"
+  (la forma de requests.jsonl). Sigue el mismo camino que /procesar-factura (caché, reglas,
+  datos maestros, Gemini) y se emite: recibe su número de la serie y queda en el registro;
+- o un InvoiceData (objeto con "items"): solo se renderiza, con el número que trae.
+"id" o "request_id", si vienen, pasan al resultado y al nombre del PDF. Con --xml, además
+el XML UBL firmado y su ZIP de envío a SUNAT (ubl_sunat.py, necesita UBL_CERT_PATH).
+
+La extracción corre con concurrencia acotada (--concurrencia) y los PDFs en el pool de
+procesos de pdf_bulk.py; nunca hay más de --ventana registros en vuelo y la entrada se lee
+línea a línea, así la memoria no depende del tamaño del archivo. En la salida quedan
+pdf/<línea>_<id>.pdf, resultados.jsonl (una línea por registro, en el orden en que
+terminan), emitidos.jsonl y checkpoint.json; con --xml, también xml/<nombre>.xml y
+sunat/<nombre>.zip.
+
+El checkpoint guarda la línea y el offset de la entrada hasta donde todo terminó, las líneas
+ya terminadas después de esa y el tamaño de resultados.jsonl. Con la misma salida, una
+segunda ejecución sigue desde ahí; lo escrito en resultados.jsonl después del último
+checkpoint se relee para no repetir esos registros. Cada pedido emitido se anota en
+emitidos.jsonl en cuanto recibe su número: si el corte lo deja sin resultado, al reanudar
+se imprime con ese mismo documento en vez de extraerlo y emitirlo otra vez (sin números
+duplicados en la serie ni en el registro).
+
+Uso (desde la carpeta backend):
+    python facturar_lote.py pedidos.jsonl --salida lote/ --concurrencia 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+
+import main
+from pdf_bulk import PDF_WORKERS, get_pdf_pool, render_pdf_to_file, shutdown_pdf_pool
+from schemas import InvoiceData
+from ubl_sunat import escribir_xml, firmante_from_env
+
+TEXT_KEYS = ("texto_factura", "texto", "body")
+ID_KEYS = ("id", "request_id")
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def parse_record(raw: bytes):
+    """Devuelve (id o None, texto o None, InvoiceData o None)."""
+    value = json.loads(raw)
+    if isinstance(value, str):
+        return None, value, None
+    if not isinstance(value, dict):
+        raise ValueError("Cada línea debe ser un texto o un objeto JSON")
+    record_id = next((str(value[k]) for k in ID_KEYS if value.get(k) is not None), None)
+    if "items" in value:
+        return record_id, None, InvoiceData(**value)
+    for key in TEXT_KEYS:
+        if isinstance(value.get(key), str):
+            return record_id, value[key], None
+    raise ValueError(f"El objeto no tiene 'items' ni texto ({', '.join(TEXT_KEYS)})")
+
+
+def count_lines(path: str) -> int:
+    lines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    return lines + (last != b"\n")
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Lote:
+    def __init__(self, entrada: str, salida: str, concurrencia: int, ventana: int,
+                 usar_cache: bool = True, progreso: float = 5.0, checkpoint_cada: float = 2.0,
+                 xml: bool = False):
+        self.entrada = os.path.abspath(entrada)
+        self.salida = salida
+        self.pdf_dir = os.path.join(salida, "pdf")
+        self.checkpoint_path = os.path.join(salida, "checkpoint.json")
+        self.resultados_path = os.path.join(salida, "resultados.jsonl")
+        self.emitidos_path = os.path.join(salida, "emitidos.jsonl")
+        self.concurrencia = concurrencia
+        self.ventana = max(ventana, 1)
+        self.usar_cache = usar_cache
+        self.xml = xml
+        self.cada_progreso = progreso
+        self.cada_checkpoint = checkpoint_cada
+
+        self.siguiente = (1, 0)  # (línea, offset) de la próxima línea sin leer
+        self.en_vuelo = {}  # línea -> offset, en orden de lectura
+        self.hechas = set()  # líneas terminadas a partir de la marca del checkpoint
+        self.ok = self.errores = 0
+        self.caminos = Counter()
+        self.causas = Counter()
+        self.ejemplos = {}  # causa -> primer mensaje de error
+        self.completo = False
+        self.resultados = None
+        self.emitidos = {}  # línea -> {"camino", "data"} de lo emitido que aún no tiene resultado
+        self.diario = None  # emitidos.jsonl, abierto para agregar
+        self.inicio = time.perf_counter()
+        self.hechos_ahora = 0  # registros terminados en esta ejecución
+
+    # --- checkpoint ---
+
+    def reanudar(self, reiniciar: bool = False):
+        os.makedirs(self.pdf_dir, exist_ok=True)
+        if self.xml:
+            os.makedirs(os.path.join(self.salida, "xml"), exist_ok=True)
+            os.makedirs(os.path.join(self.salida, "sunat"), exist_ok=True)
+        if reiniciar or not os.path.exists(self.checkpoint_path):
+            self.resultados = open(self.resultados_path, "wb")
+            self.diario = open(self.emitidos_path, "wb")
+            return
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state["entrada"] != self.entrada:
+            raise SystemExit(f"❌ {self.salida} tiene el checkpoint de otra entrada ({state['entrada']}); "
+                             "usa otra salida o --reiniciar")
+        self.siguiente = (state["linea"], state["offset"])
+        self.hechas = set(state["hechas"])
+        self.ok, self.errores = state["ok"], state["errores"]
+        self.caminos.update(state["caminos"])
+        self.causas.update(state["causas"])
+        self.ejemplos = state["ejemplos"]
+        self.completo = state["completo"]
+
+        # Lo que terminó después del último checkpoint ya está en resultados.jsonl
+        self.resultados = open(self.resultados_path, "r+b")
+        self.resultados.seek(state["resultados_bytes"])
+        fin, recuperados = state["resultados_bytes"], 0
+        for raw in self.resultados:
+            if not raw.endswith(b"\n"):
+                break  # Línea a medio escribir: se trunca y el registro se repite
+            self.contar(json.loads(raw))
+            fin += len(raw)
+            recuperados += 1
+        self.resultados.truncate(fin)
+        self.resultados.seek(fin)
+
+        # Emitidos sin resultado: se reutilizan en vez de pedir otro número
+        if os.path.exists(self.emitidos_path):
+            with open(self.emitidos_path, "rb") as f:
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break
+                    emitido = json.loads(raw)
+                    linea = emitido.pop("linea")
+                    if linea >= self.siguiente[0] and linea not in self.hechas:
+                        self.emitidos[linea] = emitido
+        self._compactar_diario()
+        print(f"↩️ Reanudando desde la línea {self.siguiente[0]:,} ({self.ok + self.errores:,} registros hechos, "
+              f"{recuperados} recuperados de resultados.jsonl, {len(self.emitidos)} emitidos por imprimir)")
+
+    def _compactar_diario(self):
+        """Reescribe emitidos.jsonl solo con lo emitido que aún no tiene resultado."""
+        if self.diario is not None:
+            self.diario.close()
+        tmp = self.emitidos_path + ".tmp"
+        with open(tmp, "wb") as f:
+            for linea, emitido in self.emitidos.items():
+                f.write(json.dumps({"linea": linea, **emitido}, ensure_ascii=False).encode("utf-8") + b"\n")
+        os.replace(tmp, self.emitidos_path)
+        self.diario = open(self.emitidos_path, "ab")
+
+    def anotar_emision(self, linea: int, camino: str, data: dict):
+        """Deja constancia del número asignado antes de renderizar: un corte después ya no
+        lo pierde. Una sola escritura por línea, enviada al sistema en el acto."""
+        self.emitidos[linea] = {"camino": camino, "data": data}
+        self.diario.write(json.dumps({"linea": linea, "camino": camino, "data": data},
+                                     ensure_ascii=False).encode("utf-8") + b"\n")
+        self.diario.flush()
+
+    def guardar_checkpoint(self):
+        self.resultados.flush()
+        os.fsync(self.resultados.fileno())
+        # Marca: todo lo anterior a la primera línea en vuelo (o a la próxima sin leer) terminó
+        linea, offset = next(iter(self.en_vuelo.items())) if self.en_vuelo else self.siguiente
+        self.hechas = {h for h in self.hechas if h >= linea}
+        state = {
+            "entrada": self.entrada, "linea": linea, "offset": offset, "hechas": sorted(self.hechas),
+            "resultados_bytes": self.resultados.tell(), "ok": self.ok, "errores": self.errores,
+            "caminos": self.caminos, "causas": self.causas, "ejemplos": self.ejemplos,
+            "completo": self.completo,
+        }
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self.checkpoint_path)
+        # Lo que ya tiene resultado sale del diario (así no crece con el lote)
+        self._compactar_diario()
+
+    # --- registros ---
+
+    def fallo(self, resultado: dict, etapa: str, causa: str, error: str) -> dict:
+        resultado.update(ok=False, etapa=etapa, causa=f"{etapa} {causa}", error=error)
+        return resultado
+
+    async def procesar(self, linea: int, raw: bytes) -> dict:
+        resultado = {"linea": linea}
+        try:
+            record_id, texto, invoice = parse_record(raw)
+        except Exception as e:
+            return self.fallo(resultado, "entrada", type(e).__name__, str(e))
+        if record_id is not None:
+            resultado["id"] = record_id
+
+        emitido = self.emitidos.get(linea)
+        if texto is None:
+            resultado["camino"] = "datos"
+        elif emitido is not None:
+            # Emitido antes del corte: mismo número, sin volver a extraer ni emitir
+            invoice = InvoiceData(**emitido["data"])
+            resultado["camino"] = emitido["camino"]
+        else:
+            request = main.InvoiceRequest(texto_factura=texto, usar_cache=self.usar_cache)
+            async with self.semaforo:
+                try:
+                    invoice, headers = await main.resolve_invoice(request, log=False)
+                except HTTPException as e:
+                    return self.fallo(resultado, "extraccion", str(e.status_code), str(e.detail))
+                except Exception as e:
+                    return self.fallo(resultado, "extraccion", type(e).__name__, str(e))
+            resultado["camino"] = headers["X-Extraction-Path"]
+            # Como /factura-pdf: el pedido se emite recién después de extraerlo
+            try:
+                invoice, _ = main.emitir(invoice)
+            except HTTPException as e:
+                return self.fallo(resultado, "emision", str(e.status_code), str(e.detail))
+            except Exception as e:
+                return self.fallo(resultado, "emision", type(e).__name__, str(e))
+            self.anotar_emision(linea, resultado["camino"], invoice.model_dump())
+
+        data = invoice.model_dump()
+        nombre = f"{linea:06d}_{_UNSAFE_CHARS.sub('_', record_id or invoice.serie_correlativo)}.pdf"
+        try:
+            size = await asyncio.get_running_loop().run_in_executor(
+                get_pdf_pool(), render_pdf_to_file, data, os.path.join(self.pdf_dir, nombre))
+        except BrokenProcessPool as e:
+            # Un worker murió: el próximo registro crea un pool nuevo
+            shutdown_pdf_pool()
+            return self.fallo(dict(resultado, data=data), "pdf", type(e).__name__, str(e))
+        except Exception as e:
+            return self.fallo(dict(resultado, data=data), "pdf", type(e).__name__, str(e))
+        resultado.update(archivo=f"pdf/{nombre}", bytes=size)
+        if self.xml:
+            try:
+                sunat = await asyncio.get_running_loop().run_in_executor(get_pdf_pool(), escribir_xml, data, self.salida)
+            except Exception as e:
+                return self.fallo(dict(resultado, data=data), "xml", type(e).__name__, str(e))
+            resultado.update(xml=f"xml/{sunat}.xml", zip=f"sunat/{sunat}.zip")
+        resultado.update(ok=True, data=data)
+        return resultado
+
+    def contar(self, resultado: dict):
+        self.hechas.add(resultado["linea"])
+        if resultado["ok"]:
+            self.ok += 1
+            self.caminos[resultado["camino"]] += 1
+        else:
+            self.errores += 1
+            self.causas[resultado["causa"]] += 1
+            self.ejemplos.setdefault(resultado["causa"], " ".join(resultado["error"].split())[:200])
+
+    def registrar(self, resultado: dict):
+        self.resultados.write(json.dumps(resultado, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.en_vuelo.pop(resultado["linea"], None)
+        self.emitidos.pop(resultado["linea"], None)
+        self.contar(resultado)
+        self.hechos_ahora += 1
+        now = time.perf_counter()
+        if now - self.ultimo_checkpoint >= self.cada_checkpoint:
+            self.guardar_checkpoint()
+            self.ultimo_checkpoint = now
+        if now - self.ultimo_progreso >= self.cada_progreso:
+            self.mostrar_progreso()
+            self.ultimo_progreso = now
+
+    # --- ejecución ---
+
+    async def esperar(self, tareas: dict):
+        done, _ = await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            del tareas[task]
+            self.registrar(task.result())
+
+    async def correr(self):
+        self.semaforo = asyncio.Semaphore(self.concurrencia)
+        self.total = count_lines(self.entrada)
+        self.inicio = self.ultimo_progreso = self.ultimo_checkpoint = time.perf_counter()
+        tareas = {}
+        try:
+            linea, offset = self.siguiente
+            with open(self.entrada, "rb") as f:
+                f.seek(offset)
+                for raw in f:
+                    actual, linea, offset = linea, linea + 1, offset + len(raw)
+                    self.siguiente = (linea, offset)
+                    if actual in self.hechas or not raw.strip():
+                        continue
+                    while len(tareas) >= self.ventana:
+                        await self.esperar(tareas)
+                    self.en_vuelo[actual] = offset - len(raw)
+                    tareas[asyncio.ensure_future(self.procesar(actual, raw))] = actual
+            while tareas:
+                await self.esperar(tareas)
+            self.completo = True
+        finally:
+            # Interrumpido: lo que estaba en vuelo queda sin marcar y se repite al reanudar
+            # (lo ya emitido, con su número de emitidos.jsonl)
+            for task in tareas:
+                task.cancel()
+            self.guardar_checkpoint()
+            self.resultados.close()
+            self.diario.close()
+
+    def mostrar_progreso(self):
+        hechos = self.ok + self.errores
+        elapsed = time.perf_counter() - self.inicio
+        rate = self.hechos_ahora / elapsed if elapsed else 0.0
+        pendientes = max(self.total - hechos, 0)
+        eta = f"{pendientes / rate / 60:.1f} min" if rate else "-"
+        pct = hechos / self.total if self.total else 1.0
+        print(f"⏳ {hechos:,}/{self.total:,} ({pct:.1%}) · {rate:.1f} reg/s · {self.errores:,} errores · "
+              f"ETA {eta} · RSS pico {peak_rss_mb():.0f} MB")
+
+    def mostrar_resumen(self):
+        elapsed = time.perf_counter() - self.inicio
+        rate = self.hechos_ahora / elapsed if elapsed else 0.0
+        estado = "✅ Lote terminado" if self.completo else "⏸️ Lote interrumpido"
+        print(f"{estado}: {self.ok + self.errores:,} registros ({self.ok:,} ok, {self.errores:,} errores); "
+              f"esta ejecución {self.hechos_ahora:,} en {elapsed:.1f}s -> {rate:.1f} reg/s "
+              f"(RSS pico {peak_rss_mb():.0f} MB)")
+        if self.caminos:
+            print("   caminos: " + ", ".join(f"{k}={v:,}" for k, v in self.caminos.most_common()))
+        for causa, n in self.causas.most_common(10):
+            print(f"   ❌ {causa} ({n:,}): {self.ejemplos.get(causa, '')}")
+        if not self.completo:
+            print("   Para continuar, ejecuta el mismo comando con la misma --salida")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("entrada", help="JSONL de pedidos (texto) o de InvoiceData")
+    parser.add_argument("--salida", required=True,
+                        help="carpeta para pdf/, resultados.jsonl, emitidos.jsonl y checkpoint.json")
+    parser.add_argument("--concurrencia", type=int, default=main.GEMINI_MAX_CONCURRENCY,
+                        help="extracciones simultáneas")
+    parser.add_argument("--ventana", type=int, default=None,
+                        help="registros en vuelo como máximo (extracción + PDF)")
+    parser.add_argument("--sin-cache", action="store_true", help="no leer ni escribir la caché de extracción")
+    parser.add_argument("--progreso", type=float, default=5.0, help="segundos entre líneas de progreso")
+    parser.add_argument("--reiniciar", action="store_true", help="ignorar el checkpoint y empezar de cero")
+    parser.add_argument("--xml", action="store_true", help="también el XML UBL firmado y el ZIP para SUNAT")
+    args = parser.parse_args(argv)
+    if args.xml and firmante_from_env() is None:
+        parser.error("--xml necesita el certificado de firma en UBL_CERT_PATH")
+
+    ventana = args.ventana or 2 * (args.concurrencia + PDF_WORKERS)
+    lote = Lote(args.entrada, args.salida, args.concurrencia, ventana,
+                usar_cache=not args.sin_cache, progreso=args.progreso, xml=args.xml)
+    lote.reanudar(args.reiniciar)
+    if lote.completo:
+        print(f"✅ {args.salida} ya tiene este lote completo ({lote.ok:,} ok, {lote.errores:,} errores)")
+        return 0
+    print(f"📦 Lote {args.entrada} -> {args.salida}: {args.concurrencia} extracciones, "
+          f"{PDF_WORKERS} procesos de PDF, {ventana} registros en vuelo")
+    try:
+        asyncio.run(lote.correr())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_pdf_pool()
+        if main.correlativos is not None:
+            main.correlativos.liberar()
+        lote.mostrar_resumen()
+    return 0 if lote.completo else 130
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,197 @@
+"""Extractor local basado en reglas (camino rápido sin LLM).
+
+Reconoce los formatos estructurados que usa la mayoría del tráfico:
+
+    Boleta de Venta electrónica Ferretería Carlos, Dirección Av. Arequipa 500 Lima, RUC 20111945860.
+    Cliente: Juan Perez, DNI 45454545, Dirección Calle 1 Los Olivos.
+    Fecha: Hoy. Forma de pago: Contado.
+    Items:
+    - 1 Martillo (UNI) a 20 soles.
+    - 2 Cajas de Clavos (CJA) a 15 soles c/u.
+
+y la variante del README ("Item: Martillo Precio: 20 soles. Cantidad 1").
+Devuelve los datos con el mismo formato que produce Gemini y una confianza
+entre 0 y 1; main.py solo usa el resultado si supera FAST_PATH_MIN_CONFIDENCE.
+"""
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional, Tuple
+
+from llm_contract import complete_invoice
+
+_KEYWORDS = r"(?:ruc|dni|fecha|cliente|forma de pago|items?|moneda|direcci[oó]n|precio|cantidad)"
+# Un valor termina en coma, salto de línea, fin de texto o en un punto seguido de otra etiqueta.
+# Así "Av. Arequipa 500" no se corta en "Av."
+_END = rf"(?=\s*,|\s*\n|\s*$|\.\s*(?:\n|$)|\.\s+{_KEYWORDS}\b)"
+# Con separadores de miles ("1,500", "1.500.000", "1,500.50"); _number decide cuál es cuál
+_NUM = r"\d+(?:[.,]\d+)*"
+_DATE = r"\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}/\d{4}|hoy"
+_FLAGS = re.IGNORECASE | re.MULTILINE
+
+DOC_TYPE_RE = re.compile(r"\b(boleta|factura)\b", _FLAGS)
+EMISOR_NAME_RE = re.compile(
+    rf"^\s*(?:boleta de venta|boleta|factura)(?:\s+electr[oó]nica)?\s+(?:de\s+)?(?P<v>[^,\n]+?){_END}", _FLAGS
+)
+ADDRESS_RE = re.compile(rf"\bdirecci[oó]n\s*:?\s*(?P<v>.+?){_END}", _FLAGS)
+RUC_RE = re.compile(r"\bRUC\s*:?\s*(?P<v>\d{11})\b", _FLAGS)
+CLIENT_RE = re.compile(rf"\bcliente\s*:\s*(?P<v>[^,\n]+?){_END}", _FLAGS)
+CLIENT_ID_RE = re.compile(r"\b(?:DNI|RUC)\s*:?\s*(?P<v>\d{11}|\d{8})\b", _FLAGS)
+DATE_RE = re.compile(rf"\bfecha(?:\s+de\s+emisi[oó]n)?\s*:?\s*(?P<v>{_DATE})\b", _FLAGS)
+DUE_DATE_RE = re.compile(rf"\bvencimiento\s*:?\s*(?P<v>{_DATE})\b", _FLAGS)
+PAYMENT_RE = re.compile(r"\bforma de pago\s*:?\s*(?P<v>contado|cr[eé]dito)\b", _FLAGS)
+DOLLAR_RE = re.compile(r"d[oó]lar|\bUSD\b|US\$", _FLAGS)
+
+# "- 2 Cajas de Clavos (CJA) a 15 soles c/u."
+BULLET_ITEM_RE = re.compile(
+    rf"^[ \t]*[-*•][ \t]*(?P<cant>{_NUM})[ \t]+(?:x[ \t]+)?(?P<desc>[^\n]+?)"
+    rf"(?:[ \t]*\((?P<und>[A-Za-z]{{2,4}})\))?[ \t]+a[ \t]+(?:S/\.?[ \t]*)?(?P<precio>{_NUM})"
+    rf"[ \t]*(?:soles|d[oó]lares)?(?:[ \t]*c/u)?\.?[ \t]*$",
+    _FLAGS,
+)
+# "Item: Martillo Precio: 20 soles. Cantidad 1"
+INLINE_ITEM_RE = re.compile(
+    rf"\bitem\s*:\s*(?P<desc>[^\n]+?)(?:[ \t]*\((?P<und>[A-Za-z]{{2,4}})\))?[ \t]*,?[ \t]+precio\s*:?\s*(?:S/\.?\s*)?"
+    rf"(?P<precio>{_NUM})\s*(?:soles|d[oó]lares)?\s*[.,]?\s*cantidad\s*:?\s*(?P<cant>{_NUM})",
+    _FLAGS,
+)
+# Líneas que parecen un ítem; si alguna no se pudo leer, la confianza baja
+ITEM_CANDIDATE_RE = re.compile(r"^[ \t]*[-*•]|\bitem\s*:", _FLAGS)
+SECTION_SPLIT_RE = re.compile(r"\bcliente\s*:", _FLAGS)
+
+
+@dataclass
+class FastExtraction:
+    data: Optional[dict]
+    confidence: float
+
+
+def _number(value: str) -> Tuple[float, bool]:
+    """(valor, ambiguo). Con los dos separadores, el último es el decimal; una coma seguida de
+    exactamente tres dígitos es de miles ("1,500" = 1500) y un solo punto con tres dígitos
+    ("1.500") puede ser 1.5 o 1500: se lee como decimal pero se marca ambiguo."""
+    ultimo = max(value.rfind(","), value.rfind("."))
+    if ultimo < 0:
+        return float(value), False
+    entero, sep, decimales = value[:ultimo], value[ultimo], value[ultimo + 1:]
+    grupos = re.split(r"[.,]", entero)[1:]
+    if any(len(g) != 3 for g in grupos):
+        return float(entero.replace(",", "").replace(".", "") + "." + decimales), True
+    if grupos and sep in entero:
+        # "1,500,000" o "1.500.000": todos los separadores son de miles ("1,500,50" no se sabe)
+        if len(decimales) == 3:
+            return float(value.replace(sep, "")), False
+        return float(entero.replace(sep, "") + "." + decimales), True
+    if grupos or len(decimales) != 3 or entero.lstrip("0") == "":
+        # "1,500.50", "1.500,50", "1.5", "1,5", "0,500"
+        return float(entero.replace(",", "").replace(".", "") + "." + decimales), False
+    if sep == ",":
+        return float(entero + decimales), False
+    return float(value), True
+
+
+def _search(regex, text: str) -> Optional[str]:
+    match = regex.search(text)
+    return match.group("v").strip() if match else None
+
+
+# Palabras que siguen a "Factura"/"Boleta" sin ser el nombre del emisor ("Factura para ...")
+_CONECTORES = {"a", "al", "de", "del", "para", "por", "con", "en", "sin", "y", "la", "el", "los", "las"}
+
+
+def _nombre_propio(value: Optional[str]) -> Optional[str]:
+    """El valor si parece un nombre: no empieza con un conector, empieza con mayúscula o
+    dígito ("3M Perú") y no es una sola palabra en minúsculas."""
+    if not value:
+        return None
+    palabras = value.split()
+    if palabras[0].lower() in _CONECTORES or not (value[0].isupper() or value[0].isdigit()):
+        return None
+    if len(palabras) == 1 and value == value.lower():
+        return None
+    return value
+
+
+def _search_doc_type(text: str) -> Optional[str]:
+    match = DOC_TYPE_RE.search(text)
+    return match.group(1) if match else None
+
+
+def _date(value: Optional[str], today: date) -> Optional[str]:
+    if value is None:
+        return None
+    if value.lower() == "hoy":
+        return today.strftime("%d/%m/%Y")
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(value, fmt).strftime("%d/%m/%Y")
+        except ValueError:
+            continue
+    return None
+
+
+def _items(text: str) -> Tuple[list, int]:
+    """(ítems, cuántos tienen un número ambiguo)."""
+    items, ambiguos = [], 0
+    for regex in (BULLET_ITEM_RE, INLINE_ITEM_RE):
+        for m in regex.finditer(text):
+            cantidad, dudosa = _number(m.group("cant"))
+            precio, dudoso = _number(m.group("precio"))
+            ambiguos += dudosa or dudoso
+            items.append({
+                "descripcion": m.group("desc").strip(" .,"),
+                "cantidad": cantidad,
+                "unidad_medida": (m.group("und") or "UNI").upper(),
+                "precio_unitario": precio,
+            })
+    return items, ambiguos
+
+
+def fast_extract(text: str, today: Optional[date] = None) -> FastExtraction:
+    today = today or date.today()
+
+    parts = SECTION_SPLIT_RE.split(text, maxsplit=1)
+    emisor_section = parts[0]
+    client_section = "cliente:" + parts[1] if len(parts) == 2 else ""
+    # Los datos del cliente terminan donde empieza la lista de ítems
+    items_start = ITEM_CANDIDATE_RE.search(client_section)
+    if items_start:
+        client_section = client_section[:items_start.start()]
+
+    client = _search(CLIENT_RE, client_section)
+    items, ambiguos = _items(text)
+    candidates = len(ITEM_CANDIDATE_RE.findall(text))
+    # Un ítem con un número ambiguo cuenta como no leído: la confianza baja y decide el LLM
+    item_ratio = min(len(items) - ambiguos, candidates) / candidates if candidates else 0.0
+
+    optional = {
+        "emisor_ruc": _search(RUC_RE, emisor_section),
+        # Solo cuenta para la confianza si parece un nombre (no "para" en "Factura para ...")
+        "emisor_nombre": _nombre_propio(_search(EMISOR_NAME_RE, emisor_section)),
+        "client_ruc_dni": _search(CLIENT_ID_RE, client_section),
+        "fecha_emision": _date(_search(DATE_RE, text), today),
+    }
+    required = (1.0 if client else 0.0) * item_ratio
+    found = sum(1 for v in optional.values() if v)
+    confidence = round(required * (0.8 + 0.2 * found / len(optional)), 3)
+    if not required:
+        return FastExtraction(None, confidence)
+
+    doc_type = (_search_doc_type(emisor_section) or "boleta").lower()
+
+    data = {
+        "document_type": "Factura" if doc_type == "factura" else "Boleta de Venta",
+        "emisor_nombre": optional["emisor_nombre"] or "Mi Empresa S.A.C.",
+        "emisor_ruc": optional["emisor_ruc"] or "20000000001",
+        "emisor_direccion": _search(ADDRESS_RE, emisor_section) or "Dirección del Emisor",
+        "client": client,
+        "client_address": _search(ADDRESS_RE, client_section) or "Ciudad",
+        "client_ruc_dni": optional["client_ruc_dni"] or "00000000",
+        "fecha_emision": optional["fecha_emision"],
+        "fecha_vencimiento": _date(_search(DUE_DATE_RE, text), today),
+        "forma_pago": (_search(PAYMENT_RE, text) or "Contado").capitalize(),
+        "moneda": "DOLARES" if DOLLAR_RE.search(text) else "SOLES",
+        "items": items,
+    }
+    # Serie, fechas por defecto y monto en letras se calculan igual que tras el LLM
+    return FastExtraction(complete_invoice(data, today), confidence)
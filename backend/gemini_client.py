@@ -0,0 +1,42 @@
+"""Cliente de Gemini con inicialización diferida.
+
+google.generativeai es el import más pesado del backend (~550 ms): se importa,
+configura y crea cada modelo la primera vez que una petición lo necesita (o en el
+calentamiento, ver WARMUP en main.py). Los endpoints que no llaman a la IA,
+como /generar-pdf, nunca lo cargan.
+
+GEMINI_MODELS lista los modelos entre los que enruta model_router.py, en orden
+de preferencia mientras no hay datos de latencia.
+"""
+import os
+import sys
+import threading
+
+from llm_contract import SYSTEM_INSTRUCTION
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_MODELS = [
+    m.strip() for m in os.getenv("GEMINI_MODELS", f"{GEMINI_MODEL},gemini-flash-latest").split(",") if m.strip()
+]
+
+_models = {}
+_lock = threading.Lock()
+
+
+def get_model(name: str = GEMINI_MODEL):
+    """El GenerativeModel compartido de ese nombre; el primer llamador lo crea y los demás esperan."""
+    model = _models.get(name)
+    if model is None:
+        with _lock:
+            model = _models.get(name)
+            if model is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                # Las reglas fijas van como instrucción de sistema (ver llm_contract.py), no en cada prompt
+                model = _models[name] = genai.GenerativeModel(name, system_instruction=SYSTEM_INSTRUCTION)
+    return model
+
+
+def sdk_loaded() -> bool:
+    return "google.generativeai" in sys.modules
@@ -0,0 +1,300 @@
+"""Cola de trabajos asíncronos (POST /jobs, GET /jobs/{id}).
+
+Los trabajos largos (lotes de extracción, PDFs enormes) se encolan en SQLite y
+la respuesta vuelve de inmediato con el id. Un grupo de workers asyncio por
+proceso los toma por prioridad (mayor primero) y antigüedad, con reintentos y
+espera exponencial. Al terminar se puede avisar a una URL de callback, solo
+en los hosts de JOB_CALLBACK_HOSTS (sin definir, solo loopback) y sin seguir
+redirecciones.
+
+- Tomar un trabajo es un único UPDATE ... RETURNING: dos procesos nunca toman
+  el mismo.
+- Los trabajos pendientes sobreviven a un reinicio; los que estaban en curso en
+  un proceso que ya no existe vuelven a la cola al arrancar.
+- Los resultados grandes (PDF/ZIP) van a archivos en JOBS_DIR, no a la base.
+"""
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from correlativos import proceso_vivo
+from metrics import JOB_QUEUE_DEPTH, JOB_RUN_SECONDS, JOB_WAIT_SECONDS, JOBS
+
+# handler(payload, job_id) -> resultado (dict serializable a JSON)
+Handler = Callable[[dict, str], Awaitable[dict]]
+
+PENDIENTE, EN_CURSO, OK, ERROR = "pendiente", "en_curso", "ok", "error"
+CALLBACK_TIMEOUT = 10
+
+
+def callback_hosts() -> set:
+    """Hosts a los que se puede avisar (JOB_CALLBACK_HOSTS, separados por comas); vacío = solo
+    loopback. Se lee en cada validación, no al importar: así vale también el del .env."""
+    return {h.strip().lower() for h in os.getenv("JOB_CALLBACK_HOSTS", "").split(",") if h.strip()}
+
+
+def validar_callback(url: str):
+    """ValueError si el servidor no debe hacer POST a `url` (evita usarlo para llegar a la red interna)."""
+    partes = urllib.parse.urlsplit(url)
+    if partes.scheme not in ("http", "https") or not partes.hostname:
+        raise ValueError("callback_url debe ser una URL http(s)")
+    host = partes.hostname.lower()
+    permitidos = callback_hosts()
+    if permitidos:
+        if host not in permitidos:
+            raise ValueError(f"callback_url: el host {host} no está en JOB_CALLBACK_HOSTS")
+        return
+    try:
+        loopback = ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = host == "localhost"
+    if not loopback:
+        raise ValueError("callback_url: sin JOB_CALLBACK_HOSTS solo se permite loopback")
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    """Un 3xx del callback es un error: seguirlo saltaría la lista de hosts."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_callback_opener = urllib.request.build_opener(_SinRedirecciones)
+
+
+class JobStore:
+    def __init__(self, path: str):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, tipo TEXT NOT NULL, prioridad INTEGER NOT NULL, estado TEXT NOT NULL,"
+            " payload TEXT NOT NULL, resultado TEXT, error TEXT,"
+            " intentos INTEGER NOT NULL DEFAULT 0, max_intentos INTEGER NOT NULL,"
+            " callback_url TEXT, owner TEXT,"
+            " creado REAL NOT NULL, disponible REAL NOT NULL, iniciado REAL, terminado REAL);"
+            "CREATE INDEX IF NOT EXISTS idx_jobs_cola ON jobs(estado, prioridad DESC, creado);"
+        )
+
+    def encolar(self, tipo: str, payload: dict, prioridad: int = 0, max_intentos: int = 3,
+                callback_url: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, tipo, prioridad, estado, payload, max_intentos, callback_url, creado, disponible)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, tipo, prioridad, PENDIENTE, json.dumps(payload, ensure_ascii=False),
+                 max_intentos, callback_url, now, now),
+            )
+        return job_id
+
+    def tomar(self) -> Optional[dict]:
+        """El trabajo pendiente más prioritario, ya marcado como en curso por este proceso."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET estado = ?, owner = ?, iniciado = ?, intentos = intentos + 1"
+                " WHERE id = (SELECT id FROM jobs WHERE estado = ? AND disponible <= ?"
+                "             ORDER BY prioridad DESC, creado LIMIT 1)"
+                " RETURNING id, tipo, payload, intentos, max_intentos, creado",
+                (EN_CURSO, self.owner, now, PENDIENTE, now),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "tipo", "payload", "intentos", "max_intentos", "creado")
+        job = dict(zip(keys, row))
+        job["payload"] = json.loads(job["payload"])
+        job["espera"] = now - job["creado"]
+        return job
+
+    def terminar(self, job_id: str, resultado: Optional[dict] = None, error: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET estado = ?, resultado = ?, error = ?, terminado = ? WHERE id = ?",
+                (ERROR if error else OK, json.dumps(resultado, ensure_ascii=False) if resultado is not None else None,
+                 error, time.time(), job_id),
+            )
+
+    def reintentar(self, job_id: str, error: str, demora: float, contar_intento: bool = True):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET estado = ?, error = ?, owner = NULL, disponible = ?,"
+                " intentos = intentos - ? WHERE id = ?",
+                (PENDIENTE, error, time.time() + demora, 0 if contar_intento else 1, job_id),
+            )
+
+    def recuperar(self) -> int:
+        """Devuelve a la cola los trabajos en curso de procesos muertos de esta máquina."""
+        host = self.owner.split(":")[0]
+        with self._lock:
+            rows = self._conn.execute("SELECT id, owner FROM jobs WHERE estado = ?", (EN_CURSO,)).fetchall()
+            perdidos = [
+                job_id for job_id, owner in rows
+                if owner and owner != self.owner and owner.split(":")[0] == host
+                and not proceso_vivo(int(owner.split(":")[1]))
+            ]
+            for job_id in perdidos:
+                self._conn.execute(
+                    "UPDATE jobs SET estado = ?, owner = NULL, disponible = ? WHERE id = ?",
+                    (PENDIENTE, time.time(), job_id),
+                )
+        return len(perdidos)
+
+    def obtener(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, tipo, prioridad, estado, resultado, error, intentos, max_intentos,"
+                " callback_url, creado, iniciado, terminado FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "tipo", "prioridad", "estado", "resultado", "error", "intentos", "max_intentos",
+                "callback_url", "creado", "iniciado", "terminado")
+        job = dict(zip(keys, row))
+        job["resultado"] = json.loads(job["resultado"]) if job["resultado"] else None
+        return job
+
+    def profundidad(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT tipo, COUNT(*) FROM jobs WHERE estado = ? GROUP BY tipo", (PENDIENTE,)
+            ).fetchall()
+        return dict(rows)
+
+    def resumen(self) -> dict:
+        """Trabajos por estado y espera media/máxima de los pendientes."""
+        now = time.time()
+        with self._lock:
+            estados = dict(self._conn.execute("SELECT estado, COUNT(*) FROM jobs GROUP BY estado").fetchall())
+            media, maxima = self._conn.execute(
+                "SELECT AVG(? - creado), MAX(? - creado) FROM jobs WHERE estado = ?", (now, now, PENDIENTE)
+            ).fetchone()
+        return {"por_estado": estados, "espera_media_s": media or 0.0, "espera_max_s": maxima or 0.0}
+
+
+class JobQueue:
+    """Workers asyncio que consumen la cola de JobStore con los handlers registrados por tipo."""
+
+    def __init__(self, store: JobStore, handlers: Dict[str, Handler], workers: int = 4,
+                 poll_interval: float = 1.0, backoff: float = 2.0):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.backoff = backoff
+        self._wake = asyncio.Event()
+        self._loop = None
+        self._tasks = []
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        recuperados = self.store.recuperar()
+        if recuperados:
+            print(f"♻️ {recuperados} trabajos en curso de procesos caídos vuelven a la cola")
+        self._refresh_depth()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, tipo: str, payload: dict, **kwargs) -> str:
+        """Encola desde el threadpool (POST /jobs es una ruta síncrona) y despierta a los workers."""
+        job_id = self.store.encolar(tipo, payload, **kwargs)
+        self._refresh_depth()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return job_id
+
+    def _refresh_depth(self):
+        depth = self.store.profundidad()
+        for tipo in self.handlers:
+            JOB_QUEUE_DEPTH.labels(tipo).set(depth.get(tipo, 0))
+
+    async def _worker(self):
+        # Las consultas a SQLite (timeout=30 si otro proceso la tiene bloqueada) van al
+        # threadpool: el loop sigue atendiendo peticiones mientras tanto
+        while True:
+            job = await run_in_threadpool(self.store.tomar)
+            if job is None:
+                self._wake.clear()
+                try:
+                    # Otros procesos y los reintentos con demora no avisan: se consulta cada poll_interval
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await run_in_threadpool(self._refresh_depth)
+            await self._run(job)
+
+    async def _run(self, job: dict):
+        tipo = job["tipo"]
+        JOB_WAIT_SECONDS.labels(tipo).observe(job["espera"])
+        start = time.perf_counter()
+        try:
+            resultado = await self.handlers[tipo](job["payload"], job["id"])
+        except asyncio.CancelledError:
+            # Apagado: el trabajo vuelve a la cola sin gastar un intento (directo, sin otro await
+            # que la cancelación pueda cortar)
+            self.store.reintentar(job["id"], "interrumpido", 0, contar_intento=False)
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {getattr(e, 'detail', None) or e}"
+            if job["intentos"] < job["max_intentos"]:
+                demora = self.backoff ** job["intentos"]
+                print(f"🔁 Trabajo {job['id']} falló ({error}), reintento en {demora:.0f}s")
+                JOBS.labels(tipo, "reintento").inc()
+                await run_in_threadpool(self.store.reintentar, job["id"], error, demora)
+                return
+            JOBS.labels(tipo, "error").inc()
+            await run_in_threadpool(self.store.terminar, job["id"], error=error)
+        else:
+            JOBS.labels(tipo, "ok").inc()
+            await run_in_threadpool(self.store.terminar, job["id"], resultado=resultado)
+        finally:
+            JOB_RUN_SECONDS.labels(tipo).observe(time.perf_counter() - start)
+        await self._callback(job["id"])
+
+    async def _callback(self, job_id: str):
+        job = await run_in_threadpool(self.store.obtener, job_id)
+        if not job or not job["callback_url"]:
+            return
+        body = {k: job[k] for k in ("id", "tipo", "estado", "error")}
+        try:
+            await run_in_threadpool(_post_json, job["callback_url"], body)
+        except Exception as e:
+            print(f"⚠️ Callback de {job_id} a {job['callback_url']} falló: {e}")
+
+
+def _post_json(url: str, body: dict):
+    # Otra vez al enviar: los trabajos pueden venir de antes de cambiar JOB_CALLBACK_HOSTS
+    validar_callback(url)
+    request = urllib.request.Request(
+        url, data=json.dumps(body, ensure_ascii=False).encode(),
+        headers={"Content-Type": "application/json"}, method="POST",
+    )
+    with _callback_opener.open(request, timeout=CALLBACK_TIMEOUT):
+        pass
+
+
+def job_store_from_env() -> Optional[JobStore]:
+    path = os.getenv("JOBS_DB_PATH", "jobs.sqlite3")
+    return JobStore(path) if path else None
@@ -0,0 +1,109 @@
+"""Parser incremental del objeto JSON que Gemini devuelve en streaming.
+
+Recibe el texto por trozos (tal como llegan de generate_content(stream=True)) y
+avisa en cuanto algo está completo, sin esperar al cierre del objeto:
+
+- ("campo", clave, valor): un campo de primer nivel con su valor ya entero
+  (también los arreglos, al cerrarse).
+- ("elemento", clave, indice, valor): cada objeto de un arreglo de primer nivel,
+  p. ej. cada ítem de "items" en cuanto se cierra su llave.
+
+Solo se recorre cada carácter una vez; los valores se decodifican con json.loads
+sobre su tramo de texto.
+"""
+import json
+from typing import List, Tuple
+
+# Estados dentro del objeto de primer nivel
+_CLAVE, _DOS_PUNTOS, _VALOR, _ESCALAR, _DESPUES = range(5)
+
+
+class IncrementalObjectParser:
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._state = _CLAVE
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+        self._element_start = None
+        self._element_index = 0
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple]:
+        """Agrega un trozo de texto y devuelve los eventos que completó."""
+        self.text += chunk
+        text = self.text
+        events = []
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._string_closed(i, events)
+                continue
+
+            if self._depth == 1 and self._state == _ESCALAR and (c in ",}" or c.isspace()):
+                # Fin de un número, true, false o null
+                self._emit_value(text[self._value_start:i], events)
+                self._state = _DESPUES
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._state == _CLAVE:
+                    self._key_start = i
+                elif self._depth == 1 and self._state == _VALOR:
+                    self._value_start = i
+            elif c in "{[":
+                if self._depth == 1 and self._state == _VALOR:
+                    self._value_start = i
+                    self._element_index = 0
+                elif self._depth == 2 and c == "{" and text[self._value_start] == "[":
+                    self._element_start = i
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.done = True
+                elif self._depth == 1 and self._state == _VALOR:
+                    self._emit_value(text[self._value_start:i + 1], events)
+                    self._state = _DESPUES
+                elif self._depth == 2 and self._element_start is not None:
+                    element = json.loads(text[self._element_start:i + 1])
+                    events.append(("elemento", self._key, self._element_index, element))
+                    self._element_index += 1
+                    self._element_start = None
+            elif self._depth == 1:
+                if c == ":" and self._state == _DOS_PUNTOS:
+                    self._state = _VALOR
+                elif c == "," and self._state == _DESPUES:
+                    self._state = _CLAVE
+                elif self._state == _VALOR and not c.isspace():
+                    self._value_start = i
+                    self._state = _ESCALAR
+        self._pos = len(text)
+        return events
+
+    def _string_closed(self, i: int, events: list):
+        if self._depth != 1:
+            return
+        if self._state == _CLAVE:
+            self._key = json.loads(self.text[self._key_start:i + 1])
+            self._state = _DOS_PUNTOS
+        elif self._state == _VALOR:
+            self._emit_value(self.text[self._value_start:i + 1], events)
+            self._state = _DESPUES
+
+    def _emit_value(self, raw: str, events: list):
+        events.append(("campo", self._key, json.loads(raw)))
+
+    def result(self):
+        """El objeto completo (cuando el texto terminó)."""
+        return json.loads(self.text)
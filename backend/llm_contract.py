@@ -0,0 +1,137 @@
+"""Contrato con Gemini para la extracción de facturas.
+
+- SYSTEM_INSTRUCTION: reglas estáticas, se envían como instrucción de sistema
+  del modelo y no se repiten en cada prompt.
+- RESPONSE_SCHEMA: esquema de salida derivado de InvoiceData; Gemini devuelve
+  JSON que ya cumple la estructura, sin limpieza con regex.
+- complete_invoice: calcula localmente los campos derivados (serie, fechas por
+  defecto, monto en letras) que antes generaba el modelo con tokens de salida.
+- partial_response_schema / build_prompt(conocidos=...): si el emisor o el
+  cliente ya salen de los datos maestros (maestros.py), sus campos no se piden.
+"""
+import copy
+from datetime import date
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from numero_letras import monto_a_letras
+from schemas import InvoiceData
+from totales import calcular
+
+# Campos que se calculan en Python: no se piden al modelo
+DERIVED_FIELDS = ("serie_correlativo", "monto_letras")
+# Lo mínimo que el modelo siempre debe devolver
+REQUIRED_FIELDS = ("client", "items")
+# Campos de cada parte que pueden venir de los datos maestros
+PARTY_FIELDS = {
+    "emisor": ("emisor_nombre", "emisor_ruc", "emisor_direccion"),
+    "cliente": ("client", "client_ruc_dni", "client_address"),
+}
+
+FIELD_HINTS = {
+    "document_type": "Factura o Boleta de Venta",
+    "fecha_emision": "DD/MM/YYYY, solo si el texto la indica",
+    "fecha_vencimiento": "DD/MM/YYYY, solo si el texto la indica",
+    "client_ruc_dni": "RUC (11 dígitos) o DNI (8 dígitos)",
+}
+
+SYSTEM_INSTRUCTION = """
+Actúa como un asistente de facturación INTELIGENTE y PROACTIVO (SUNAT, Perú).
+Extrae los datos del pedido del usuario y devuelve un JSON válido SIEMPRE según el esquema de respuesta.
+
+**REGLAS DE INFERENCIA (NO DEVUELVAS ERROR, RESUELVE):**
+1. **Cliente:** Extrae el nombre. Si no hay DNI/RUC, pon "00000000". Si no hay dirección, pon "Ciudad".
+2. **Emisor:** Si el texto no dice quién vende, usa "Mi Empresa S.A.C." con RUC "20000000001".
+3. **Items:** Si falta la unidad de medida, asume "UNI".
+4. **Fechas/Pagos:** Omite las fechas que el texto no indique. Si falta el pago, usa "Contado".
+5. **Moneda:** Si no se dice, asume "SOLES".
+6. **No calcules totales ni montos en letras.**
+
+Si recibes varios pedidos marcados con <<DOCUMENTO n>>, devuelve un arreglo con un objeto por
+pedido, en el mismo orden, con el campo "indice" igual a n.
+"""
+
+
+def _to_gemini_schema(node: dict, defs: dict) -> dict:
+    """Convierte el JSON Schema de Pydantic al subconjunto OpenAPI que acepta Gemini
+    (sin $ref, title ni default)."""
+    if "$ref" in node:
+        node = defs[node["$ref"].split("/")[-1]]
+    out = {"type": node["type"]}
+    if "description" in node:
+        out["description"] = node["description"]
+    if node["type"] == "array":
+        out["items"] = _to_gemini_schema(node["items"], defs)
+    if node["type"] == "object":
+        out["properties"] = {name: _to_gemini_schema(value, defs) for name, value in node["properties"].items()}
+        if node.get("required"):
+            out["required"] = list(node["required"])
+    return out
+
+
+def build_response_schema() -> dict:
+    source = InvoiceData.model_json_schema()
+    schema = _to_gemini_schema(source, source.get("$defs", {}))
+    for field in DERIVED_FIELDS:
+        schema["properties"].pop(field, None)
+    for field, hint in FIELD_HINTS.items():
+        schema["properties"][field]["description"] = hint
+    schema["required"] = list(REQUIRED_FIELDS)
+    return schema
+
+
+RESPONSE_SCHEMA = build_response_schema()
+
+_batch_item = copy.deepcopy(RESPONSE_SCHEMA)
+_batch_item["properties"]["indice"] = {"type": "integer"}
+_batch_item["required"].append("indice")
+BATCH_RESPONSE_SCHEMA = {"type": "array", "items": _batch_item}
+
+
+@lru_cache(maxsize=None)
+def partial_response_schema(conocidos: Tuple[str, ...]) -> dict:
+    """RESPONSE_SCHEMA sin los campos de las partes ya conocidas ("emisor", "cliente")."""
+    schema = copy.deepcopy(RESPONSE_SCHEMA)
+    for rol in conocidos:
+        for field in PARTY_FIELDS[rol]:
+            schema["properties"].pop(field, None)
+    schema["required"] = [f for f in schema["required"] if f in schema["properties"]]
+    return schema
+
+
+def build_prompt(text: str, conocidos: Tuple[str, ...] = ()) -> str:
+    prompt = f'TEXTO DEL USUARIO: "{text}"'
+    if conocidos:
+        # También distingue el prompt para la coalescencia: el esquema de respuesta es otro
+        prompt += f"\nYA CONOCIDOS, NO LOS EXTRAIGAS: {', '.join(conocidos)}"
+    return prompt
+
+
+def build_batch_prompt(texts: List[str]) -> str:
+    return "\n".join(f"<<DOCUMENTO {i}>>\n{t}" for i, t in enumerate(texts))
+
+
+def complete_invoice(data: dict, today: Optional[date] = None) -> dict:
+    """Rellena los campos derivados sin pasar por el LLM."""
+    today = today or date.today()
+    doc_type = data.get("document_type") or "Boleta de Venta"
+    data["document_type"] = doc_type
+    if not data.get("serie_correlativo"):
+        data["serie_correlativo"] = "F001-00001" if "factura" in doc_type.lower() else "B001-00001"
+    if not data.get("fecha_emision"):
+        data["fecha_emision"] = today.strftime("%d/%m/%Y")
+    if not data.get("fecha_vencimiento"):
+        data["fecha_vencimiento"] = data["fecha_emision"]
+
+    cantidades, precios = [], []
+    for item in data.get("items") or []:
+        try:
+            cantidad, precio = float(item["cantidad"]), float(item["precio_unitario"])
+        except (KeyError, TypeError, ValueError):
+            # Ítem incompleto: lo rechazará la validación de InvoiceData
+            continue
+        cantidades.append(cantidad)
+        precios.append(precio)
+    total = calcular(cantidades, precios).total
+    data["monto_letras"] = monto_a_letras(total, data.get("moneda") or "SOLES")
+    return data
@@ -0,0 +1,378 @@
+"""Datos maestros de emisores y clientes conocidos.
+
+Para los clientes habituales Gemini volvía a extraer (o a inventar, con
+"Mi Empresa S.A.C.") los mismos nombres, documentos y direcciones en cada
+pedido. Este índice los reconoce en el texto y los rellena sin el LLM; el
+prompt pide entonces solo el resto del documento (ítems, fechas, pago).
+
+- Búsqueda exacta por RUC/DNI: un dict.
+- Nombre exacto (sin tildes ni mayúsculas) en cualquier parte del texto:
+  solo las ventanas de palabras que empiezan como algún nombre conocido,
+  contra otro dict.
+- Nombre aproximado tras "Cliente:" o en la cabecera del emisor: índice
+  invertido de palabras. Los candidatos son los nombres que tienen todas las
+  palabras de la consulta menos una (una palabra mal escrita o de más), por
+  intersección de conjuntos; se puntúan con el coeficiente de Dice sobre
+  trigramas y se aceptan solo con similitud alta y sin empate con otro nombre.
+
+Un nombre solo se usa si el texto no trae un RUC/DNI que no se pudo asignar
+(sería otra persona con el mismo nombre) y si no es ambiguo en el índice.
+
+Fuentes: archivos CSV/JSON (MAESTROS_PATH), recargados en caliente cuando
+cambia su fecha de modificación (en un hilo aparte: mientras tanto se sigue
+usando el índice anterior), más lo aprendido de los documentos emitidos
+(el registro de facturas al arrancar, cada emisión y cada corrección con
+PUT /facturas/{id}). Una extracción sin emitir no se aprende: un nombre
+inventado por el LLM no debe quedar fijo. Ante el mismo documento, manda el
+archivo.
+"""
+import csv
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fast_extractor import CLIENT_RE, EMISOR_NAME_RE
+from metrics import MASTER_DATA_HITS
+
+ROLES = ("emisor", "cliente")
+# Campos de InvoiceData que cubre cada rol: (nombre, documento, dirección)
+CAMPOS = {
+    "emisor": ("emisor_nombre", "emisor_ruc", "emisor_direccion"),
+    "cliente": ("client", "client_ruc_dni", "client_address"),
+}
+# Valores de relleno del prompt y de los defaults: no se aprenden
+PLACEHOLDERS = {"00000000", "00000000000", "20000000001"}
+
+_DOC_RE = re.compile(r"(?<!\d)(\d{11}|\d{8})(?!\d)")
+_WORD_RE = re.compile(r"[a-z0-9&]+")
+
+
+@dataclass(frozen=True)
+class Parte:
+    rol: str
+    documento: str
+    nombre: str
+    direccion: str = ""
+
+    def campos(self) -> dict:
+        nombre, documento, direccion = CAMPOS[self.rol]
+        data = {nombre: self.nombre, documento: self.documento}
+        if self.direccion:
+            data[direccion] = self.direccion
+        return data
+
+
+def _palabras(texto: str) -> List[str]:
+    """Palabras en minúsculas y sin tildes (lo que no es ASCII tras NFKD se descarta)."""
+    return _WORD_RE.findall(unicodedata.normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode("ascii"))
+
+
+def _clave_nombre(nombre: str) -> str:
+    return " ".join(_palabras(nombre))
+
+
+def _trigramas(clave: str) -> set:
+    padded = f"  {clave} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PartyIndex:
+    """Partes de un rol: por documento, por nombre exacto y por palabras del nombre."""
+
+    def __init__(self, min_similitud: float = 0.85, max_candidatos: int = 200):
+        self.min_similitud = min_similitud
+        self.max_candidatos = max_candidatos
+        self.por_documento: Dict[str, Parte] = {}
+        # clave de nombre -> documentos con ese nombre (más de uno = ambiguo)
+        self.por_nombre: Dict[str, set] = defaultdict(set)
+        # primera palabra -> cantidades de palabras de los nombres que empiezan con ella
+        self.primeras: Dict[str, set] = defaultdict(set)
+        self._palabras: Dict[str, set] = defaultdict(set)  # palabra -> claves que la contienen
+
+    def add(self, parte: Parte):
+        anterior = self.por_documento.get(parte.documento)
+        if anterior is not None:
+            self.por_nombre[_clave_nombre(anterior.nombre)].discard(parte.documento)
+        self.por_documento[parte.documento] = parte
+        clave = _clave_nombre(parte.nombre)
+        if not clave:
+            return
+        self.por_nombre[clave].add(parte.documento)
+        palabras = clave.split(" ")
+        self.primeras[palabras[0]].add(len(palabras))
+        for palabra in palabras:
+            self._palabras[palabra].add(clave)
+
+    def __len__(self):
+        return len(self.por_documento)
+
+    def por_clave(self, clave: str) -> Optional[Parte]:
+        """La parte con ese nombre, si es una sola."""
+        documentos = self.por_nombre.get(clave)
+        if documentos and len(documentos) == 1:
+            return self.por_documento[next(iter(documentos))]
+        return None
+
+    def aproximado(self, nombre: str) -> Optional[Parte]:
+        clave = _clave_nombre(nombre)
+        if not clave:
+            return None
+        exacto = self.por_clave(clave)
+        if exacto is not None:
+            return exacto
+        palabras = clave.split(" ")
+        postings = [self._palabras.get(p, set()) for p in palabras]
+        candidatos = set()
+        # Todas las palabras menos una; las intersecciones empiezan por el conjunto más chico
+        for fuera in range(len(palabras)) if len(palabras) > 1 else (None,):
+            conjuntos = sorted((c for i, c in enumerate(postings) if i != fuera), key=len)
+            comunes = conjuntos[0]
+            for otro in conjuntos[1:]:
+                if not comunes:
+                    break
+                comunes = comunes & otro
+            if len(comunes) <= self.max_candidatos:  # Más: demasiado genérico para decidir
+                candidatos |= comunes
+        grams = _trigramas(clave)
+        puntajes = []
+        for candidato in candidatos:
+            otros = _trigramas(candidato)
+            puntajes.append((2 * len(grams & otros) / (len(grams) + len(otros)), candidato))
+        puntajes.sort()
+        if not puntajes or puntajes[-1][0] < self.min_similitud:
+            return None
+        if len(puntajes) > 1 and puntajes[-2][0] >= puntajes[-1][0] - 0.02:
+            return None  # Empate: mejor que lo lea el LLM
+        return self.por_clave(puntajes[-1][1])
+
+
+@dataclass
+class Conocidos:
+    emisor: Optional[Parte] = None
+    cliente: Optional[Parte] = None
+
+    def campos(self) -> dict:
+        data = {}
+        for parte in (self.emisor, self.cliente):
+            if parte is not None:
+                data.update(parte.campos())
+        return data
+
+    def roles(self) -> Tuple[str, ...]:
+        return tuple(rol for rol in ROLES if getattr(self, rol) is not None)
+
+
+class MasterIndex:
+    def __init__(self, partes: Iterable[Parte] = (), **kwargs):
+        self.indices = {rol: PartyIndex(**kwargs) for rol in ROLES}
+        for parte in partes:
+            self.add(parte)
+
+    def add(self, parte: Parte):
+        self.indices[parte.rol].add(parte)
+
+    def buscar(self, texto: str, contar: bool = True) -> Conocidos:
+        conocidos = Conocidos()
+        sin_asignar = False
+        # 1. Documentos en el texto, en orden de aparición; el emisor se busca primero
+        for documento in _DOC_RE.findall(texto):
+            for rol in ROLES:
+                parte = self.indices[rol].por_documento.get(documento)
+                if parte is not None and getattr(conocidos, rol) is None:
+                    setattr(conocidos, rol, parte)
+                    if contar:
+                        MASTER_DATA_HITS.labels(rol, "documento").inc()
+                    break
+            else:
+                if documento not in PLACEHOLDERS and not any(
+                    p is not None and p.documento == documento for p in (conocidos.emisor, conocidos.cliente)
+                ):
+                    sin_asignar = True
+        if sin_asignar or (conocidos.emisor and conocidos.cliente):
+            return conocidos
+
+        # 2. Nombres exactos en cualquier parte del texto
+        palabras = _palabras(texto)
+        for rol in ROLES:
+            if getattr(conocidos, rol) is not None:
+                continue
+            indice = self.indices[rol]
+            if not indice:
+                continue
+            parte = None
+            for i, palabra in enumerate(palabras):
+                # Solo las ventanas que empiezan como algún nombre, de la más larga a la más corta
+                for n in sorted(indice.primeras.get(palabra, ()), reverse=True):
+                    if i + n <= len(palabras):
+                        parte = indice.por_clave(" ".join(palabras[i:i + n]))
+                        if parte is not None:
+                            break
+                if parte is not None:
+                    setattr(conocidos, rol, parte)
+                    if contar:
+                        MASTER_DATA_HITS.labels(rol, "nombre").inc()
+                    break
+
+        # 3. Nombres aproximados donde el texto los etiqueta
+        for rol, regex in (("emisor", EMISOR_NAME_RE), ("cliente", CLIENT_RE)):
+            if getattr(conocidos, rol) is not None or not self.indices[rol]:
+                continue
+            match = regex.search(texto)
+            if match:
+                parte = self.indices[rol].aproximado(match.group("v"))
+                if parte is not None:
+                    setattr(conocidos, rol, parte)
+                    if contar:
+                        MASTER_DATA_HITS.labels(rol, "aproximado").inc()
+        return conocidos
+
+    def tamanos(self) -> dict:
+        return {rol: len(indice) for rol, indice in self.indices.items()}
+
+
+def _rol(valor: str) -> Optional[str]:
+    valor = (valor or "").strip().lower()
+    if valor.startswith("emisor"):
+        return "emisor"
+    if valor.startswith("client"):
+        return "cliente"
+    return None
+
+
+def _parte(registro: dict, rol: Optional[str] = None) -> Optional[Parte]:
+    rol = rol or _rol(registro.get("tipo") or registro.get("rol"))
+    documento = str(registro.get("documento") or registro.get("ruc") or registro.get("dni") or "").strip()
+    nombre = str(registro.get("nombre") or "").strip()
+    if rol is None or not documento or not nombre:
+        return None
+    return Parte(rol, documento, nombre, str(registro.get("direccion") or "").strip())
+
+
+def leer_archivo(path: str) -> List[Parte]:
+    """CSV con columnas tipo,documento,nombre,direccion, o JSON: una lista de esos objetos
+    o {"emisores": [...], "clientes": [...]}."""
+    with open(path, encoding="utf-8-sig") as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            if isinstance(data, dict):
+                registros = [(r, "emisor") for r in data.get("emisores", [])]
+                registros += [(r, "cliente") for r in data.get("clientes", [])]
+            else:
+                registros = [(r, None) for r in data]
+        else:
+            registros = [(r, None) for r in csv.DictReader(f)]
+    partes = [_parte(r, rol) for r, rol in registros]
+    return [p for p in partes if p is not None]
+
+
+class MasterData:
+    """El índice vigente más su recarga en caliente. La recarga arma un índice nuevo en otro
+    hilo y lo reemplaza de una vez; aprender sí modifica el índice vigente (desde el
+    threadpool, al emitir), así que búsquedas y aprendizajes se turnan con el mismo lock.
+    Los dos son cortos: un aprendizaje agrega una parte y una búsqueda no toca disco."""
+
+    def __init__(self, paths: List[str], intervalo: float = 5.0, **kwargs):
+        self.paths = paths
+        self.intervalo = intervalo
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._recarga = threading.Lock()
+        self._aprendidos: Dict[Tuple[str, str], Parte] = {}
+        self._del_archivo: set = set()
+        self._mtimes = None
+        self._revisado = 0.0
+        self.index = MasterIndex(**kwargs)
+        self.stats = {"busquedas": 0, "emisor_encontrado": 0, "cliente_encontrado": 0, "recargas": 0,
+                      "aprendidos": 0, "ultima_recarga": None}
+        self.recargar()
+
+    def _leer_mtimes(self):
+        return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in self.paths)
+
+    def recargar(self) -> dict:
+        """Vuelve a leer los archivos y reemplaza el índice. Las búsquedas siguen con el
+        índice anterior mientras se arma el nuevo."""
+        with self._recarga:
+            self._mtimes = self._leer_mtimes()
+            partes = []
+            for path in self.paths:
+                if os.path.exists(path):
+                    partes += leer_archivo(path)
+                else:
+                    print(f"⚠️ Datos maestros: no existe {path}")
+            del_archivo = {(p.rol, p.documento) for p in partes}
+            with self._lock:
+                aprendidos = dict(self._aprendidos)
+            index = MasterIndex([p for k, p in aprendidos.items() if k not in del_archivo] + partes, **self._kwargs)
+            with self._lock:
+                # Lo aprendido mientras se armaba el índice
+                for k, parte in self._aprendidos.items():
+                    if k not in del_archivo and aprendidos.get(k) != parte:
+                        index.add(parte)
+                self.index, self._del_archivo = index, del_archivo
+            self.stats["recargas"] += 1
+            self.stats["ultima_recarga"] = time.time()
+        print(f"📇 Datos maestros: {index.tamanos()}")
+        return index.tamanos()
+
+    def _revisar(self):
+        now = time.monotonic()
+        if now - self._revisado < self.intervalo:
+            return
+        self._revisado = now
+        if self._leer_mtimes() != self._mtimes and not self._recarga.locked():
+            threading.Thread(target=self.recargar, name="maestros-recarga", daemon=True).start()
+
+    def buscar(self, texto: str, contar: bool = True) -> Conocidos:
+        """contar=False: consulta interna, sin sumar a las estadísticas ni a las métricas."""
+        self._revisar()
+        # Sin el lock, recorrer los conjuntos del índice mientras aprender los cambia puede
+        # fallar con "set changed size during iteration"
+        with self._lock:
+            conocidos = self.index.buscar(texto, contar)
+        if not contar:
+            return conocidos
+        self.stats["busquedas"] += 1
+        for rol in conocidos.roles():
+            self.stats[f"{rol}_encontrado"] += 1
+        return conocidos
+
+    def aprender(self, data: dict):
+        """Incorpora el emisor y el cliente de un documento emitido o corregido (dict con campos
+        de InvoiceData). No llamarlo con extracciones sin confirmar."""
+        for rol, (nombre, documento, direccion) in CAMPOS.items():
+            doc = str(data.get(documento) or "")
+            if not doc.isdigit() or len(doc) not in (8, 11) or doc in PLACEHOLDERS:
+                continue
+            parte = Parte(rol, doc, str(data.get(nombre) or "").strip(), str(data.get(direccion) or "").strip())
+            if not parte.nombre or (rol, doc) in self._del_archivo or self._aprendidos.get((rol, doc)) == parte:
+                continue
+            with self._lock:
+                self._aprendidos[(rol, doc)] = parte
+                self.index.add(parte)
+            self.stats["aprendidos"] += 1
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, archivos=self.paths, partes=self.index.tamanos())
+
+
+def master_data_from_env(registro=None) -> Optional[MasterData]:
+    """MAESTROS_PATH: archivos separados por comas. Sin archivos y sin registro, desactivado."""
+    paths = [p.strip() for p in os.getenv("MAESTROS_PATH", "").split(",") if p.strip()]
+    if not paths and registro is None:
+        return None
+    maestros = MasterData(
+        paths,
+        intervalo=float(os.getenv("MAESTROS_RELOAD_INTERVAL", "5")),
+        min_similitud=float(os.getenv("MAESTROS_MIN_SIMILITUD", "0.85")),
+    )
+    if registro is not None:
+        for data in registro.partes():
+            maestros.aprender(data)
+    return maestros
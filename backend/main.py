@@ -1,23 +1,112 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import Response
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+
+# 1. Configuración inicial. El .env se carga antes de importar los módulos del backend:
+# varios leen su configuración al importarse (GEMINI_MODELS, PDF_WORKERS, PROMETHEUS_MULTIPROC_DIR...)
+load_dotenv()
+
 import os
-import google.generativeai as genai
+import asyncio
+import base64
+import hashlib
+import time
+import uuid
 import json
-import re  # <--- Agregado para limpiar el JSON
-from fpdf import FPDF
-from typing import List
+import math
+import zipfile
+from functools import lru_cache
+from contextlib import aclosing
+from typing import List, Literal, Optional, Tuple
+from schemas import Item, InvoiceData
+from pdf_generator import create_invoice_pdf, iter_invoice_pdf
+from pdf_bulk import stream_pdf_zip, stream_zip, shutdown_pdf_pool
+from pdf_cache import etag, etag_matches, pdf_cache_from_env, pdf_key
+from ubl_sunat import Firmante, firmante_from_env, generar_xml, nombre_archivo, paquete_sunat, xml_entries, xml_filename
+from gemini_client import GEMINI_MODEL, GEMINI_MODELS, get_model, sdk_loaded
+from model_router import router_from_env
+from upstream import RETRYABLE, SingleFlight, UpstreamError, backoff, limiter_from_env, retry_after, upstream_status
+from extraction_cache import cache_from_env
+from fast_extractor import fast_extract
+from correlativos import allocator_from_env
+from registro_facturas import NumeroRepetido, es_definitivo, registro_from_env, fecha_iso
+from jobs import JobQueue, job_store_from_env, validar_callback
+from json_stream import IncrementalObjectParser
+from maestros import CAMPOS, ROLES, Conocidos, master_data_from_env
+from tracing import TracingMiddleware, set_attribute, span, traced, tracer_from_env
+from profiling import Profiler, ProfilingMiddleware, profiler_from_env
+from metrics import (
+    MetricsMiddleware, render_latest, LLM_CALL, PARSE, VALIDATION, FAST_PATH,
+    LLM_IN_FLIGHT, ERRORS, EXTRACTION_PATH, FALLBACKS, PROMPT_TOKENS, OUTPUT_TOKENS,
+    RATE_LIMIT_WAIT, LLM_RETRIES, LLM_THROTTLED, PDF_CACHE,
+)
+from llm_contract import (
+    RESPONSE_SCHEMA, BATCH_RESPONSE_SCHEMA,
+    build_prompt, build_batch_prompt, complete_invoice, partial_response_schema,
+)
 
-# 1. Configuración inicial
-load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
 if not api_key:
     print("⚠️ ADVERTENCIA: No se detectó GEMINI_API_KEY")
 
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel("gemini-2.5-flash")
+# El SDK de Gemini se carga en la primera llamada (gemini_client.py). Los benchmarks
+# asignan un modelo falso en `model` (para todos los nombres) o uno por nombre en `models`
+model = None
+models = {}
+
+def llm(name: str = GEMINI_MODEL):
+    if model is not None:
+        return model
+    if name not in models:
+        models[name] = get_model(name)
+    return models[name]
+
+# Calentamiento al arrancar (lista separada por comas): "pdf" carga el motor de PDF,
+# "gemini" el SDK y el modelo, antes de que el worker acepte peticiones.
+WARMUP = [w.strip() for w in os.getenv("WARMUP", "").split(",") if w.strip()]
+
+# Límites de las llamadas a Gemini (configurables por entorno)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+# Pedidos por prompt en /procesar-facturas
+GEMINI_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", "10"))
+DISCONNECT_POLL_INTERVAL = 0.25
+
+# Reintentos ante 429/5xx: espera exponencial con jitter entre base y tope (segundos)
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.5"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "8"))
+# Pedidos idénticos en vuelo comparten una sola llamada
+GEMINI_COALESCE = os.getenv("GEMINI_COALESCE", "1") != "0"
+
+# Semáforo global: como máximo GEMINI_MAX_CONCURRENCY llamadas en vuelo hacia Gemini
+gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+# Ritmo de llamadas adaptado a la cuota observada y coalescencia, ver upstream.py
+limiter = limiter_from_env()
+single_flight = SingleFlight()
+# Primario por latencia y hedge al secundario (GEMINI_MODELS), ver model_router.py
+router = router_from_env(GEMINI_MODELS)
+
+# Caché de extracciones (memoria + SQLite), ver extraction_cache.py
+extraction_cache = cache_from_env()
+# Correlativos por (RUC, serie), asignados solo al emitir; con CORRELATIVOS_DB_PATH vacío
+# se deja el provisional
+correlativos = allocator_from_env()
+# Registro de documentos emitidos (consultas y reimpresión sin LLM)
+registro = registro_from_env()
+# PDFs ya generados por contenido (memoria + carpeta de desborde), ver pdf_cache.py
+pdf_cache = pdf_cache_from_env()
+# Emisores y clientes conocidos (MAESTROS_PATH + lo emitido o corregido): se rellenan sin el LLM
+maestros = master_data_from_env(registro)
+# Spans OTLP/JSON (TRACE_FILE u OTEL_EXPORTER_OTLP_ENDPOINT) y perfiles a pedido (ADMIN_TOKEN)
+tracer = tracer_from_env()
+profiler = profiler_from_env()
+
+# Confianza mínima para aceptar el extractor local sin consultar a Gemini
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.8"))
 
 app = FastAPI(title="Facturador AI - Robust Mode")
 
@@ -27,240 +116,926 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Extraction-Path", "X-Extraction-Confidence", "X-Prompt-Tokens", "X-Output-Tokens",
+        "X-Invoice-Data", "X-Factura-Id", "Content-Disposition", "ETag", "X-Trace-Id", "X-Profile-Id",
+    ],
 )
+# Latencia y peticiones en vuelo por ruta, ver metrics.py
+app.add_middleware(MetricsMiddleware, routes=app.router.routes)
+# Solo se instalan si están configurados: sin ellos no suman nada por petición
+if profiler is not None:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+if tracer is not None:
+    app.add_middleware(TracingMiddleware, routes=app.router.routes)
 
-# --- 2. MODELOS DE DATOS (Con Defaults para que NO falle) ---
-
-class Item(BaseModel):
-    descripcion: str
-    cantidad: float
-    # Si la IA no detecta unidad, usará "UNI" en vez de romper
-    unidad_medida: str = Field(default="UNI") 
-    precio_unitario: float
-
-class InvoiceData(BaseModel):
-    # Valores por defecto para evitar errores 422 de validación
-    document_type: str = Field(default="Boleta de Venta")
-    serie_correlativo: str = Field(default="B001-00001")
-    
-    # Datos Emisor (Si faltan, se ponen genéricos)
-    emisor_nombre: str = Field(default="EMISOR POR DEFECTO")
-    emisor_ruc: str = Field(default="00000000000")
-    emisor_direccion: str = Field(default="Dirección del Emisor")
-
-    # Datos Cliente
-    client: str = Field(..., description="El nombre del cliente SI es obligatorio")
-    client_address: str = Field(default="Dirección no especificada")
-    client_ruc_dni: str = Field(default="00000000")
-    
-    # Datos Factura
-    fecha_emision: str = Field(default="HOY")
-    fecha_vencimiento: str = Field(default="HOY")
-    forma_pago: str = Field(default="Contado")
-    moneda: str = Field(default="SOLES")
-    
-    items: List[Item]
-    monto_letras: str = Field(default="---")
+# --- 2. MODELOS DE PETICIÓN (Item e InvoiceData viven en schemas.py) ---
 
 class InvoiceRequest(BaseModel):
     texto_factura: str
+    # Permite forzar una nueva llamada a Gemini ignorando la caché
+    usar_cache: bool = Field(default=True)
+
+class BatchInvoiceRequest(BaseModel):
+    textos: List[str]
+    tamano_lote: int = Field(default=GEMINI_BATCH_SIZE, ge=1, le=50)
+    usar_cache: bool = Field(default=True)
+
+class BatchItemResult(BaseModel):
+    indice: int
+    ok: bool
+    camino: Optional[str] = None
+    data: Optional[InvoiceData] = None
+    error: Optional[str] = None
+
+class BatchInvoiceResponse(BaseModel):
+    resultados: List[BatchItemResult]
+    llamadas_llm: int
+    prompt_tokens: int = 0
+    output_tokens: int = 0
 
 # --- 3. EXTRACCIÓN CON IA (Lógica Permisiva) ---
 
-def clean_json_text(text: str) -> str:
-    """Limpia los bloques de código markdown que a veces pone Gemini"""
-    cleaned = re.sub(r"```json\s*", "", text) # Quita ```json
-    cleaned = re.sub(r"```", "", cleaned)      # Quita ``` al final
-    return cleaned.strip()
+GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": RESPONSE_SCHEMA}
+BATCH_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": BATCH_RESPONSE_SCHEMA}
+
+@lru_cache(maxsize=None)
+def partial_generation_config(conocidos: tuple) -> dict:
+    return {"response_mime_type": "application/json", "response_schema": partial_response_schema(conocidos)}
+
+def known_parties(text: str):
+    """Emisor y cliente reconocidos en los datos maestros.
+    Devuelve (campos que se fijan, prompt, generation_config sin esos campos)."""
+    conocidos = maestros.buscar(text) if maestros is not None else Conocidos()
+    roles = conocidos.roles()
+    config = partial_generation_config(roles) if roles else GENERATION_CONFIG
+    return conocidos.campos(), build_prompt(text, roles), config
+
+def usage_from_response(response) -> dict:
+    """Tokens de entrada/salida reportados por Gemini (0 si no vienen)."""
+    usage = getattr(response, "usage_metadata", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+        "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+    }
 
+@traced("extract_invoice_data")
 def extract_invoice_data(text: str) -> dict:
-    prompt = f"""
-    Actúa como un asistente de facturación INTELIGENTE y PROACTIVO.
-    Tu objetivo es generar un JSON válido SIEMPRE, completando la información faltante con datos lógicos o valores por defecto.
-
-    TEXTO DEL USUARIO: "{text}"
-
-    **REGLAS DE INFERENCIA (NO DEVUELVAS ERROR, RESUELVE):**
-    1. **Cliente:** Extrae el nombre. Si no hay DNI/RUC, inventa uno genérico o pon "00000000". Si no hay dirección, pon "Ciudad".
-    2. **Emisor:** Si el texto no dice quién vende, usa "Mi Empresa S.A.C." con RUC "20000000001".
-    3. **Items:** Si falta la unidad de medida, asume "UNI".
-    4. **Fechas/Pagos:** Si faltan, usa fecha de hoy y pago "Contado".
-    5. **Moneda:** Si no se dice, asume "SOLES".
-    6. **Monto en letras:** CALCULA el total y escríbelo.
-
-    **Devuelve SOLAMENTE el JSON con esta estructura:**
-    {{
-        "document_type": "Factura o Boleta",
-        "serie_correlativo": "F001-00001",
-        "emisor_nombre": "Texto...",
-        "emisor_ruc": "Texto...",
-        "emisor_direccion": "Texto...",
-        "client": "Texto...",
-        "client_address": "Texto...",
-        "client_ruc_dni": "Texto...",
-        "fecha_emision": "DD/MM/YYYY",
-        "fecha_vencimiento": "DD/MM/YYYY",
-        "forma_pago": "Contado",
-        "moneda": "SOLES",
-        "items": [
-            {{ "descripcion": "Prod", "cantidad": 1.0, "unidad_medida": "UNI", "precio_unitario": 0.0 }}
-        ],
-        "monto_letras": "SON: ..."
-    }}
-    """
+    prompt = build_prompt(text)
     
     try:
-        response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-        # Limpiamos la respuesta antes de parsear
-        clean_text = clean_json_text(response.text)
-        return json.loads(clean_text)
+        response = llm().generate_content(prompt, generation_config=GENERATION_CONFIG)
+        # El esquema de respuesta garantiza JSON limpio
+        return complete_invoice(json.loads(response.text))
     except Exception as e:
         # En el peor de los casos, devolvemos un error controlado
         return {"error_message": f"Error procesando IA: {str(e)}"}
 
-# --- 4. GENERACIÓN PDF (INTACTO - SOLO CON HELPER DE TILDES) ---
-
-class PDFGenerator(FPDF):
-    def __init__(self, invoice_data: InvoiceData):
-        super().__init__()
-        self.data = invoice_data 
-
-    def header(self):
-        def txt(texto): return str(texto).encode('latin-1', 'replace').decode('latin-1')
-
-        self.set_font('Arial', 'B', 14)
-        self.set_text_color(0, 51, 153)
-        self.cell(100, 10, txt(self.data.emisor_nombre[:35]), 0, 0, 'L')
-        
-        self.set_text_color(0)
-        self.set_font('Arial', 'B', 10)
-        
-        x_ruc = 120
-        y_ruc = 10
-        self.rect(x_ruc, y_ruc, 80, 25)
-        self.set_xy(x_ruc, y_ruc + 4)
-        self.cell(80, 5, txt(f"{self.data.document_type.upper()}"), 0, 1, 'C')
-        self.set_xy(x_ruc, y_ruc + 11)
-        self.cell(80, 5, txt(f"RUC: {self.data.emisor_ruc}"), 0, 1, 'C')
-        self.set_xy(x_ruc, y_ruc + 18)
-        self.cell(80, 5, txt(self.data.serie_correlativo), 0, 1, 'C')
-        
-        self.set_xy(10, 20)
-        self.set_font('Arial', '', 8)
-        self.cell(100, 5, txt(self.data.emisor_direccion[:60]), 0, 1)
-        self.ln(15)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Pagina {self.page_no()}', 0, 0, 'C')
-
-def create_invoice_pdf(data: InvoiceData) -> bytes:
-    def txt(texto): return str(texto).encode('latin-1', 'replace').decode('latin-1')
-
-    pdf = PDFGenerator(data)
-    pdf.add_page()
-    
-    pdf.set_font("Arial", "", 9)
-    pdf.rect(10, 45, 190, 25)
-    pdf.set_xy(12, 47)
-    
-    pdf.set_font("Arial", "B", 9)
-    pdf.cell(20, 5, "Cliente:", 0, 0)
-    pdf.set_font("Arial", "", 9)
-    pdf.cell(100, 5, txt(data.client), 0, 1)
-    
-    pdf.set_x(12)
-    pdf.set_font("Arial", "B", 9)
-    pdf.cell(20, 5, txt("Dirección:"), 0, 0)
-    pdf.set_font("Arial", "", 9)
-    pdf.cell(100, 5, txt(data.client_address), 0, 1)
-    
-    pdf.set_x(12)
-    pdf.set_font("Arial", "B", 9)
-    pdf.cell(20, 5, "RUC/DNI:", 0, 0)
-    pdf.set_font("Arial", "", 9)
-    pdf.cell(50, 5, txt(data.client_ruc_dni), 0, 0)
-    
-    pdf.set_font("Arial", "B", 9)
-    pdf.cell(20, 5, "Moneda:", 0, 0)
-    pdf.set_font("Arial", "", 9)
-    pdf.cell(30, 5, txt(data.moneda), 0, 1)
-
-    pdf.set_x(12)
-    pdf.set_font("Arial", "B", 9)
-    pdf.cell(20, 5, "Fecha:", 0, 0)
-    pdf.set_font("Arial", "", 9)
-    pdf.cell(50, 5, txt(data.fecha_emision), 0, 1)
-    
-    pdf.ln(10)
-    
-    pdf.set_fill_color(200, 200, 200)
-    pdf.set_font("Arial", "B", 9)
-    pdf.cell(20, 7, "CANT", 1, 0, 'C', fill=True)
-    pdf.cell(100, 7, txt("DESCRIPCIÓN"), 1, 0, 'C', fill=True)
-    pdf.cell(20, 7, "UND", 1, 0, 'C', fill=True)
-    pdf.cell(25, 7, "P.UNIT", 1, 0, 'C', fill=True)
-    pdf.cell(25, 7, "TOTAL", 1, 1, 'C', fill=True)
-    
-    pdf.set_font("Arial", "", 9)
-    subtotal = 0.0
-    
-    for item in data.items:
-        total = item.cantidad * item.precio_unitario
-        subtotal += total
-        pdf.cell(20, 6, str(item.cantidad), 1, 0, 'C')
-        pdf.cell(100, 6, txt(item.descripcion), 1, 0, 'L')
-        pdf.cell(20, 6, txt(item.unidad_medida), 1, 0, 'C')
-        pdf.cell(25, 6, f"{item.precio_unitario:.2f}", 1, 0, 'R')
-        pdf.cell(25, 6, f"{total:.2f}", 1, 1, 'R')
-        
-    pdf.ln(5)
-    
-    pdf.set_font("Arial", "B", 9)
-    pdf.cell(0, 5, txt(f"SON: {data.monto_letras}"), 0, 1)
-    
-    igv = subtotal * 0.18
-    total_final = subtotal + igv
-    
-    x_totales = 135
-    pdf.set_x(x_totales)
-    pdf.cell(30, 6, "Subtotal", 1, 0); pdf.cell(30, 6, f"{subtotal:.2f}", 1, 1, 'R')
-    pdf.set_x(x_totales)
-    pdf.cell(30, 6, "IGV 18%", 1, 0); pdf.cell(30, 6, f"{igv:.2f}", 1, 1, 'R')
-    pdf.set_x(x_totales)
-    pdf.cell(30, 6, "TOTAL", 1, 0); pdf.cell(30, 6, f"{total_final:.2f}", 1, 1, 'R')
+async def call_gemini(prompt: str, generation_config: dict, model_name: str = GEMINI_MODEL):
+    """Una llamada al modelo indicado respetando el limitador; los 429/5xx se reintentan con espera
+    exponencial y jitter. Si se agotan los reintentos lanza UpstreamError."""
+    for intento in range(GEMINI_MAX_RETRIES + 1):
+        with RATE_LIMIT_WAIT.time():
+            await limiter.acquire()
+        async with gemini_semaphore:
+            LLM_IN_FLIGHT.inc()
+            try:
+                with LLM_CALL.time(), span("gemini_call", **{"gen_ai.request.model": model_name, "intento": intento}):
+                    response = await asyncio.wait_for(
+                        llm(model_name).generate_content_async(prompt, generation_config=generation_config),
+                        timeout=GEMINI_TIMEOUT,
+                    )
+            except Exception as e:
+                status = upstream_status(e)
+                if status not in RETRYABLE:
+                    raise
+                error = e
+            else:
+                limiter.on_success()
+                return response
+            finally:
+                LLM_IN_FLIGHT.dec()
+        pausa = retry_after(error)
+        limiter.on_throttle(pausa)
+        if intento == GEMINI_MAX_RETRIES:
+            break
+        LLM_RETRIES.labels(str(status)).inc()
+        demora = max(pausa or 0.0, backoff(intento, GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX))
+        print(f"🔁 Gemini respondió {status}, reintento {intento + 1} en {demora:.2f}s")
+        await asyncio.sleep(demora)
+    LLM_THROTTLED.inc()
+    raise UpstreamError(status, pausa, f"Gemini respondió {status} tras {GEMINI_MAX_RETRIES} reintentos ({error})")
 
-    return bytes(pdf.output())
+async def fetch_response(prompt: str, generation_config: dict, hedge: bool = True):
+    """Texto de la respuesta y uso de tokens (lo que se comparte entre pedidos idénticos).
+    El router elige el modelo y, con hedge, duplica la petición si el primario se demora."""
+    async def attempt(model_name: str):
+        response = await call_gemini(prompt, generation_config, model_name)
+        # Solo gana una respuesta con JSON válido
+        json.loads(response.text)
+        return response
 
-# --- 5. ENDPOINTS ---
+    response = await router.run(attempt, hedge=hedge)
+    usage = usage_from_response(response)
+    PROMPT_TOKENS.inc(usage["prompt_tokens"])
+    OUTPUT_TOKENS.inc(usage["output_tokens"])
+    return response.text, usage
 
-@app.post("/procesar-factura", response_model=InvoiceData)
-def process_invoice(request: InvoiceRequest):
-    print(f"📥 Procesando: {request.texto_factura[:40]}...")
+async def generate_json_async(prompt: str, generation_config: dict = GENERATION_CONFIG, hedge: bool = True):
+    """Llamada asíncrona a Gemini: no ocupa un hilo del threadpool mientras responde.
+    Respeta el semáforo global, el limitador y el timeout por llamada; con GEMINI_COALESCE
+    los prompts idénticos en vuelo comparten la llamada. Devuelve (json, uso de tokens)."""
+    if GEMINI_COALESCE:
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        text, usage = await single_flight.do(key, lambda: fetch_response(prompt, generation_config, hedge))
+    else:
+        text, usage = await fetch_response(prompt, generation_config, hedge)
+    # Cada llamador parsea su copia: complete_invoice y los lotes modifican el dict
+    with PARSE.time():
+        data = json.loads(text)
+    return data, dict(usage)
+
+@traced("extract_invoice_data")
+async def extract_invoice_data_async(text: str):
+    """Devuelve (datos o error_message, uso de tokens)."""
+    campos, prompt, config = known_parties(text)
+    try:
+        data, usage = await generate_json_async(prompt, config)
+        set_attribute("gen_ai.usage.input_tokens", usage["prompt_tokens"])
+        set_attribute("gen_ai.usage.output_tokens", usage["output_tokens"])
+        data.update(campos)
+        return complete_invoice(data), usage
+    except asyncio.TimeoutError:
+        ERRORS.labels("llm_timeout").inc()
+        return {"error_message": f"Error procesando IA: Gemini no respondió en {GEMINI_TIMEOUT:g}s"}, {}
+    except UpstreamError as e:
+        ERRORS.labels("llm_throttled").inc()
+        # 503 + Retry-After: el cliente puede reintentar cuando Gemini recupere la cuota
+        return {"error_message": f"Error procesando IA: {e}", "error_status": 503,
+                "retry_after": e.retry_after or GEMINI_BACKOFF_MAX}, {}
+    except Exception as e:
+        ERRORS.labels("llm").inc()
+        return {"error_message": f"Error procesando IA: {str(e)}"}, {}
+
+async def extract_batch_async(texts: List[str]):
+    """Extrae varios pedidos con una sola llamada. Devuelve (un dict por texto en orden, uso de tokens);
+    los pedidos que la IA no devolvió llevan su propio error_message."""
+    try:
+        # Sin hedge: la latencia de un lote depende de su tamaño, no de la del modelo
+        parsed, usage = await generate_json_async(build_batch_prompt(texts), BATCH_GENERATION_CONFIG, hedge=False)
+    except asyncio.TimeoutError:
+        ERRORS.labels("llm_timeout").inc()
+        return [{"error_message": f"Error procesando IA: Gemini no respondió en {GEMINI_TIMEOUT:g}s"}] * len(texts), {}
+    except Exception as e:
+        ERRORS.labels("llm").inc()
+        return [{"error_message": f"Error procesando IA: {str(e)}"}] * len(texts), {}
+
+    if isinstance(parsed, dict):
+        parsed = [parsed]
+    by_index = {}
+    for position, obj in enumerate(parsed if isinstance(parsed, list) else []):
+        if not isinstance(obj, dict):
+            continue
+        try:
+            by_index[int(obj.pop("indice", position))] = complete_invoice(obj)
+        except (TypeError, ValueError):
+            by_index[position] = complete_invoice(obj)
+    results = [by_index.get(i, {"error_message": "La IA no devolvió este documento"}) for i in range(len(texts))]
+    # El prompt del lote se comparte: las partes conocidas se fijan después, por documento
+    for text, data in zip(texts, results):
+        if "error_message" not in data:
+            data.update(known_parties(text)[0])
+    return results, usage
+
+def cache_put(text: str, raw_data: dict):
+    """Guarda en la caché solo lo que salió del texto. Los campos de emisor y cliente fijados
+    por los datos maestros no se guardan: extract_local los vuelve a buscar al servir la
+    entrada, así una corrección en los maestros no queda vieja hasta el TTL."""
+    if maestros is not None:
+        fijos = maestros.buscar(text, contar=False).campos()
+        raw_data = {k: v for k, v in raw_data.items() if k not in fijos}
+    extraction_cache.put(text, raw_data)
+
+@traced("extract_local")
+def extract_local(text: str, usar_cache: bool):
+    """Intenta resolver sin Gemini: primero la caché y luego el extractor por reglas.
+    Devuelve (camino, datos, confianza) o None si hace falta el LLM."""
+    if usar_cache:
+        cached = extraction_cache.get(text)
+        if cached is not None:
+            # Emisor y cliente conocidos salen de los datos maestros de hoy, no de la entrada
+            cached = dict(cached)
+            if maestros is not None:
+                cached.update(maestros.buscar(text).campos())
+            if all(CAMPOS[rol][0] in cached for rol in ROLES):
+                return "cache", cached, None
+            # Una parte que venía de los datos maestros ya no se reconoce: decide el LLM
+            extraction_cache.stats["misses"] += 1
+    else:
+        extraction_cache.stats["bypass"] += 1
+
+    with FAST_PATH.time():
+        fast = fast_extract(text)
+    if fast.data is not None and fast.confidence >= FAST_PATH_MIN_CONFIDENCE:
+        if maestros is not None:
+            fast.data.update(maestros.buscar(text).campos())
+        return "fast-path", fast.data, fast.confidence
+    FALLBACKS.labels("fast_path_to_llm").inc()
+    return None
+
+async def run_until_disconnect(request: Request, coro):
+    """Ejecuta la corrutina y la cancela si el cliente cierra la conexión antes de terminar."""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                print("🔌 Cliente desconectado, cancelando llamada a Gemini")
+                task.cancel()
+                # 499: convención de nginx para "el cliente cerró la petición"
+                raise HTTPException(status_code=499, detail="Cliente desconectado")
+    finally:
+        if not task.done():
+            task.cancel()
+
+def ya_emitido(factura_id: Optional[int]) -> HTTPException:
+    return HTTPException(status_code=409, detail=f"Documento ya emitido (id {factura_id})",
+                         headers={"X-Factura-Id": str(factura_id)} if factura_id is not None else None)
+
+@traced("emitir")
+def emitir(invoice: InvoiceData) -> Tuple[InvoiceData, Optional[int]]:
+    """Emisión: asigna el número definitivo de la serie al borrador y lo registra.
+    La extracción nunca emite (devuelve el número provisional); solo /emitir, /factura-pdf
+    y facturar_lote.py llegan aquí. Devuelve (documento, id en el registro o None).
+    Un documento con número definitivo que ya está en el registro (mismo RUC y número) da
+    409 con su id en X-Factura-Id: se edita con PUT /facturas/{id}. El índice único del
+    registro lo garantiza también con emisiones simultáneas; los provisionales no cuentan."""
+    if registro is not None and es_definitivo(invoice.serie_correlativo):
+        existente = registro.id_por_numero(invoice.emisor_ruc, invoice.serie_correlativo)
+        if existente is not None:
+            raise ya_emitido(existente)
+    if correlativos is not None:
+        correlativos.asignar(invoice)
+    try:
+        factura_id = registro.guardar(invoice) if registro is not None else None
+    except NumeroRepetido as e:
+        raise ya_emitido(e.factura_id)
+    if maestros is not None:
+        maestros.aprender(invoice.model_dump())
+    return invoice, factura_id
+
+# --- 4. ENDPOINTS ---
+
+@traced("resolve_invoice")
+async def resolve_invoice(request: InvoiceRequest, http_request: Optional[Request] = None, log: bool = True):
+    """Extrae y valida una factura (caché -> reglas -> Gemini), sin emitirla.
+    Devuelve (InvoiceData con el número provisional, cabeceras con el camino usado); con http_request se cancela si
+    el cliente se desconecta. log=False lo usa el procesamiento masivo (facturar_lote.py)."""
+    if log:
+        print(f"📥 Procesando: {request.texto_factura[:40]}...")
     
-    raw_data = extract_invoice_data(request.texto_factura)
+    local = extract_local(request.texto_factura, request.usar_cache)
+    if local is not None:
+        path, raw_data, confidence = local
+        try:
+            with VALIDATION.time(), span("validate_invoice"):
+                invoice = InvoiceData(**raw_data)
+        except Exception as e:
+            # Como en extract_many: si lo local no valida, decide el LLM
+            ERRORS.labels("validation").inc()
+            print(f"⚠️ {path} no validó ({e}), va al LLM")
+        else:
+            if log:
+                print(f"⚡ Resuelto sin LLM ({path})")
+            EXTRACTION_PATH.labels(path).inc()
+            set_attribute("extraction.path", path)
+            headers = {"X-Extraction-Path": path}
+            if confidence is not None:
+                headers["X-Extraction-Confidence"] = f"{confidence:.3f}"
+            return invoice, headers
+
+    EXTRACTION_PATH.labels("llm").inc()
+    set_attribute("extraction.path", "llm")
+    work = extract_invoice_data_async(request.texto_factura)
+    raw_data, usage = await (run_until_disconnect(http_request, work) if http_request is not None else work)
+    if usage and log:
+        print(f"🔢 Tokens: {usage['prompt_tokens']} entrada / {usage['output_tokens']} salida")
     
     if "error_message" in raw_data:
         # Solo lanza error si la IA explotó de verdad
+        if "error_status" in raw_data:
+            raise HTTPException(status_code=raw_data["error_status"], detail=raw_data["error_message"],
+                                headers={"Retry-After": str(math.ceil(raw_data["retry_after"]))})
         raise HTTPException(status_code=400, detail=raw_data['error_message'])
     
     try:
         # Aquí Pydantic usará los defaults si falta algo
-        return InvoiceData(**raw_data)
+        with VALIDATION.time(), span("validate_invoice"):
+            invoice = InvoiceData(**raw_data)
     except Exception as e:
+        ERRORS.labels("validation").inc()
         print(f"❌ Error Data: {e}")
         # Reporte detallado solo si falla Pydantic (muy raro ahora con los defaults)
         raise HTTPException(status_code=422, detail=f"Error procesando datos: {str(e)}")
+    if request.usar_cache:
+        cache_put(request.texto_factura, raw_data)
+    return invoice, {
+        "X-Extraction-Path": "llm",
+        "X-Prompt-Tokens": str(usage.get("prompt_tokens", 0)),
+        "X-Output-Tokens": str(usage.get("output_tokens", 0)),
+    }
 
-@app.post("/generar-pdf")
-def generate_pdf_endpoint(invoice_data: InvoiceData):
+@app.post("/procesar-factura", response_model=InvoiceData)
+async def process_invoice(request: InvoiceRequest, http_request: Request, response: Response):
+    """Borrador para la vista previa: repetir el pedido no consume números de la serie."""
+    invoice, headers = await resolve_invoice(request, http_request)
+    response.headers.update(headers)
+    return invoice
+
+@app.post("/emitir", response_model=InvoiceData)
+def issue_invoice(invoice: InvoiceData, response: Response):
+    """Emite el borrador confirmado: número definitivo de la serie y alta en el registro.
+    Cada llamada emite un documento nuevo; el id del registro va en X-Factura-Id. Un documento
+    que ya está en el registro (mismo RUC y número definitivo) da 409: se edita con PUT /facturas/{id}."""
+    invoice, factura_id = emitir(invoice)
+    if factura_id is not None:
+        response.headers["X-Factura-Id"] = str(factura_id)
+    return invoice
+
+def sse(event: str, data) -> bytes:
+    """Un evento Server-Sent Events con su payload en JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+async def stream_gemini(prompt: str, generation_config: dict, model_name: str):
+    """Trozos de texto de una respuesta de Gemini en streaming. El limitador, el semáforo y
+    GEMINI_TIMEOUT (para la respuesta completa) se respetan igual que en call_gemini.
+    El último elemento es la respuesta del SDK, para leer el uso de tokens."""
+    with RATE_LIMIT_WAIT.time():
+        await limiter.acquire()
+    async with gemini_semaphore:
+        LLM_IN_FLIGHT.inc()
+        try:
+            with LLM_CALL.time():
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + GEMINI_TIMEOUT
+                response = await asyncio.wait_for(
+                    llm(model_name).generate_content_async(prompt, generation_config=generation_config, stream=True),
+                    timeout=GEMINI_TIMEOUT,
+                )
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(0.0, deadline - loop.time()))
+                    except StopAsyncIteration:
+                        break
+                    yield chunk.text
+        finally:
+            LLM_IN_FLIGHT.dec()
+    yield response
+
+async def stream_extraction(request: InvoiceRequest):
+    """Eventos de /procesar-factura/stream: `inicio`, un `campo` por cada campo de cabecera y un
+    `item` por cada ítem en cuanto Gemini los termina de escribir, y al final `factura` con el
+    documento validado con su número provisional (lo mismo que devuelve /procesar-factura). Ante un fallo: `error`."""
+    print(f"📥 Procesando (stream): {request.texto_factura[:40]}...")
+    local = extract_local(request.texto_factura, request.usar_cache)
+    if local is not None:
+        path, raw_data, _ = local
+        try:
+            with VALIDATION.time(), span("validate_invoice"):
+                invoice = InvoiceData(**raw_data)
+        except Exception as e:
+            ERRORS.labels("validation").inc()
+            print(f"⚠️ {path} no validó ({e}), va al LLM")
+        else:
+            EXTRACTION_PATH.labels(path).inc()
+            yield sse("inicio", {"camino": path})
+            yield sse("factura", invoice.model_dump())
+            return
+
+    EXTRACTION_PATH.labels("llm").inc()
+    yield sse("inicio", {"camino": "llm"})
+    # Sin coalescencia ni hedge: cada cliente lee su propio stream del modelo primario
+    model_name = router.order()[0]
+    campos, prompt, config = known_parties(request.texto_factura)
+    for campo, valor in campos.items():
+        yield sse("campo", {"campo": campo, "valor": valor})
+    parser = IncrementalObjectParser()
+    emitted = False
+    started = time.perf_counter()
+    try:
+        # aclosing: si el cliente se va a mitad, el stream suelta el semáforo en el acto
+        async with aclosing(stream_gemini(prompt, config, model_name)) as chunks:
+            async for chunk in chunks:
+                if not isinstance(chunk, str):
+                    response = chunk
+                    continue
+                for event in parser.feed(chunk):
+                    if event[0] == "elemento" and event[1] == "items":
+                        emitted = True
+                        yield sse("item", {"indice": event[2], "item": event[3]})
+                    elif event[0] == "campo" and event[1] != "items":
+                        emitted = True
+                        yield sse("campo", {"campo": event[1], "valor": event[2]})
+        with PARSE.time():
+            raw_data = parser.result()
+    except Exception as e:
+        router.observe(model_name, time.perf_counter() - started, False)
+        status = upstream_status(e)
+        if status in RETRYABLE:
+            limiter.on_throttle(retry_after(e))
+        if not emitted:
+            # Nada mostrado todavía: el camino normal (reintentos + hedge) lo resuelve
+            print(f"🔁 Stream de Gemini falló ({status or type(e).__name__}), sin stream")
+            raw_data, usage = await extract_invoice_data_async(request.texto_factura)
+            if "error_message" in raw_data:
+                yield sse("error", {"detail": raw_data["error_message"], "status": raw_data.get("error_status", 400)})
+                return
+        else:
+            ERRORS.labels("llm_timeout" if isinstance(e, asyncio.TimeoutError) else "llm").inc()
+            yield sse("error", {"detail": f"Error procesando IA: {e or type(e).__name__}", "status": 502})
+            return
+    else:
+        router.observe(model_name, time.perf_counter() - started, True)
+        limiter.on_success()
+        usage = usage_from_response(response)
+        PROMPT_TOKENS.inc(usage["prompt_tokens"])
+        OUTPUT_TOKENS.inc(usage["output_tokens"])
+        raw_data.update(campos)
+        raw_data = complete_invoice(raw_data)
+    if usage:
+        print(f"🔢 Tokens: {usage['prompt_tokens']} entrada / {usage['output_tokens']} salida")
+
+    try:
+        with VALIDATION.time(), span("validate_invoice"):
+            invoice = InvoiceData(**raw_data)
+    except Exception as e:
+        ERRORS.labels("validation").inc()
+        yield sse("error", {"detail": f"Error procesando datos: {str(e)}", "status": 422})
+        return
+    if request.usar_cache:
+        cache_put(request.texto_factura, raw_data)
+    yield sse("factura", invoice.model_dump())
+
+@app.post("/procesar-factura/stream")
+async def process_invoice_stream(request: InvoiceRequest):
+    """Como /procesar-factura, pero en text/event-stream para ir llenando la vista previa."""
+    return StreamingResponse(
+        stream_extraction(request),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: que nginx no acumule los eventos
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/factura-pdf")
+async def invoice_pdf_endpoint(request: InvoiceRequest, http_request: Request, formato: Literal["cabecera", "multipart"] = "cabecera"):
+    """Texto -> documento emitido -> PDF en una sola petición. Los datos viajan junto al PDF:
+    en la cabecera X-Invoice-Data (JSON en base64url) o, con ?formato=multipart,
+    como primera parte de una respuesta multipart/mixed."""
+    invoice, headers = await resolve_invoice(request, http_request)
+    invoice, factura_id = await run_in_threadpool(emitir, invoice)
+    if factura_id is not None:
+        headers["X-Factura-Id"] = str(factura_id)
+    try:
+        pdf_bytes = await run_in_threadpool(create_invoice_pdf, invoice)
+    except Exception as e:
+        ERRORS.labels("pdf").inc()
+        raise HTTPException(status_code=500, detail=f"Error PDF: {str(e)}")
+
+    invoice_json = invoice.model_dump_json().encode("utf-8")
+    filename = f"Doc_{invoice.client_ruc_dni}.pdf"
+
+    if formato == "multipart":
+        boundary = uuid.uuid4().hex
+        body = b"".join([
+            f"--{boundary}\r\nContent-Type: application/json; charset=utf-8\r\n\r\n".encode(),
+            invoice_json,
+            f"\r\n--{boundary}\r\nContent-Type: application/pdf\r\n"
+            f"Content-Disposition: attachment; filename={filename}\r\n\r\n".encode(),
+            pdf_bytes,
+            f"\r\n--{boundary}--\r\n".encode(),
+        ])
+        return Response(content=body, media_type=f"multipart/mixed; boundary={boundary}", headers=headers)
+
+    headers["X-Invoice-Data"] = base64.urlsafe_b64encode(invoice_json).decode("ascii")
+    headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+async def extract_many(request: BatchInvoiceRequest, http_request: Optional[Request] = None) -> BatchInvoiceResponse:
+    """Extracción por lotes; con http_request se cancela si el cliente se desconecta."""
+    print(f"📥 Procesando lote de {len(request.textos)} pedidos...")
+    results = [None] * len(request.textos)
+    pending = []
+
+    for i, text in enumerate(request.textos):
+        local = extract_local(text, request.usar_cache)
+        if local is not None:
+            try:
+                with VALIDATION.time(), span("validate_invoice"):
+                    invoice = InvoiceData(**local[1])
+            except Exception as e:
+                # Un acierto de la caché o del extractor que no valida: lo lee el LLM
+                ERRORS.labels("validation").inc()
+                print(f"⚠️ Pedido {i}: {local[0]} no validó ({e}), va al LLM")
+                pending.append(i)
+                continue
+            EXTRACTION_PATH.labels(local[0]).inc()
+            results[i] = BatchItemResult(indice=i, ok=True, camino=local[0], data=invoice)
+        else:
+            pending.append(i)
+
+    # Los pedidos restantes se agrupan en prompts de `tamano_lote` y los grupos van en paralelo
+    groups = [pending[k:k + request.tamano_lote] for k in range(0, len(pending), request.tamano_lote)]
+    work = asyncio.gather(*(extract_batch_async([request.textos[i] for i in group]) for group in groups))
+    extracted = await (run_until_disconnect(http_request, work) if http_request is not None else work)
+
+    EXTRACTION_PATH.labels("llm").inc(len(pending))
+    tokens = {"prompt_tokens": 0, "output_tokens": 0}
+    for group, (raw_list, usage) in zip(groups, extracted):
+        for key in tokens:
+            tokens[key] += usage.get(key, 0)
+        for i, raw_data in zip(group, raw_list):
+            if "error_message" in raw_data:
+                results[i] = BatchItemResult(indice=i, ok=False, camino="llm", error=raw_data["error_message"])
+                continue
+            try:
+                with VALIDATION.time(), span("validate_invoice"):
+                    invoice = InvoiceData(**raw_data)
+            except Exception as e:
+                ERRORS.labels("validation").inc()
+                results[i] = BatchItemResult(indice=i, ok=False, camino="llm", error=f"Error procesando datos: {str(e)}")
+                continue
+            if request.usar_cache:
+                cache_put(request.textos[i], raw_data)
+            results[i] = BatchItemResult(indice=i, ok=True, camino="llm", data=invoice)
+
+    return BatchInvoiceResponse(resultados=results, llamadas_llm=len(groups), **tokens)
+
+@app.post("/procesar-facturas", response_model=BatchInvoiceResponse)
+async def process_invoices_batch(request: BatchInvoiceRequest, http_request: Request):
+    return await extract_many(request, http_request)
+
+def pdf_response(invoice: InvoiceData, if_none_match: Optional[str], headers: Optional[dict] = None):
+    """PDF con ETag fuerte (hash del contenido y de RENDERER_VERSION). Si el cliente ya lo tiene
+    (If-None-Match), 304 sin cuerpo; si está en la caché, sin volver a diagramarlo; si no, se
+    renderiza, se envía en trozos y se guarda al terminar."""
+    key = pdf_key(invoice)
+    headers = dict(headers or {}, ETag=etag(key))
+    if etag_matches(if_none_match, key):
+        PDF_CACHE.labels("no_modificado").inc()
+        return Response(status_code=304, headers={k: v for k, v in headers.items() if k != "Content-Disposition"})
+    headers.setdefault("Content-Disposition", f"attachment; filename=Doc_{invoice.client_ruc_dni}.pdf")
+    pdf = pdf_cache.get(key) if pdf_cache is not None else None
+    if pdf is not None:
+        return Response(pdf, media_type="application/pdf", headers=headers)
     try:
-        pdf_bytes = create_invoice_pdf(invoice_data)
-        filename = f"Doc_{invoice_data.client_ruc_dni}.pdf"
-        return Response(content=pdf_bytes, media_type="application/pdf", headers={"Content-Disposition": f"attachment; filename={filename}"})
+        # Renderiza aquí, antes de responder: un error es un 500 y no un PDF cortado
+        pages = iter_invoice_pdf(invoice)
     except Exception as e:
+        ERRORS.labels("pdf").inc()
         raise HTTPException(status_code=500, detail=f"Error PDF: {str(e)}")
+    if pdf_cache is not None:
+        pages = pdf_cache.tee(key, pages)
+    return StreamingResponse(pages, media_type="application/pdf", headers=headers)
+
+@app.post("/generar-pdf")
+def generate_pdf_endpoint(invoice_data: InvoiceData, if_none_match: Optional[str] = Header(default=None)):
+    """El PDF de fpdf2 se envía en trozos (StreamingResponse), sin otra copia entera en memoria.
+    Solo imprime: el registro no cambia (las ediciones van por PUT /facturas/{id})."""
+    return pdf_response(invoice_data, if_none_match)
+
+@app.post("/generar-pdfs")
+async def generate_pdfs_endpoint(invoices: List[InvoiceData]):
+    """Reimpresión masiva: los PDFs se generan en un pool de procesos y se devuelven en un ZIP en streaming."""
+    print(f"🖨️ Generando {len(invoices)} PDFs...")
+    return StreamingResponse(
+        stream_pdf_zip(invoices),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=facturas.zip"},
+    )
+
+def require_firmante() -> Firmante:
+    firmante = firmante_from_env()
+    if firmante is None:
+        raise HTTPException(status_code=404, detail="XML UBL desactivado: falta el certificado (UBL_CERT_PATH)")
+    return firmante
+
+@app.post("/generar-xml")
+def generate_xml_endpoint(invoice_data: InvoiceData, formato: Literal["xml", "zip"] = "xml"):
+    """XML UBL 2.1 firmado para SUNAT; con formato=zip, el paquete de envío (<nombre>.zip)."""
+    firmante = require_firmante()
+    try:
+        nombre = nombre_archivo(invoice_data)
+        xml = generar_xml(invoice_data, firmante)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if formato == "zip":
+        return Response(paquete_sunat(nombre, xml), media_type="application/zip",
+                        headers={"Content-Disposition": f"attachment; filename={nombre}.zip"})
+    return Response(xml, media_type="application/xml",
+                    headers={"Content-Disposition": f"attachment; filename={nombre}.xml"})
+
+@app.post("/generar-xmls")
+async def generate_xmls_endpoint(invoices: List[InvoiceData]):
+    """XML firmados en el pool de procesos: un ZIP con xml/<nombre>.xml y sunat/<nombre>.zip por documento."""
+    require_firmante()
+    print(f"🧾 Generando {len(invoices)} XML UBL...")
+    return StreamingResponse(
+        stream_zip(invoices, xml_entries, xml_filename, "XMLs", compression=zipfile.ZIP_DEFLATED),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=xml_sunat.zip"},
+    )
+
+# --- 5. TRABAJOS ASÍNCRONOS ---
+
+JOBS_DIR = os.getenv("JOBS_DIR", "jobs_resultados")
+
+async def job_extraction(payload: dict, job_id: str) -> dict:
+    response = await extract_many(BatchInvoiceRequest(**payload))
+    return response.model_dump()
+
+def write_chunks(path: str, chunks):
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+async def job_render(payload: dict, job_id: str) -> dict:
+    """Un PDF o, con varias facturas, un ZIP; se escribe a un temporal y se renombra al terminar."""
+    invoices = [InvoiceData(**f) for f in payload["facturas"]]
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    if len(invoices) == 1:
+        filename, media_type = f"{job_id}.pdf", "application/pdf"
+        tmp = os.path.join(JOBS_DIR, filename + ".tmp")
+        await run_in_threadpool(write_chunks, tmp, iter_invoice_pdf(invoices[0]))
+    else:
+        filename, media_type = f"{job_id}.zip", "application/zip"
+        tmp = os.path.join(JOBS_DIR, filename + ".tmp")
+        with open(tmp, "wb") as f:
+            async for chunk in stream_pdf_zip(invoices):
+                f.write(chunk)
+    os.replace(tmp, os.path.join(JOBS_DIR, filename))
+    return {"archivo": filename, "media_type": media_type, "facturas": len(invoices),
+            "bytes": os.path.getsize(os.path.join(JOBS_DIR, filename))}
+
+job_store = job_store_from_env()
+job_queue = None
+if job_store is not None:
+    job_queue = JobQueue(
+        job_store,
+        {"extraccion": job_extraction, "pdf": job_render},
+        workers=int(os.getenv("JOB_WORKERS", "4")),
+    )
+
+class JobRequest(BaseModel):
+    tipo: Literal["extraccion", "pdf"]
+    prioridad: int = Field(default=0, ge=-10, le=10)
+    # extraccion
+    textos: Optional[List[str]] = None
+    tamano_lote: int = Field(default=GEMINI_BATCH_SIZE, ge=1, le=50)
+    usar_cache: bool = Field(default=True)
+    # pdf
+    facturas: Optional[List[InvoiceData]] = None
+    callback_url: Optional[str] = None
+    max_intentos: int = Field(default=3, ge=1, le=10)
+
+class JobCreated(BaseModel):
+    id: str
+    estado: str
+    url: str
+
+def require_jobs() -> JobQueue:
+    if job_queue is None:
+        raise HTTPException(status_code=404, detail="Cola de trabajos desactivada (JOBS_DB_PATH)")
+    return job_queue
+
+@app.post("/jobs", response_model=JobCreated, status_code=202)
+def create_job(request: JobRequest):
+    """Encola una extracción por lotes o un renderizado y responde de inmediato con el id."""
+    queue = require_jobs()
+    if request.tipo == "extraccion":
+        if not request.textos:
+            raise HTTPException(status_code=422, detail="Un trabajo de extracción necesita 'textos'")
+        payload = {"textos": request.textos, "tamano_lote": request.tamano_lote, "usar_cache": request.usar_cache}
+    else:
+        if not request.facturas:
+            raise HTTPException(status_code=422, detail="Un trabajo de PDF necesita 'facturas'")
+        payload = {"facturas": [f.model_dump() for f in request.facturas]}
+    if request.callback_url:
+        try:
+            validar_callback(request.callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    job_id = queue.submit(request.tipo, payload, prioridad=request.prioridad,
+                          max_intentos=request.max_intentos, callback_url=request.callback_url)
+    return JobCreated(id=job_id, estado="pendiente", url=f"/jobs/{job_id}")
+
+@app.get("/jobs/stats")
+def job_stats():
+    return require_jobs().store.resumen()
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = require_jobs().store.obtener(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    if job["tipo"] == "pdf" and job["estado"] == "ok":
+        job["resultado"]["url"] = f"/jobs/{job_id}/resultado"
+    return job
+
+@app.get("/jobs/{job_id}/resultado")
+def get_job_result(job_id: str):
+    job = get_job(job_id)
+    if job["tipo"] != "pdf":
+        raise HTTPException(status_code=404, detail="El resultado de una extracción está en GET /jobs/{id}")
+    if job["estado"] != "ok":
+        raise HTTPException(status_code=409, detail=f"El trabajo está en estado '{job['estado']}'")
+    resultado = job["resultado"]
+    return FileResponse(os.path.join(JOBS_DIR, resultado["archivo"]), media_type=resultado["media_type"],
+                        filename=resultado["archivo"])
+
+ready = asyncio.Event()
+
+def warmup():
+    """Deja cargado lo pedido en WARMUP para que la primera petición no lo pague."""
+    if "pdf" in WARMUP:
+        create_invoice_pdf(InvoiceData(
+            emisor_ruc="20000000000", client="-", client_ruc_dni="00000000",
+            items=[Item(descripcion="-", cantidad=1, precio_unitario=1)],
+        ))
+    if "gemini" in WARMUP:
+        for name in router.models:
+            llm(name)
+
+@app.on_event("startup")
+async def on_startup():
+    if WARMUP:
+        # Se espera aquí: uvicorn no acepta conexiones en este worker hasta que termina,
+        # así con varios workers ninguna petición cae en uno sin calentar
+        started = time.perf_counter()
+        try:
+            await run_in_threadpool(warmup)
+            print(f"🔥 Calentamiento ({', '.join(WARMUP)}) en {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            print(f"⚠️ Falló el calentamiento: {e}")
+    if job_queue is not None:
+        job_queue.start()
+    ready.set()
+
+@app.get("/ready")
+def readiness():
+    """Readiness para el balanceador: 200 con el worker arrancado, 503 mientras se apaga."""
+    body = {"listo": ready.is_set(), "calentamiento": WARMUP, "gemini_cargado": sdk_loaded()}
+    if not ready.is_set():
+        return JSONResponse(body, status_code=503)
+    return body
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    ready.clear()
+    if job_queue is not None:
+        await job_queue.stop()
+    shutdown_pdf_pool()
+    if correlativos is not None:
+        correlativos.liberar()
+    if tracer is not None:
+        tracer.cerrar()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return extraction_cache.snapshot()
+
+@app.get("/cache/pdf/stats")
+def pdf_cache_stats():
+    if pdf_cache is None:
+        raise HTTPException(status_code=404, detail="Caché de PDFs desactivada (PDF_CACHE_MAX_MB=0)")
+    return pdf_cache.snapshot()
+
+def require_maestros():
+    if maestros is None:
+        raise HTTPException(status_code=404, detail="Datos maestros desactivados (sin MAESTROS_PATH ni registro)")
+    return maestros
+
+@app.get("/maestros/stats")
+def master_data_stats():
+    return require_maestros().snapshot()
+
+@app.post("/maestros/recargar")
+def reload_master_data():
+    """Relee MAESTROS_PATH en este worker (los demás lo hacen solos al ver el archivo cambiado)."""
+    return require_maestros().recargar()
+
+def require_admin(token: Optional[str]) -> Profiler:
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Perfilado desactivado (sin ADMIN_TOKEN)")
+    if not profiler.autorizado(token):
+        raise HTTPException(status_code=403, detail="Falta X-Admin-Token o no es válido")
+    return profiler
+
+@app.get("/admin/profiles")
+def list_profiles(x_admin_token: Optional[str] = Header(default=None), limite: int = Query(50, ge=1, le=500)):
+    """Perfiles guardados, del más reciente al más antiguo (ruta, estado, duración, muestras, trace_id)."""
+    return require_admin(x_admin_token).listar(limite)
+
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, x_admin_token: Optional[str] = Header(default=None)):
+    """Pilas colapsadas del perfil: `flamegraph.pl perfil.folded > perfil.svg` o abrir en speedscope."""
+    path = require_admin(x_admin_token).ruta_folded(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=f"{profile_id}.folded")
+
+@app.get("/llm/stats")
+def llm_stats():
+    """Estado del limitador, de la coalescencia y del router (primario, plazo del hedge, percentiles)."""
+    return {
+        "limitador": limiter.snapshot(),
+        "coalescencia": dict(single_flight.stats, en_vuelo=len(single_flight)),
+        "modelos": router.snapshot(),
+    }
+
+class InvoiceSummary(BaseModel):
+    id: int
+    serie_correlativo: str
+    emisor_ruc: str
+    client: str
+    client_ruc_dni: str
+    fecha_emision: str
+    total: float
+    moneda: str
+
+class InvoicePage(BaseModel):
+    facturas: List[InvoiceSummary]
+    siguiente: Optional[str] = None
+
+def require_registro():
+    if registro is None:
+        raise HTTPException(status_code=404, detail="Registro de facturas desactivado (FACTURAS_DB_PATH)")
+    return registro
+
+@app.get("/facturas", response_model=InvoicePage)
+def list_invoices(
+    ruc: Optional[str] = None,
+    cliente: Optional[str] = None,
+    serie: Optional[str] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    limite: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    """Documentos emitidos, del más reciente al más antiguo. `siguiente` es el cursor de la próxima página."""
+    store = require_registro()
+    rango = {}
+    for name, value in (("desde", desde), ("hasta", hasta)):
+        if value is not None:
+            rango[name] = fecha_iso(value)
+            if rango[name] is None:
+                raise HTTPException(status_code=422, detail=f"Fecha inválida en '{name}': use DD/MM/YYYY o YYYY-MM-DD")
+    try:
+        facturas, siguiente = store.buscar(ruc, cliente, serie, limite=limite, cursor=cursor, **rango)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=422, detail="Cursor inválido")
+    return InvoicePage(facturas=facturas, siguiente=siguiente)
+
+@app.get("/facturas/{factura_id}", response_model=InvoiceData)
+def get_invoice(factura_id: int):
+    invoice = require_registro().obtener(factura_id)
+    if invoice is None:
+        raise HTTPException(status_code=404, detail="Factura no encontrada")
+    return invoice
+
+@app.put("/facturas/{factura_id}", response_model=InvoiceData)
+def edit_invoice(factura_id: int, invoice: InvoiceData):
+    """Edición de un documento emitido. El RUC emisor y el número no cambian (409 si difieren).
+    Los datos corregidos del emisor y el cliente pasan a los datos maestros."""
+    store = require_registro()
+    actual = get_invoice(factura_id)
+    if (invoice.emisor_ruc, invoice.serie_correlativo) != (actual.emisor_ruc, actual.serie_correlativo):
+        raise HTTPException(status_code=409, detail="El RUC emisor y el número de un documento emitido no se editan")
+    if not store.actualizar(factura_id, invoice):
+        raise HTTPException(status_code=404, detail="Factura no encontrada")
+    if maestros is not None:
+        maestros.aprender(invoice.model_dump())
+    return invoice
+
+@app.get("/facturas/{factura_id}/pdf")
+def reprint_invoice(factura_id: int, if_none_match: Optional[str] = Header(default=None)):
+    """Reimpresión desde el registro: el PDF se rehace con los datos guardados, sin LLM.
+    no-cache: el navegador revalida con el ETag, porque los datos pueden editarse."""
+    return pdf_response(get_invoice(factura_id), if_none_match, {"Cache-Control": "no-cache"})
+
+@app.get("/correlativos/huecos")
+def correlativo_gaps(ruc: Optional[str] = None):
+    """Rangos que quedaron reservados por workers caídos: no se reasignan y hay que darlos de baja."""
+    if correlativos is None:
+        return []
+    return correlativos.huecos(ruc)
 
 if __name__ == "__main__":
     import uvicorn
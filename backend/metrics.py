@@ -0,0 +1,108 @@
+"""Métricas Prometheus del servicio (expuestas en GET /metrics).
+
+Los hijos con etiquetas se resuelven una sola vez al importar, así cada
+medición en el camino caliente es un perf_counter y una suma.
+Con varios workers de uvicorn, definir PROMETHEUS_MULTIPROC_DIR para
+agregar las métricas de todos los procesos.
+"""
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from starlette.routing import Match
+
+STAGE_SECONDS = Histogram(
+    "factura_stage_seconds",
+    "Duración de cada etapa del procesamiento",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+LLM_CALL = STAGE_SECONDS.labels("llm_call")
+PARSE = STAGE_SECONDS.labels("parse")
+VALIDATION = STAGE_SECONDS.labels("validation")
+FAST_PATH = STAGE_SECONDS.labels("fast_path")
+PDF_LAYOUT = STAGE_SECONDS.labels("pdf_layout")
+PDF_SERIALIZE = STAGE_SECONDS.labels("pdf_serialize")
+RATE_LIMIT_WAIT = STAGE_SECONDS.labels("rate_limit_wait")
+
+REQUEST_SECONDS = Histogram("factura_http_request_seconds", "Duración de las peticiones HTTP", ["route"])
+IN_FLIGHT = Gauge("factura_in_flight", "Trabajo en curso", ["kind"], multiprocess_mode="livesum")
+HTTP_IN_FLIGHT = IN_FLIGHT.labels("http")
+LLM_IN_FLIGHT = IN_FLIGHT.labels("llm")
+
+ERRORS = Counter("factura_errors_total", "Errores por etapa", ["stage"])
+EXTRACTION_PATH = Counter("factura_extraction_path_total", "Extracciones por camino usado", ["path"])
+FALLBACKS = Counter("factura_fallbacks_total", "Caídas a un camino más lento", ["reason"])
+TOKENS = Counter("factura_llm_tokens_total", "Tokens consumidos en Gemini", ["kind"])
+PROMPT_TOKENS = TOKENS.labels("prompt")
+OUTPUT_TOKENS = TOKENS.labels("output")
+
+# Llamadas a Gemini (upstream.py): pedidos idénticos que compartieron una llamada,
+# reintentos por código de estado y ritmo permitido por el limitador (suma de los workers)
+COALESCED = Counter("factura_llm_coalesced_total", "Extracciones que reutilizaron una llamada en vuelo")
+LLM_RETRIES = Counter("factura_llm_retries_total", "Reintentos de llamadas a Gemini", ["status"])
+LLM_THROTTLED = Counter("factura_llm_throttled_total", "Llamadas que agotaron los reintentos por 429/5xx")
+# Enrutado entre modelos (model_router.py)
+HEDGES = Counter("factura_llm_hedges_total", "Peticiones duplicadas en el modelo secundario", ["resultado"])
+MODEL_LATENCY = Histogram(
+    "factura_llm_model_seconds",
+    "Latencia de Gemini por modelo (las canceladas cuentan hasta la cancelación)",
+    ["model"],
+    buckets=(0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 7.5, 10, 20, 30),
+)
+LLM_RATE = Gauge("factura_llm_rate_limit", "Llamadas por segundo que permite el limitador", multiprocess_mode="livesum")
+# Caché de PDFs (pdf_cache.py): memoria, disco, fallo o 304 sin cuerpo
+PDF_CACHE = Counter("factura_pdf_cache_total", "Consultas a la caché de PDFs por resultado", ["resultado"])
+# Datos maestros (maestros.py): partes reconocidas sin el LLM por rol y por cómo se encontraron
+MASTER_DATA_HITS = Counter("factura_master_data_hits_total", "Emisores/clientes rellenados desde los datos maestros", ["rol", "via"])
+
+# Cola de trabajos (jobs.py): la profundidad sale de la base compartida, cualquier worker vale
+JOB_QUEUE_DEPTH = Gauge("factura_job_queue_depth", "Trabajos pendientes", ["tipo"], multiprocess_mode="max")
+JOB_WAIT_SECONDS = Histogram(
+    "factura_job_wait_seconds",
+    "Espera en cola hasta que un worker toma el trabajo",
+    ["tipo"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600),
+)
+JOB_RUN_SECONDS = Histogram(
+    "factura_job_run_seconds",
+    "Duración de la ejecución de cada trabajo",
+    ["tipo"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600),
+)
+JOBS = Counter("factura_jobs_total", "Trabajos terminados por resultado", ["tipo", "resultado"])
+
+
+def render_latest():
+    """Cuerpo y content-type para GET /metrics."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """Middleware ASGI puro: peticiones en vuelo y latencia por ruta (plantilla, no URL concreta)."""
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    def _route_label(self, scope) -> str:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "other")
+        return "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timer = REQUEST_SECONDS.labels(self._route_label(scope)).time()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            with timer:
+                await self.app(scope, receive, send)
+        finally:
+            HTTP_IN_FLIGHT.dec()
@@ -0,0 +1,173 @@
+"""Enrutado de extracciones entre modelos de Gemini por latencia, con hedging.
+
+- Cada modelo lleva una ventana de sus últimas latencias (y errores). El primario
+  es el de menor mediana, penalizada por su tasa de error; mientras no hay
+  muestras suficientes se respeta el orden de GEMINI_MODELS. Una fracción
+  pequeña de las peticiones (GEMINI_EXPLORE) prueba otro modelo como primario
+  para que sus datos no se queden viejos.
+- Hedging: si el primario no respondió en su percentil GEMINI_HEDGE_PERCENTILE,
+  se lanza la misma petición al siguiente modelo y gana el primer JSON válido;
+  el otro se cancela. Si el primario falla antes, el secundario sale de
+  inmediato (fallback).
+- La latencia de una petición cancelada es una cota inferior de la real: se
+  registra igual, porque descartarla haría que el percentil (y el plazo del
+  hedge) bajen solos con cada hedge.
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from metrics import HEDGES, MODEL_LATENCY
+
+T = TypeVar("T")
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+        self.outcomes = deque(maxlen=size)  # True = respuesta válida
+
+    def record(self, seconds: float, ok: bool = True):
+        self.samples.append(seconds)
+        self.outcomes.append(ok)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class ModelRouter:
+    def __init__(self, models: List[str], hedge: bool = True, percentile: float = 95,
+                 default_delay: float = 2.0, min_delay: float = 0.05, min_samples: int = 20,
+                 explore: float = 0.02, window: int = 200, rng: random.Random = None):
+        self.models = list(models)
+        self.hedge = hedge and len(self.models) > 1
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.explore = explore
+        self.rng = rng or random.Random()
+        self.windows: Dict[str, LatencyWindow] = {m: LatencyWindow(window) for m in self.models}
+        self.stats = {"peticiones": 0, "hedges": 0, "gana_secundario": 0, "fallbacks": 0, "exploraciones": 0}
+
+    def _score(self, model: str) -> float:
+        window = self.windows[model]
+        if len(window) < self.min_samples:
+            return float("inf")
+        return window.percentile(50) * (1 + 4 * window.error_rate)
+
+    def order(self) -> List[str]:
+        """Modelos en el orden en que se intentan; el primero es el primario."""
+        ranked = sorted(self.models, key=lambda m: (self._score(m), self.models.index(m)))
+        if len(ranked) > 1 and self.rng.random() < self.explore:
+            self.stats["exploraciones"] += 1
+            ranked[0], ranked[1] = ranked[1], ranked[0]
+        return ranked
+
+    def deadline(self, model: str) -> float:
+        """Espera antes de lanzar el hedge: el percentil configurado del modelo."""
+        window = self.windows[model]
+        if len(window) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, window.percentile(self.percentile))
+
+    def observe(self, model: str, seconds: float, ok: bool = True):
+        """Registra una latencia medida fuera de run() (p. ej. una respuesta en streaming)."""
+        self.windows[model].record(seconds, ok)
+        MODEL_LATENCY.labels(model).observe(seconds)
+
+    def _record(self, model: str, started: float, ok: bool):
+        self.observe(model, time.perf_counter() - started, ok)
+
+    async def run(self, call: Callable[[str], Awaitable[T]], hedge: bool = True) -> T:
+        """Ejecuta call(modelo) en el primario y, si tarda o falla, también en el secundario.
+        Devuelve el primer resultado sin excepción; si ambos fallan, relanza el error del último."""
+        self.stats["peticiones"] += 1
+        order = self.order()
+        if not (hedge and self.hedge):
+            started = time.perf_counter()
+            try:
+                result = await call(order[0])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._record(order[0], started, False)
+                raise
+            self._record(order[0], started, True)
+            return result
+
+        tasks: Dict[asyncio.Task, tuple] = {}
+
+        def launch(model: str):
+            tasks[asyncio.ensure_future(call(model))] = (model, time.perf_counter())
+
+        launch(order[0])
+        try:
+            done, _ = await asyncio.wait(set(tasks), timeout=self.deadline(order[0]))
+            if not done:
+                self.stats["hedges"] += 1
+                HEDGES.labels("lanzado").inc()
+                launch(order[1])
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    model, started = tasks[task]
+                    if task.exception() is None:
+                        self._record(model, started, True)
+                        if model != order[0]:
+                            self.stats["gana_secundario"] += 1
+                            HEDGES.labels("gana_secundario").inc()
+                        return task.result()
+                    self._record(model, started, False)
+                    error = task.exception()
+                    if len(tasks) == 1:
+                        # El primario falló antes del plazo: el secundario sale ya
+                        self.stats["fallbacks"] += 1
+                        HEDGES.labels("fallback").inc()
+                        launch(order[1])
+                        pending = {t for t in tasks if not t.done()}
+            raise error
+        finally:
+            for task, (model, started) in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    # Cota inferior de su latencia, ver el docstring del módulo
+                    self._record(model, started, True)
+
+    def snapshot(self) -> dict:
+        order = sorted(self.models, key=lambda m: (self._score(m), self.models.index(m)))
+        modelos = {}
+        for model, window in self.windows.items():
+            modelos[model] = {
+                "muestras": len(window),
+                "p50": window.percentile(50),
+                "p95": window.percentile(95),
+                "p99": window.percentile(99),
+                "errores": round(window.error_rate, 3),
+            }
+        return dict(self.stats, primario=order[0], plazo_hedge=round(self.deadline(order[0]), 3), modelos=modelos)
+
+
+def router_from_env(models: List[str]) -> ModelRouter:
+    return ModelRouter(
+        models,
+        hedge=os.getenv("GEMINI_HEDGE", "1") != "0",
+        percentile=float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95")),
+        default_delay=float(os.getenv("GEMINI_HEDGE_DELAY", "2")),
+        explore=float(os.getenv("GEMINI_EXPLORE", "0.02")),
+    )
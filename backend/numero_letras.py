@@ -0,0 +1,56 @@
+"""Conversión de montos a letras en español (formato SUNAT).
+
+    monto_a_letras(68.44) -> "SESENTA Y OCHO CON 44/100 SOLES"
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+_UNIDADES = (
+    "", "UNO", "DOS", "TRES", "CUATRO", "CINCO", "SEIS", "SIETE", "OCHO", "NUEVE",
+    "DIEZ", "ONCE", "DOCE", "TRECE", "CATORCE", "QUINCE", "DIECISEIS", "DIECISIETE",
+    "DIECIOCHO", "DIECINUEVE", "VEINTE", "VEINTIUNO", "VEINTIDOS", "VEINTITRES",
+    "VEINTICUATRO", "VEINTICINCO", "VEINTISEIS", "VEINTISIETE", "VEINTIOCHO", "VEINTINUEVE",
+)
+_DECENAS = ("", "", "", "TREINTA", "CUARENTA", "CINCUENTA", "SESENTA", "SETENTA", "OCHENTA", "NOVENTA")
+_CENTENAS = (
+    "", "CIENTO", "DOSCIENTOS", "TRESCIENTOS", "CUATROCIENTOS", "QUINIENTOS",
+    "SEISCIENTOS", "SETECIENTOS", "OCHOCIENTOS", "NOVECIENTOS",
+)
+
+MONEDAS = {"SOLES": "SOLES", "DOLARES": "DOLARES AMERICANOS", "DÓLARES": "DOLARES AMERICANOS"}
+
+
+def _menor_mil(n: int) -> str:
+    if n == 100:
+        return "CIEN"
+    centenas, resto = divmod(n, 100)
+    partes = [_CENTENAS[centenas]] if centenas else []
+    if resto < 30:
+        partes.append(_UNIDADES[resto])
+    else:
+        decenas, unidades = divmod(resto, 10)
+        partes.append(_DECENAS[decenas] + (f" Y {_UNIDADES[unidades]}" if unidades else ""))
+    return " ".join(p for p in partes if p)
+
+
+def entero_a_letras(n: int) -> str:
+    if n == 0:
+        return "CERO"
+    partes = []
+    millones, resto = divmod(n, 1_000_000)
+    if millones:
+        partes.append("UN MILLON" if millones == 1 else f"{entero_a_letras(millones)} MILLONES")
+    miles, unidades = divmod(resto, 1000)
+    if miles:
+        partes.append("MIL" if miles == 1 else f"{_menor_mil(miles)} MIL")
+    if unidades:
+        partes.append(_menor_mil(unidades))
+    # "VEINTIUNO MIL" -> "VEINTIUN MIL", "UNO MILLONES" no ocurre por el caso especial
+    return " ".join(partes).replace("UNO MIL", "UN MIL")
+
+
+def monto_a_letras(monto, moneda: str = "SOLES") -> str:
+    valor = Decimal(str(monto)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    entero = int(valor)
+    centimos = int((valor - entero) * 100)
+    nombre_moneda = MONEDAS.get(moneda.strip().upper(), moneda.strip().upper())
+    return f"{entero_a_letras(entero)} CON {centimos:02d}/100 {nombre_moneda}"
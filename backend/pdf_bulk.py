@@ -0,0 +1,143 @@
+"""Renderizado masivo (PDFs, o XML UBL con ubl_sunat.py) en un pool de procesos, emitido como ZIP en streaming.
+
+Cada PDF se escribe en el ZIP apenas termina, así el lote completo nunca
+está en memoria. Como máximo hay PDF_POOL_WINDOW PDFs en vuelo: si el
+cliente descarga despacio, StreamingResponse deja de pedir chunks y no se
+encolan más trabajos (back-pressure).
+"""
+import asyncio
+import multiprocessing
+import os
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Tuple
+
+from pdf_generator import render_pdf_from_dict
+from schemas import InvoiceData
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_POOL_WINDOW = int(os.getenv("PDF_POOL_WINDOW", str(PDF_WORKERS * 2)))
+
+_pool = None
+_pool_lock = threading.Lock()
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # "spawn": no heredamos el event loop ni los hilos del servidor al hacer fork
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pdf_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def render_pdf_to_file(data: dict, path: str) -> int:
+    """En el proceso del pool: renderiza y escribe el PDF (temporal + rename), devuelve los bytes.
+    Así el PDF no vuelve por el pipe al proceso principal."""
+    pdf = render_pdf_from_dict(data)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp, path)
+    return len(pdf)
+
+
+class _ChunkBuffer:
+    """Destino no posicionable para zipfile: acumula lo escrito hasta que se drena."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def pdf_filename(index: int, invoice: InvoiceData) -> str:
+    return f"Doc_{index:05d}_{_UNSAFE_CHARS.sub('_', invoice.client_ruc_dni)}.pdf"
+
+
+def pdf_entries(name: str, data: dict) -> List[Tuple[str, bytes]]:
+    """Punto de entrada para los procesos del pool: un PDF por documento."""
+    return [(name, render_pdf_from_dict(data))]
+
+
+async def stream_pdf_zip(invoices: List[InvoiceData]):
+    async for chunk in stream_zip(invoices, pdf_entries, pdf_filename, "PDFs"):
+        yield chunk
+
+
+async def stream_zip(invoices: List[InvoiceData], render: Callable, filename: Callable, label: str,
+                     compression: int = zipfile.ZIP_STORED):
+    """ZIP en streaming: render(nombre, dict) corre en el pool y devuelve las entradas
+    [(ruta, bytes), ...] de cada documento; filename(índice, invoice) da su nombre.
+    Los PDFs de fpdf ya van comprimidos: por defecto ZIP_STORED evita gastar CPU otra vez."""
+    loop = asyncio.get_running_loop()
+    pool = get_pdf_pool()
+    buffer = _ChunkBuffer()
+    archive = zipfile.ZipFile(buffer, mode="w", compression=compression)
+    pending = {}
+    queue = iter(enumerate(invoices))
+    exhausted = False
+    ok = errors = 0
+    start = time.perf_counter()
+
+    try:
+        while pending or not exhausted:
+            while not exhausted and len(pending) < PDF_POOL_WINDOW:
+                try:
+                    index, invoice = next(queue)
+                except StopIteration:
+                    exhausted = True
+                    break
+                name = filename(index, invoice)
+                future = loop.run_in_executor(pool, render, name, invoice.model_dump())
+                pending[future] = name
+
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    for path, data in future.result():
+                        archive.writestr(path, data)
+                    ok += 1
+                except BrokenProcessPool:
+                    # Un worker murió: se descarta el pool para que la próxima petición cree uno nuevo
+                    shutdown_pdf_pool()
+                    raise
+                except Exception as e:
+                    archive.writestr(f"{name.removesuffix('.pdf')}.error.txt", f"Error: {e}")
+                    errors += 1
+            yield buffer.drain()
+
+        archive.close()
+        yield buffer.drain()
+    finally:
+        for future in pending:
+            future.cancel()
+        elapsed = time.perf_counter() - start
+        rate = ok / elapsed if elapsed else 0.0
+        print(f"📦 ZIP: {ok} {label} ({errors} errores) en {elapsed:.2f}s -> {rate:.1f} {label}/s con {PDF_WORKERS} procesos")
@@ -0,0 +1,234 @@
+"""Caché de PDFs direccionada por contenido.
+
+La clave es el SHA-256 del InvoiceData validado en JSON canónico (claves
+ordenadas, sin espacios) junto con RENDERER_VERSION. pdf_generator.py fija la
+fecha de creación del PDF a la de emisión, así el mismo documento da el mismo
+PDF byte a byte aunque se vuelva a renderizar (tras un reinicio o un desalojo) y
+la clave sirve también de ETag fuerte. Al cambiar el diseño se sube RENDERER_VERSION y las entradas viejas
+dejan de encontrarse solas.
+
+Nivel 1: LRU en memoria acotado por bytes (por proceso).
+Nivel 2: lo que sale de memoria, y los PDFs demasiado grandes para ella, van a una
+carpeta (un archivo por clave, compartida entre workers y acotada por bytes medidos
+en la carpeta; se borran los de uso más viejo).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+from metrics import PDF_CACHE
+from pdf_generator import RENDERER_VERSION
+from schemas import InvoiceData
+
+
+def pdf_key(invoice: InvoiceData) -> str:
+    canonical = json.dumps(invoice.model_dump(), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{RENDERER_VERSION}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+def etag(key: str) -> str:
+    return f'"{key}"'
+
+
+def etag_matches(if_none_match: Optional[str], key: str) -> bool:
+    """If-None-Match usa comparación débil: se ignora el prefijo W/."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag(key):
+            return True
+    return False
+
+
+class SpillDir:
+    """Carpeta de desborde: <clave>.pdf, escritura atómica y tope de bytes (sale el de uso más viejo).
+
+    La comparten todos los workers, así que el tamaño se mide en la propia carpeta: cada
+    worker suma lo que escribe y, cuando esa cuenta pasa el tope o hace más de `reescaneo`
+    segundos que no mira, la recorre, ve el total real y borra por fecha de modificación
+    (un acierto la renueva) hasta dejarla en el 90 % del tope. Entre dos recorridos la
+    carpeta puede pasarse por lo que escribieron los demás workers en ese rato."""
+
+    def __init__(self, path: str, max_bytes: int, reescaneo: float = 5.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.reescaneo = reescaneo
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._bytes = self._entries = 0
+        self._escaneado = 0.0
+        self._podar()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.pdf")
+
+    def _tmp(self, key: str) -> str:
+        return f"{self._file(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._file(key), "rb") as f:
+                pdf = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            # El uso renueva la fecha: así el orden de salida es el mismo para todos los workers
+            os.utime(self._file(key))
+        except FileNotFoundError:
+            pass
+        return pdf
+
+    def put(self, key: str, pdf: bytes):
+        tmp = self._tmp(key)
+        with open(tmp, "wb") as f:
+            f.write(pdf)
+        self._confirmar(key, tmp, len(pdf))
+
+    def _confirmar(self, key: str, tmp: str, size: int):
+        os.replace(tmp, self._file(key))
+        with self._lock:
+            self._bytes += size
+            self._entries += 1
+            if self._bytes <= self.max_bytes and time.monotonic() - self._escaneado < self.reescaneo:
+                return
+            self._podar()
+
+    def _podar(self):
+        """Con el lock tomado (o desde __init__): total real de la carpeta y borrado de los más viejos."""
+        entries = []
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.name.endswith(".pdf"):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue  # Otro worker lo acaba de borrar
+                    entries.append((st.st_mtime, entry.path, st.st_size))
+        total = sum(size for _, _, size in entries)
+        if total > self.max_bytes:
+            entries.sort()
+            objetivo = self.max_bytes * 0.9
+            while entries and total > objetivo:
+                _, path, size = entries.pop(0)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self._bytes, self._entries = total, len(entries)
+        self._escaneado = time.monotonic()
+
+    def __len__(self):
+        return self._entries
+
+
+class PdfCache:
+    def __init__(self, max_bytes: int, spill: Optional[SpillDir] = None, max_entry_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        # Un PDF enorme no desplaza a todo lo demás de la memoria: va directo a disco
+        self.max_entry_bytes = max_entry_bytes or max(1, max_bytes // 8)
+        self.spill = spill
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "spilled": 0}
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            pdf = self._data.get(key)
+            if pdf is not None:
+                self._data.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                PDF_CACHE.labels("memoria").inc()
+                return pdf
+        if self.spill is not None and (pdf := self.spill.get(key)) is not None:
+            self.stats["disk_hits"] += 1
+            PDF_CACHE.labels("disco").inc()
+            self._put_memory(key, pdf)
+            return pdf
+        self.stats["misses"] += 1
+        PDF_CACHE.labels("fallo").inc()
+        return None
+
+    def _put_memory(self, key: str, pdf: bytes):
+        if len(pdf) > self.max_entry_bytes:
+            return
+        evicted = []
+        with self._lock:
+            old = self._data.pop(key, None)
+            self._bytes += len(pdf) - (len(old) if old is not None else 0)
+            self._data[key] = pdf
+            while self._bytes > self.max_bytes:
+                old_key, old_pdf = self._data.popitem(last=False)
+                self._bytes -= len(old_pdf)
+                evicted.append((old_key, old_pdf))
+        # Fuera del lock: escribir a disco no frena a los demás hilos
+        if self.spill is not None:
+            for old_key, old_pdf in evicted:
+                self.spill.put(old_key, old_pdf)
+                self.stats["spilled"] += 1
+
+    def put(self, key: str, pdf: bytes):
+        if len(pdf) <= self.max_entry_bytes:
+            self._put_memory(key, pdf)
+        elif self.spill is not None:
+            self.spill.put(key, pdf)
+            self.stats["spilled"] += 1
+
+    def tee(self, key: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Deja pasar los trozos del PDF y, si se completó, lo guarda. Si pasa de
+        max_entry_bytes, lo que sigue se escribe al archivo temporal del disco a medida
+        que sale, en lugar de acumularlo."""
+        parts, size, tmp, archivo = [], 0, None, None
+        completo = False
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                if archivo is not None:
+                    archivo.write(chunk)
+                elif parts is not None:
+                    parts.append(chunk)
+                    if size > self.max_entry_bytes:
+                        if self.spill is not None:
+                            tmp = self.spill._tmp(key)
+                            archivo = open(tmp, "wb")
+                            archivo.writelines(parts)
+                        parts = None  # No se acumula más en memoria
+                yield chunk
+            completo = True
+        finally:
+            if archivo is not None:
+                archivo.close()
+                if completo:
+                    self.spill._confirmar(key, tmp, size)
+                    self.stats["spilled"] += 1
+                else:
+                    os.remove(tmp)
+        if parts is not None:
+            self._put_memory(key, b"".join(parts))
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "memory_entries": len(self._data),
+            "memory_bytes": self._bytes,
+            "disk_entries": len(self.spill) if self.spill is not None else 0,
+            "renderer_version": RENDERER_VERSION,
+        }
+
+
+def pdf_cache_from_env() -> Optional[PdfCache]:
+    """PDF_CACHE_MAX_MB=0 desactiva la caché; PDF_CACHE_DIR vacío, solo memoria."""
+    max_mb = float(os.getenv("PDF_CACHE_MAX_MB", "64"))
+    if max_mb <= 0:
+        return None
+    path = os.getenv("PDF_CACHE_DIR", "pdf_cache")
+    spill = None
+    if path:
+        spill = SpillDir(path, int(float(os.getenv("PDF_CACHE_DISK_MAX_MB", "1024")) * 2**20))
+    return PdfCache(int(max_mb * 2**20), spill)
@@ -0,0 +1,310 @@
+"""Generación del PDF de la factura/boleta con fpdf2.
+
+Mismo diseño de siempre (cabecera con emisor y recuadro del RUC, datos del
+cliente, tabla de ítems, monto en letras y totales), preparado para facturas
+de miles de líneas:
+
+- La paginación se calcula antes de dibujar: filas por página, cabecera de la
+  tabla repetida en cada página y subtotales "Van"/"Vienen" entre páginas.
+- Los textos en latin-1, sus anchos y los recortes a la celda se cachean; las
+  métricas son las de las fuentes base de fpdf2.
+- Las celdas de la tabla se dibujan con rect + text de fpdf2, en la misma posición
+  que pone cell (que hace layout de texto con estilos y es ~10 veces más lento).
+- La fecha de creación del PDF es la de emisión (medianoche UTC) y no la del reloj: el
+  mismo documento da siempre los mismos bytes, y pdf_cache.py usa su clave como ETag
+  fuerte.
+- fpdf2 se importa con el primer PDF (cuesta ~300 ms y no debe pagarse al
+  arrancar el proceso).
+- iter_invoice_pdf dibuja y serializa el documento antes de devolver nada, así
+  un error sale como excepción (HTTP 500) y no como una respuesta cortada, y
+  luego entrega la salida de fpdf2 en trozos para StreamingResponse sin copiarla
+  entera otra vez.
+"""
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Iterator, List
+
+from metrics import PDF_LAYOUT, PDF_SERIALIZE
+from registro_facturas import fecha_iso
+from schemas import InvoiceData
+from totales import calcular_items
+from tracing import span
+
+# Subirla al cambiar el diseño o la serialización: invalida los PDFs cacheados (pdf_cache.py)
+RENDERER_VERSION = "4"
+
+K = 72 / 25.4  # puntos por milímetro
+PAGE_W, PAGE_H = 210, 297
+MARGIN = 10
+C_MARGIN = 1  # margen interno de las celdas (el de fpdf2: 1 mm)
+LIMITE_Y = PAGE_H - 20  # mismo límite que el salto de página automático de fpdf2
+CHUNK = 64 * 1024  # tamaño de los trozos de la respuesta
+# /CreationDate de los documentos sin fecha de emisión legible ("HOY" en un borrador)
+FECHA_FIJA = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+# Estilo -> nombre de las métricas de la fuente base en fpdf2
+FUENTES = {"B": "helveticaB", "": "helvetica", "I": "helveticaI"}
+
+# Tabla de ítems: (ancho, alineación) de CANT, DESCRIPCIÓN, UND, P.UNIT, TOTAL
+COLUMNAS = ((20, "C"), (100, "L"), (20, "C"), (25, "R"), (25, "R"))
+TITULOS = ("CANT", "DESCRIPCIÓN", "UND", "P.UNIT", "TOTAL")
+ALTO_CABECERA_TABLA = 7
+ALTO_FILA = 6
+Y_TABLA_PRIMERA = 77  # tras el recuadro del cliente
+Y_TABLA_SIGUIENTES = 40  # tras la cabecera de página
+ALTO_CIERRE = 5 + 5 + 3 * ALTO_FILA  # espacio, "SON: ..." y los tres totales
+# Primera fila de ítems: tras la cabecera de la tabla (y la fila "Vienen" desde la página 2)
+Y_FILAS_PRIMERA = Y_TABLA_PRIMERA + ALTO_CABECERA_TABLA
+Y_FILAS_SIGUIENTES = Y_TABLA_SIGUIENTES + ALTO_CABECERA_TABLA + ALTO_FILA
+
+
+_metricas = None
+_metricas_lock = threading.Lock()
+
+
+def metricas() -> dict:
+    """Estilo -> anchos de carácter (milésimas del tamaño), cargados una sola vez."""
+    global _metricas
+    if _metricas is None:
+        with _metricas_lock:
+            if _metricas is None:
+                from fpdf.fonts import CORE_FONTS_CHARWIDTHS
+                _metricas = {estilo: CORE_FONTS_CHARWIDTHS[nombre] for estilo, nombre in FUENTES.items()}
+    return _metricas
+
+
+@lru_cache(maxsize=8192)
+def txt(texto) -> str:
+    return str(texto).encode('latin-1', 'replace').decode('latin-1')
+
+
+@lru_cache(maxsize=8192)
+def _ancho(texto: str, estilo: str, size: float) -> float:
+    """Ancho del texto en milímetros."""
+    cw = metricas()[estilo]
+    return sum(cw.get(c, 0) for c in texto) * size / 1000 / K
+
+
+@lru_cache(maxsize=8192)
+def _ajustar(texto: str, estilo: str, size: float, ancho: float) -> str:
+    """Texto en latin-1, recortado con "..." para que quepa en la celda."""
+    texto = txt(texto)
+    disponible = ancho - 2 * C_MARGIN
+    if _ancho(texto, estilo, size) <= disponible:
+        return texto
+    cw = metricas()[estilo]
+    limite = (disponible - _ancho("...", estilo, size)) * K * 1000 / size
+    acumulado = 0
+    for corte, c in enumerate(texto):
+        acumulado += cw.get(c, 0)
+        if acumulado > limite:
+            return texto[:corte] + "..."
+    return texto
+
+
+@dataclass
+class _Tramo:
+    """Filas [inicio, fin) de una página y el subtotal acumulado al entrar (en céntimos)."""
+    inicio: int
+    fin: int
+    vienen_cents: int
+    van_cents: int
+
+
+def paginar(lineas_cents) -> List[_Tramo]:
+    """Reparte las filas en páginas dejando sitio para la fila "Van" y el cierre."""
+    n = len(lineas_cents)
+    tramos = []
+    inicio, acumulado = 0, 0
+    y = Y_FILAS_PRIMERA
+    while True:
+        # Filas que caben dejando sitio para la fila "Van" al pie
+        capacidad = max(1, int((LIMITE_Y - ALTO_FILA - y) // ALTO_FILA))
+        fin = min(n, inicio + capacidad)
+        van = acumulado + int(sum(lineas_cents[inicio:fin]))
+        tramos.append(_Tramo(inicio, fin, acumulado, van))
+        inicio, acumulado = fin, van
+        if inicio >= n:
+            return tramos
+        y = Y_FILAS_SIGUIENTES
+
+
+def _nueva_pagina(pdf, data: InvoiceData):
+    """Página con la cabecera del emisor y el pie con su número (lo que hacían header/footer)."""
+    pdf.add_page()
+    pdf.set_xy(MARGIN, 10)
+    pdf.set_font("helvetica", "B", 14)
+    pdf.set_text_color(0, 51, 153)
+    pdf.cell(100, 10, txt(data.emisor_nombre[:35]))
+    pdf.set_text_color(0)
+    pdf.set_font("helvetica", "B", 10)
+    pdf.rect(120, 10, 80, 25)
+    for y, texto in ((14, data.document_type.upper()), (21, f"RUC: {data.emisor_ruc}"), (28, data.serie_correlativo)):
+        pdf.set_xy(120, y)
+        pdf.cell(80, 5, txt(texto), align="C")
+    pdf.set_xy(MARGIN, 20)
+    pdf.set_font("helvetica", "", 8)
+    pdf.cell(100, 5, txt(data.emisor_direccion[:60]))
+    pdf.set_xy(MARGIN, PAGE_H - 15)
+    pdf.set_font("helvetica", "I", 8)
+    pdf.cell(PAGE_W - 2 * MARGIN, 10, f"Pagina {pdf.page_no()}", align="C")
+
+
+def _datos_cliente(pdf, data: InvoiceData):
+    pdf.rect(10, 45, 190, 25)
+    filas = (
+        (("Cliente:", data.client),),
+        (("Dirección:", data.client_address),),
+        (("RUC/DNI:", data.client_ruc_dni), ("Moneda:", data.moneda)),
+        (("Fecha:", data.fecha_emision),),
+    )
+    y = 47
+    for fila in filas:
+        pdf.set_xy(12, y)
+        for etiqueta, valor in fila:
+            pdf.set_font("helvetica", "B", 9)
+            pdf.cell(20, 5, txt(etiqueta))
+            pdf.set_font("helvetica", "", 9)
+            pdf.cell(50, 5, txt(valor))
+        y += 5
+
+
+def _celda(pdf, x: float, y: float, w: float, h: float, texto: str, estilo: str = "", size: float = 9,
+           align: str = "L", relleno: bool = False):
+    """Celda con borde como la de cell(w, h, texto, border=1); la fuente ya está puesta."""
+    pdf.rect(x, y, w, h, style="DF" if relleno else None)
+    if align == "L":
+        tx = x + C_MARGIN
+    elif align == "R":
+        tx = x + w - C_MARGIN - _ancho(texto, estilo, size)
+    else:
+        tx = x + (w - _ancho(texto, estilo, size)) / 2
+    pdf.text(tx, y + h / 2 + 0.3 * size / K, texto)
+
+
+def _cabecera_tabla(pdf, y: float):
+    pdf.set_font("helvetica", "B", 9)
+    x = MARGIN
+    for (ancho, _), titulo in zip(COLUMNAS, TITULOS):
+        _celda(pdf, x, y, ancho, ALTO_CABECERA_TABLA, txt(titulo), "B", align="C", relleno=True)
+        x += ancho
+
+
+def _fila_subtotal(pdf, y: float, etiqueta: str, cents: int):
+    ancho_etiqueta = sum(ancho for ancho, _ in COLUMNAS[:-1])
+    pdf.set_font("helvetica", "B", 9)
+    _celda(pdf, MARGIN, y, ancho_etiqueta, ALTO_FILA, etiqueta, "B", align="R")
+    _celda(pdf, MARGIN + ancho_etiqueta, y, COLUMNAS[-1][0], ALTO_FILA, f"{cents / 100:.2f}", "B", align="R")
+
+
+@lru_cache(maxsize=4096)
+def _precio(valor: float) -> str:
+    return f"{valor:.2f}"
+
+
+def _cierre(pdf, y: float, data: InvoiceData, totales):
+    y += 5
+    pdf.set_xy(MARGIN, y)
+    pdf.set_font("helvetica", "B", 9)
+    pdf.cell(PAGE_W - 2 * MARGIN, 5, txt(f"SON: {data.monto_letras}"))
+    y += 5
+    for etiqueta, valor in (("Subtotal", totales.subtotal), ("IGV 18%", totales.igv), ("TOTAL", totales.total)):
+        pdf.set_xy(135, y)
+        pdf.cell(30, ALTO_FILA, etiqueta, border=1)
+        pdf.cell(30, ALTO_FILA, f"{valor:.2f}", border=1, align="R")
+        y += ALTO_FILA
+
+
+def _fecha_creacion(data: InvoiceData) -> datetime:
+    """Fecha de emisión como /CreationDate: depende solo del documento."""
+    iso = fecha_iso(data.fecha_emision)
+    if iso is None:
+        return FECHA_FIJA
+    return datetime.fromisoformat(iso).replace(tzinfo=timezone.utc)
+
+
+def layout_invoice_pdf(data: InvoiceData):
+    """Dibuja el documento con fpdf2 sobre la paginación precalculada."""
+    from fpdf import FPDF
+
+    totales = calcular_items(data.items)
+    tramos = paginar(totales.lineas_cents)
+    ultimo = tramos[-1]
+    y_fin = Y_FILAS_PRIMERA if len(tramos) == 1 else Y_FILAS_SIGUIENTES
+    y_fin += (ultimo.fin - ultimo.inicio) * ALTO_FILA
+    # Si el cierre no entra tras la última fila, va solo en una página más
+    cierre_aparte = y_fin + ALTO_CIERRE > LIMITE_Y
+
+    pdf = FPDF(unit="mm", format="A4")
+    pdf.set_creation_date(_fecha_creacion(data))
+    pdf.set_auto_page_break(False)
+    pdf.set_fill_color(200, 200, 200)
+    widths = [ancho for ancho, _ in COLUMNAS]
+    for n, tramo in enumerate(tramos):
+        _nueva_pagina(pdf, data)
+        if n == 0:
+            _datos_cliente(pdf, data)
+            y = Y_TABLA_PRIMERA
+        else:
+            y = Y_TABLA_SIGUIENTES
+        _cabecera_tabla(pdf, y)
+        y += ALTO_CABECERA_TABLA
+        if n > 0:
+            _fila_subtotal(pdf, y, "Vienen", tramo.vienen_cents)
+            y += ALTO_FILA
+
+        pdf.set_font("helvetica", "", 9)
+        for i in range(tramo.inicio, tramo.fin):
+            item = data.items[i]
+            textos = (
+                str(item.cantidad),
+                _ajustar(item.descripcion, "", 9, widths[1]),
+                txt(item.unidad_medida),
+                _precio(item.precio_unitario),
+                f"{int(totales.lineas_cents[i]) / 100:.2f}",
+            )
+            x = MARGIN
+            for (ancho, align), texto in zip(COLUMNAS, textos):
+                _celda(pdf, x, y, ancho, ALTO_FILA, texto, align=align)
+                x += ancho
+            y += ALTO_FILA
+
+        ultima = n == len(tramos) - 1
+        if not ultima or cierre_aparte:
+            _fila_subtotal(pdf, y, "Van", tramo.van_cents)
+        if ultima and not cierre_aparte:
+            _cierre(pdf, y_fin, data, totales)
+
+    if cierre_aparte:
+        _nueva_pagina(pdf, data)
+        _cierre(pdf, Y_TABLA_SIGUIENTES, data, totales)
+    return pdf
+
+
+def _render(data: InvoiceData) -> bytearray:
+    with span("create_invoice_pdf", items=len(data.items)) as actual:
+        with PDF_LAYOUT.time():
+            pdf = layout_invoice_pdf(data)
+        with PDF_SERIALIZE.time():
+            salida = pdf.output()
+        if actual is not None:
+            actual.set("paginas", pdf.page_no())
+    return salida
+
+
+def iter_invoice_pdf(data: InvoiceData) -> Iterator[bytes]:
+    """Renderiza de inmediato (los errores salen antes de empezar a responder) y devuelve
+    un iterador sobre la salida de fpdf2 en trozos de CHUNK bytes."""
+    salida = memoryview(_render(data))
+    return (bytes(salida[i:i + CHUNK]) for i in range(0, len(salida), CHUNK))
+
+
+def create_invoice_pdf(data: InvoiceData) -> bytes:
+    return bytes(_render(data))
+
+
+def render_pdf_from_dict(data: dict) -> bytes:
+    """Punto de entrada para los procesos del pool de renderizado masivo."""
+    return create_invoice_pdf(InvoiceData(**data))
@@ -0,0 +1,248 @@
+"""Perfilado por muestreo de una petición concreta, a pedido y con token de administración.
+
+Con ADMIN_TOKEN definido, una petición con `X-Profile: 1` (o `?profile=1`) y
+`X-Admin-Token: <token>` se ejecuta con un hilo que cada PROFILE_INTERVAL_MS toma
+las pilas de todos los hilos (sys._current_frames) y cuenta las que no están
+esperando. Al terminar quedan en PROFILE_DIR:
+- <id>.folded: pilas colapsadas (`hilo;función (archivo:línea);... muestras`), el
+  formato de flamegraph.pl, inferno y speedscope.
+- <id>.json: ruta, estado, duración, muestras y cuántas peticiones había en vuelo.
+
+La respuesta lleva X-Profile-Id; el perfil se descarga con GET /admin/profiles/<id>.
+El muestreo ve todo el proceso: si `concurrentes_max` es mayor que 1, el perfil
+incluye trabajo de otras peticiones del mismo worker.
+
+Sin ADMIN_TOKEN el middleware no se instala; con él, una petición sin la marca solo
+paga recorrer sus cabeceras.
+"""
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+from urllib.parse import parse_qs
+
+from starlette.responses import JSONResponse
+
+import tracing
+
+PROFILE_ID = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$")
+
+# Hojas de pila que indican un hilo esperando (loop en select, threadpool o colas vacías)
+_INACTIVAS = {("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get"),
+              ("threading.py", "_wait_for_tstate_lock")}
+
+
+def _etiquetador():
+    """Nombre corto y estable por función: `nombre (archivo relativo:primera línea)`."""
+    prefijos = sorted({os.path.abspath(p) + os.sep for p in sys.path if p}, key=len, reverse=True)
+    cache = {}
+
+    def etiqueta(code) -> str:
+        label = cache.get(code)
+        if label is None:
+            archivo = code.co_filename
+            for prefijo in prefijos:
+                if archivo.startswith(prefijo):
+                    archivo = archivo[len(prefijo):]
+                    break
+            label = f"{code.co_name} ({archivo}:{code.co_firstlineno})".replace(";", ":")
+            cache[code] = label
+        return label
+
+    return etiqueta
+
+
+class Muestreo:
+    """Hilo de muestreo mientras dura una petición perfilada."""
+
+    # Los perfiles activos comparten un intervalo de cambio de hilo más corto, para que el
+    # muestreador consiga el GIL a su ritmo aunque la petición no lo suelte
+    _lock = threading.Lock()
+    _activos = 0
+    _switch_original = None
+
+    def __init__(self, interval: float, en_vuelo):
+        self.interval = interval
+        self.en_vuelo = en_vuelo
+        self.pilas = Counter()
+        self.muestras = 0
+        self.inactivas = 0
+        self.concurrentes_max = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def __enter__(self):
+        with Muestreo._lock:
+            if Muestreo._activos == 0:
+                Muestreo._switch_original = sys.getswitchinterval()
+                sys.setswitchinterval(min(Muestreo._switch_original, self.interval))
+            Muestreo._activos += 1
+        self.inicio = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.duracion = time.perf_counter() - self.inicio
+        with Muestreo._lock:
+            Muestreo._activos -= 1
+            if Muestreo._activos == 0:
+                sys.setswitchinterval(Muestreo._switch_original)
+        return False
+
+    def _run(self):
+        propio = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.concurrentes_max = max(self.concurrentes_max, self.en_vuelo())
+            nombres = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                nombre = nombres.get(ident, str(ident))
+                if ident == propio or nombre in ("profiler", "tracing-export"):
+                    continue
+                self.muestras += 1
+                hoja = frame.f_code
+                if (os.path.basename(hoja.co_filename), hoja.co_name) in _INACTIVAS:
+                    self.inactivas += 1
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                self.pilas[(nombre, tuple(reversed(codes)))] += 1
+
+    def folded(self) -> str:
+        etiqueta = _etiquetador()
+        lineas = Counter()
+        for (hilo, codes), n in self.pilas.items():
+            lineas[";".join([hilo.replace(";", ":"), *map(etiqueta, codes)])] += n
+        return "".join(f"{pila} {n}\n" for pila, n in lineas.most_common())
+
+
+class Profiler:
+    """Guarda los perfiles en una carpeta compartida por los workers (cualquiera los sirve)."""
+
+    def __init__(self, token: str, directory: str = "profiles", interval: float = 0.001, keep: int = 200):
+        self.token = token.encode("utf-8")
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    def autorizado(self, token: Optional[str]) -> bool:
+        return token is not None and hmac.compare_digest(token.encode("utf-8"), self.token)
+
+    def nuevo_id(self) -> str:
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    def guardar(self, profile_id: str, muestreo: Muestreo, meta: dict):
+        meta = dict(meta, id=profile_id, duracion_ms=round(muestreo.duracion * 1000, 2),
+                    intervalo_ms=self.interval * 1000, muestras=muestreo.muestras,
+                    muestras_inactivas=muestreo.inactivas, concurrentes_max=muestreo.concurrentes_max)
+        base = os.path.join(self.directory, profile_id)
+        with open(base + ".folded.tmp", "w", encoding="utf-8") as f:
+            f.write(muestreo.folded())
+        os.replace(base + ".folded.tmp", base + ".folded")
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        self._podar()
+        print(f"🔬 Perfil {profile_id}: {meta['metodo']} {meta['ruta']} en {meta['duracion_ms']} ms, "
+              f"{muestreo.muestras - muestreo.inactivas} muestras activas")
+
+    def _podar(self):
+        perfiles = sorted(f for f in os.listdir(self.directory) if f.endswith(".json"))
+        for viejo in perfiles[:max(len(perfiles) - self.keep, 0)]:
+            for ext in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, viejo[:-len(".json")] + ext))
+                except FileNotFoundError:
+                    pass
+
+    def listar(self, limit: int = 50) -> list:
+        perfiles = sorted((f for f in os.listdir(self.directory) if f.endswith(".json")), reverse=True)
+        resultado = []
+        for nombre in perfiles[:limit]:
+            try:
+                with open(os.path.join(self.directory, nombre), encoding="utf-8") as f:
+                    resultado.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return resultado
+
+    def ruta_folded(self, profile_id: str) -> Optional[str]:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, profile_id + ".folded")
+        return path if os.path.exists(path) else None
+
+
+def profiler_from_env() -> Optional[Profiler]:
+    token = os.getenv("ADMIN_TOKEN", "")
+    if not token:
+        return None
+    return Profiler(token, os.getenv("PROFILE_DIR", "profiles"),
+                    float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000,
+                    int(os.getenv("PROFILE_KEEP", "200")))
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI puro: perfila la petición si trae la marca y el token correcto (403 si no)."""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+        self.en_vuelo = 0
+
+    def _pedido(self, scope):
+        """(pide perfil, token) a partir de las cabeceras y la query."""
+        pide, token = False, None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                pide = value not in (b"", b"0", b"false")
+            elif name == b"x-admin-token":
+                token = value.decode("latin-1")
+        if not pide and b"profile=" in scope.get("query_string", b""):
+            valor = parse_qs(scope["query_string"].decode("latin-1")).get("profile", ["0"])[-1]
+            pide = valor not in ("", "0", "false")
+        return pide, token
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        pide, token = self._pedido(scope)
+        if not pide:
+            self.en_vuelo += 1
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                self.en_vuelo -= 1
+        if not self.profiler.autorizado(token):
+            return await JSONResponse({"detail": "Perfilado: falta X-Admin-Token o no es válido"},
+                                      status_code=403)(scope, receive, send)
+
+        profile_id = self.profiler.nuevo_id()
+        meta = {"metodo": scope["method"], "ruta": scope["path"], "creado": time.time(), "estado": None}
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                meta["estado"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        tracing.set_attribute("profile.id", profile_id)
+        meta["trace_id"] = tracing.current_trace_id()
+        muestreo = Muestreo(self.profiler.interval, lambda: self.en_vuelo)
+        self.en_vuelo += 1
+        try:
+            with muestreo:
+                await self.app(scope, receive, send_with_profile)
+        finally:
+            self.en_vuelo -= 1
+            # También si la petición falló: suele ser la que interesa
+            self.profiler.guardar(profile_id, muestreo, meta)
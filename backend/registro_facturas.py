@@ -0,0 +1,226 @@
+"""Registro persistente de los documentos emitidos (SQLite, WAL).
+
+Cada documento se guarda con su InvoiceData completo (JSON) y columnas
+indexadas para las consultas: RUC emisor, RUC/DNI del cliente, fecha de
+emisión (ISO, para rangos) y serie. La paginación es por cursor sobre
+(fecha, id) en orden descendente: cada página es una búsqueda en el índice,
+sin OFFSET, así que el costo no crece con el número de facturas.
+
+La reimpresión (GET /facturas/{id}/pdf) rehace el PDF desde lo guardado,
+sin volver a llamar a Gemini.
+"""
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+from schemas import InvoiceData
+from totales import calcular_items
+
+FECHA_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y")
+
+# Número definitivo: serie y 8 dígitos, como los asigna correlativos.py. Los provisionales
+# de la extracción ("B001-00001") no lo son y pueden repetirse en el registro
+_DEFINITIVO = re.compile(r"-[0-9]{8}\Z")
+_DEFINITIVO_SQL = "serie_correlativo GLOB '*-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]'"
+MAX_LIMITE = 500
+
+# Columnas del resumen que devuelve el listado
+_RESUMEN = "id, serie_correlativo, emisor_ruc, client, client_ruc_dni, fecha, total_cents, moneda"
+
+
+def fecha_iso(value: Optional[str], default: Optional[date] = None) -> Optional[str]:
+    """DD/MM/YYYY (o YYYY-MM-DD) -> YYYY-MM-DD; None si no es una fecha."""
+    for fmt in FECHA_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date().isoformat()
+        except ValueError:
+            continue
+    return default.isoformat() if default else None
+
+
+def _fecha_dmy(iso: str) -> str:
+    return f"{iso[8:10]}/{iso[5:7]}/{iso[0:4]}"
+
+
+def es_definitivo(serie_correlativo: str) -> bool:
+    return _DEFINITIVO.search(serie_correlativo) is not None
+
+
+class NumeroRepetido(Exception):
+    """El RUC emisor ya tiene registrado un documento con ese número definitivo."""
+
+    def __init__(self, factura_id: Optional[int]):
+        super().__init__(f"Documento ya emitido (id {factura_id})")
+        self.factura_id = factura_id
+
+
+def encode_cursor(fecha: str, row_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([fecha, row_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    fecha, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    return str(fecha), int(row_id)
+
+
+class RegistroFacturas:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS facturas ("
+            " id INTEGER PRIMARY KEY,"
+            " emisor_ruc TEXT NOT NULL, serie TEXT NOT NULL, serie_correlativo TEXT NOT NULL,"
+            " client TEXT NOT NULL, client_ruc_dni TEXT NOT NULL, fecha TEXT NOT NULL,"
+            " total_cents INTEGER NOT NULL, moneda TEXT NOT NULL,"
+            " data TEXT NOT NULL, creado REAL NOT NULL, actualizado REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_facturas_emisor ON facturas(emisor_ruc, fecha, id);"
+            "CREATE INDEX IF NOT EXISTS idx_facturas_cliente ON facturas(client_ruc_dni, fecha, id);"
+            "CREATE INDEX IF NOT EXISTS idx_facturas_fecha ON facturas(fecha, id);"
+            "CREATE INDEX IF NOT EXISTS idx_facturas_serie ON facturas(emisor_ruc, serie, fecha, id);"
+            "CREATE INDEX IF NOT EXISTS idx_facturas_numero ON facturas(emisor_ruc, serie_correlativo);"
+        )
+        # Un número definitivo se emite una sola vez por RUC, también entre workers
+        try:
+            self._conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_facturas_numero_unico"
+                f" ON facturas(emisor_ruc, serie_correlativo) WHERE {_DEFINITIVO_SQL}"
+            )
+        except sqlite3.IntegrityError:
+            print("⚠️ El registro ya tiene números definitivos repetidos: sin índice único hasta depurarlos")
+
+    @staticmethod
+    def _fila(invoice: InvoiceData) -> tuple:
+        totales = calcular_items(invoice.items)
+        return (
+            invoice.emisor_ruc,
+            invoice.serie_correlativo.split("-")[0],
+            invoice.serie_correlativo,
+            invoice.client,
+            invoice.client_ruc_dni,
+            fecha_iso(invoice.fecha_emision, date.today()),
+            totales.total_cents,
+            invoice.moneda,
+            invoice.model_dump_json(),
+        )
+
+    def guardar(self, invoice: InvoiceData) -> int:
+        """Alta del documento; NumeroRepetido si su número definitivo ya está registrado."""
+        now = time.time()
+        with self._lock:
+            try:
+                return self._conn.execute(
+                    "INSERT INTO facturas (emisor_ruc, serie, serie_correlativo, client, client_ruc_dni,"
+                    " fecha, total_cents, moneda, data, creado, actualizado)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._fila(invoice) + (now, now),
+                ).lastrowid
+            except sqlite3.IntegrityError:
+                pass
+        raise NumeroRepetido(self.id_por_numero(invoice.emisor_ruc, invoice.serie_correlativo))
+
+    def actualizar(self, factura_id: int, invoice: InvoiceData) -> bool:
+        """Reemplaza los datos del documento `factura_id`. El RUC emisor y el número no se
+        editan: si no coinciden con los registrados no se cambia nada y devuelve False."""
+        now = time.time()
+        fila = self._fila(invoice)
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE facturas SET client = ?, client_ruc_dni = ?, fecha = ?, total_cents = ?,"
+                " moneda = ?, data = ?, actualizado = ? WHERE id = ? AND emisor_ruc = ? AND serie_correlativo = ?",
+                fila[3:] + (now, factura_id, invoice.emisor_ruc, invoice.serie_correlativo),
+            )
+            return cursor.rowcount > 0
+
+    def id_por_numero(self, emisor_ruc: str, serie_correlativo: str) -> Optional[int]:
+        """Id del documento ya emitido con ese RUC y número, o None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM facturas WHERE emisor_ruc = ? AND serie_correlativo = ? LIMIT 1",
+                (emisor_ruc, serie_correlativo),
+            ).fetchone()
+        return row[0] if row else None
+
+    def obtener(self, factura_id: int) -> Optional[InvoiceData]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM facturas WHERE id = ?", (factura_id,)).fetchone()
+        return InvoiceData.model_validate_json(row[0]) if row else None
+
+    def partes(self) -> List[dict]:
+        """Último nombre y dirección de cada emisor y cliente registrado (para los datos maestros)."""
+        # El MAX(id) por grupo sale de los índices; el JSON se lee solo en esas filas
+        with self._lock:
+            emisores = self._conn.execute(
+                "SELECT emisor_ruc, json_extract(data, '$.emisor_nombre'), json_extract(data, '$.emisor_direccion')"
+                " FROM facturas WHERE id IN (SELECT MAX(id) FROM facturas GROUP BY emisor_ruc)"
+            ).fetchall()
+            clientes = self._conn.execute(
+                "SELECT client_ruc_dni, client, json_extract(data, '$.client_address')"
+                " FROM facturas WHERE id IN (SELECT MAX(id) FROM facturas GROUP BY client_ruc_dni)"
+            ).fetchall()
+        partes = [{"emisor_ruc": r, "emisor_nombre": n, "emisor_direccion": d} for r, n, d in emisores]
+        partes += [{"client_ruc_dni": r, "client": n, "client_address": d} for r, n, d in clientes]
+        return partes
+
+    def buscar(
+        self,
+        ruc: Optional[str] = None,
+        cliente: Optional[str] = None,
+        serie: Optional[str] = None,
+        desde: Optional[str] = None,
+        hasta: Optional[str] = None,
+        limite: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Página de resúmenes, de la más reciente a la más antigua, y el cursor de la siguiente."""
+        where, params = [], []
+        for column, value in (("emisor_ruc", ruc), ("client_ruc_dni", cliente), ("serie", serie)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if desde:
+            where.append("fecha >= ?")
+            params.append(desde)
+        if hasta:
+            where.append("fecha <= ?")
+            params.append(hasta)
+        if cursor:
+            where.append("(fecha, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        limite = max(1, min(limite, MAX_LIMITE))
+        sql = f"SELECT {_RESUMEN} FROM facturas"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY fecha DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limite + 1]).fetchall()
+
+        siguiente = None
+        if len(rows) > limite:
+            rows = rows[:limite]
+            siguiente = encode_cursor(rows[-1][5], rows[-1][0])
+        return [
+            {
+                "id": r[0], "serie_correlativo": r[1], "emisor_ruc": r[2], "client": r[3],
+                "client_ruc_dni": r[4], "fecha_emision": _fecha_dmy(r[5]), "total": r[6] / 100, "moneda": r[7],
+            }
+            for r in rows
+        ], siguiente
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM facturas").fetchone()[0]
+
+
+def registro_from_env() -> Optional[RegistroFacturas]:
+    path = os.getenv("FACTURAS_DB_PATH", "facturas.sqlite3")
+    return RegistroFacturas(path) if path else None
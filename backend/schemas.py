@@ -0,0 +1,36 @@
+"""Modelos de datos compartidos por la API y el generador de PDF."""
+from pydantic import BaseModel, Field
+from typing import List
+
+# --- MODELOS DE DATOS (Con Defaults para que NO falle) ---
+
+class Item(BaseModel):
+    descripcion: str
+    cantidad: float
+    # Si la IA no detecta unidad, usará "UNI" en vez de romper
+    unidad_medida: str = Field(default="UNI") 
+    precio_unitario: float
+
+class InvoiceData(BaseModel):
+    # Valores por defecto para evitar errores 422 de validación
+    document_type: str = Field(default="Boleta de Venta")
+    serie_correlativo: str = Field(default="B001-00001")
+    
+    # Datos Emisor (Si faltan, se ponen genéricos)
+    emisor_nombre: str = Field(default="EMISOR POR DEFECTO")
+    emisor_ruc: str = Field(default="00000000000")
+    emisor_direccion: str = Field(default="Dirección del Emisor")
+
+    # Datos Cliente
+    client: str = Field(..., description="El nombre del cliente SI es obligatorio")
+    client_address: str = Field(default="Dirección no especificada")
+    client_ruc_dni: str = Field(default="00000000")
+    
+    # Datos Factura
+    fecha_emision: str = Field(default="HOY")
+    fecha_vencimiento: str = Field(default="HOY")
+    forma_pago: str = Field(default="Contado")
+    moneda: str = Field(default="SOLES")
+    
+    items: List[Item]
+    monto_letras: str = Field(default="---")
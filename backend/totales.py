@@ -0,0 +1,158 @@
+"""Motor único de totales: subtotal, IGV y total en céntimos exactos.
+
+Reglas (las mismas en la API, el PDF, funciones.py y las apps de Streamlit):
+- Total de línea = cantidad × precio, redondeado a céntimos (ROUND_HALF_UP).
+- Subtotal = suma de los totales de línea.
+- IGV = subtotal × tasa, redondeado a céntimos.
+- Total = subtotal + IGV.
+
+Para facturas con miles de líneas (y para el cálculo por lotes) se usa un
+camino columnar con NumPy en aritmética entera; si NumPy no está instalado
+o los valores no caben en ese formato, se usa el camino Decimal. NumPy se
+importa la primera vez que hace falta, no al cargar el módulo.
+"""
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Iterable, List, Sequence, Tuple
+
+IGV_RATE = Decimal("0.18")
+CENTIMO = Decimal("0.01")
+
+# A partir de cuántas líneas conviene el camino NumPy
+UMBRAL_VECTORIAL = 2000
+
+# Escalas del camino entero: cantidades con hasta 3 decimales, precios con hasta 4
+_ESCALA_CANTIDAD = 1_000
+_ESCALA_PRECIO = 10_000
+_ESCALA_PRODUCTO = _ESCALA_CANTIDAD * _ESCALA_PRECIO // 100  # producto -> céntimos
+_LIMITE_INT64 = 2 ** 62
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    try:
+        import numpy
+    except ImportError:  # NumPy es opcional: solo acelera facturas grandes
+        return None
+    return numpy
+
+
+@dataclass(frozen=True)
+class Totales:
+    lineas_cents: Sequence[int]
+    subtotal_cents: int
+    igv_cents: int
+
+    @property
+    def total_cents(self) -> int:
+        return self.subtotal_cents + self.igv_cents
+
+    @property
+    def subtotal(self) -> Decimal:
+        return _a_soles(self.subtotal_cents)
+
+    @property
+    def igv(self) -> Decimal:
+        return _a_soles(self.igv_cents)
+
+    @property
+    def total(self) -> Decimal:
+        return _a_soles(self.total_cents)
+
+    def linea(self, i: int) -> Decimal:
+        return _a_soles(int(self.lineas_cents[i]))
+
+
+def _a_soles(cents: int) -> Decimal:
+    return Decimal(cents) * CENTIMO
+
+
+def _redondear(valor: Decimal) -> int:
+    return int(valor.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def linea_cents(cantidad, precio) -> int:
+    # str() evita arrastrar el error binario del float (0.1 -> "0.1")
+    return _redondear(Decimal(str(cantidad)) * Decimal(str(precio)) * 100)
+
+
+def igv_cents(subtotal_cents: int, igv_rate: Decimal = IGV_RATE) -> int:
+    return _redondear(Decimal(subtotal_cents) * igv_rate)
+
+
+def _calcular_decimal(cantidades, precios, igv_rate) -> Totales:
+    lineas = [linea_cents(c, p) for c, p in zip(cantidades, precios)]
+    subtotal = sum(lineas)
+    return Totales(lineas, subtotal, igv_cents(subtotal, igv_rate))
+
+
+def _lineas_vectorial(cantidades, precios):
+    """Totales de línea en céntimos con int64, o None si algún valor no es representable exacto."""
+    np = _numpy()
+    q = np.asarray(cantidades, dtype=np.float64)
+    p = np.asarray(precios, dtype=np.float64)
+    q_units = np.rint(q * _ESCALA_CANTIDAD)
+    p_units = np.rint(p * _ESCALA_PRECIO)
+    # Exacto solo si ningún valor tiene más decimales que la escala
+    if not (np.array_equal(q_units / _ESCALA_CANTIDAD, q) and np.array_equal(p_units / _ESCALA_PRECIO, p)):
+        return None
+    if np.abs(q_units).max(initial=0) * np.abs(p_units).max(initial=0) >= _LIMITE_INT64:
+        return None
+    producto = q_units.astype(np.int64) * p_units.astype(np.int64)
+    # ROUND_HALF_UP (alejándose de cero) al pasar a céntimos
+    mitad = _ESCALA_PRODUCTO // 2
+    return np.sign(producto) * ((np.abs(producto) + mitad) // _ESCALA_PRODUCTO)
+
+
+def calcular(cantidades: Sequence, precios: Sequence, igv_rate: Decimal = IGV_RATE) -> Totales:
+    """Totales a partir de dos columnas (cantidades y precios unitarios)."""
+    if len(cantidades) >= UMBRAL_VECTORIAL and _numpy() is not None:
+        lineas = _lineas_vectorial(cantidades, precios)
+        if lineas is not None:
+            subtotal = int(lineas.sum())
+            return Totales(lineas, subtotal, igv_cents(subtotal, igv_rate))
+    return _calcular_decimal(cantidades, precios, igv_rate)
+
+
+def columnas(items: Iterable) -> Tuple[List, List]:
+    """Separa ítems (modelos Pydantic o dicts con cantidad/precio_unitario) en dos columnas."""
+    cantidades, precios = [], []
+    for item in items:
+        if isinstance(item, dict):
+            cantidades.append(item["cantidad"])
+            precios.append(item["precio_unitario"])
+        else:
+            cantidades.append(item.cantidad)
+            precios.append(item.precio_unitario)
+    return cantidades, precios
+
+
+def calcular_items(items: Iterable, igv_rate: Decimal = IGV_RATE) -> Totales:
+    return calcular(*columnas(items), igv_rate=igv_rate)
+
+
+def calcular_lote(facturas: Sequence[Tuple[Sequence, Sequence]], igv_rate: Decimal = IGV_RATE) -> List[Totales]:
+    """Totales de muchas facturas en una sola pasada.
+
+    `facturas` es una lista de pares (cantidades, precios). Con NumPy todas las
+    líneas se calculan en un único arreglo y los subtotales con reduceat."""
+    np = _numpy()
+    if np is None or not facturas:
+        return [calcular(c, p, igv_rate) for c, p in facturas]
+
+    largos = np.fromiter((len(c) for c, _ in facturas), dtype=np.int64, count=len(facturas))
+    todas_c = [x for c, _ in facturas for x in c]
+    todas_p = [x for _, p in facturas for x in p]
+    lineas = _lineas_vectorial(todas_c, todas_p) if todas_c else np.zeros(0, dtype=np.int64)
+    if lineas is None:
+        return [_calcular_decimal(c, p, igv_rate) for c, p in facturas]
+
+    inicios = np.concatenate(([0], np.cumsum(largos)[:-1]))
+    # reduceat no admite segmentos vacíos: se suman sobre un arreglo con un cero al final
+    subtotales = np.add.reduceat(np.append(lineas, 0), inicios)
+    subtotales[largos == 0] = 0
+    return [
+        Totales(lineas[inicio:inicio + largo], int(subtotal), igv_cents(int(subtotal), igv_rate))
+        for inicio, largo, subtotal in zip(inicios, largos, subtotales)
+    ]
@@ -0,0 +1,358 @@
+"""Trazas ligeras por petición, exportadas como OTLP/JSON.
+
+Cada petición HTTP abre un span raíz (TracingMiddleware) y las etapas del camino
+caliente abren hijos con `span("nombre")`: resolve_invoice, extracción local,
+extract_invoice_data y cada llamada a Gemini, validación de InvoiceData, emisión
+y create_invoice_pdf. El span actual viaja en un ContextVar, así los hijos creados
+en tareas de asyncio o en el threadpool cuelgan del span correcto.
+
+Los spans terminados van a una cola y un hilo los exporta por lotes, sin bloquear
+las peticiones:
+- TRACE_FILE: una línea JSON por lote (ExportTraceServiceRequest, el formato del
+  file exporter del OpenTelemetry Collector).
+- OTEL_EXPORTER_OTLP_ENDPOINT: POST a <endpoint>/v1/traces con OTLP/HTTP JSON.
+
+Sin ninguno de los dos no hay tracer: `span()` devuelve un contexto nulo compartido
+(una comparación y un return) y el middleware no se instala.
+La cabecera `traceparent` (W3C) continúa una traza empezada en el cliente.
+"""
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Iterable, Iterator, Optional
+
+from starlette.routing import Match
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_ERROR = 2
+
+_NOOP = nullcontext()
+# Span actual; _NO_MUESTREADO marca las peticiones que el muestreo descartó (sus hijos tampoco se graban)
+_NO_MUESTREADO = object()
+_actual: ContextVar = ContextVar("span_actual", default=None)
+_tracer: Optional["Tracer"] = None
+
+
+def _valor(value) -> dict:
+    # bool antes que int: True es un int en Python
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    # Los ids son enteros (trace de 128 bits, span de 64): se pasan a hex al exportar, fuera de la petición
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "end", "attributes", "events", "status")
+
+    def __init__(self, name: str, trace_id: int, parent_id: int = 0, kind: int = SPAN_KIND_INTERNAL, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = 0
+        self.attributes = attributes or {}
+        self.events = []
+        self.status = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def error(self, e: BaseException):
+        self.status = (STATUS_ERROR, str(e))
+        self.events.append(("exception", time.time_ns(),
+                            {"exception.type": type(e).__name__, "exception.message": str(e)}))
+
+    def terminar(self):
+        self.end = time.time_ns()
+        if _tracer is not None:
+            _tracer.exportar(self)
+
+    def otlp(self) -> dict:
+        data = {
+            "traceId": f"{self.trace_id:032x}",
+            "spanId": f"{self.span_id:016x}",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [{"key": k, "value": _valor(v)} for k, v in self.attributes.items()],
+        }
+        if self.parent_id:
+            data["parentSpanId"] = f"{self.parent_id:016x}"
+        if self.events:
+            data["events"] = [
+                {"name": name, "timeUnixNano": str(ts),
+                 "attributes": [{"key": k, "value": _valor(v)} for k, v in attrs.items()]}
+                for name, ts, attrs in self.events
+            ]
+        if self.status is not None:
+            data["status"] = {"code": self.status[0], "message": self.status[1]}
+        return data
+
+
+class _Scope:
+    """`with span(...)`: el span es el actual mientras dura el bloque."""
+    __slots__ = ("span", "token")
+
+    def __init__(self, span: Span):
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self.token = _actual.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _actual.reset(self.token)
+        if exc is not None:
+            self.span.error(exc)
+        self.span.terminar()
+        return False
+
+
+def start_span(name: str, kind: int = SPAN_KIND_INTERNAL, traceparent: Optional[str] = None, **attributes):
+    """Span hijo del actual (o raíz de una traza nueva) sin volverlo el actual; None si no se graba.
+    Quien lo crea llama a terminar()."""
+    if _tracer is None:
+        return None
+    padre = _actual.get()
+    if padre is _NO_MUESTREADO:
+        return None
+    if padre is not None:
+        return Span(name, padre.trace_id, padre.span_id, kind, attributes)
+    remoto = _parse_traceparent(traceparent) if traceparent else None
+    if remoto is not None:
+        trace_id, parent_id, muestreado = remoto
+        if not muestreado:
+            return None
+        return Span(name, trace_id, parent_id, kind, attributes)
+    if _tracer.sample_rate < 1 and random.random() >= _tracer.sample_rate:
+        return None
+    return Span(name, random.getrandbits(128), 0, kind, attributes)
+
+
+def span(name: str, **attributes):
+    """Context manager que mide el bloque como un span hijo del actual.
+    Sin tracer es un nullcontext compartido: lo único que cuesta es la llamada."""
+    if _tracer is None:
+        return _NOOP
+    nuevo = start_span(name, **attributes)
+    return _NOOP if nuevo is None else _Scope(nuevo)
+
+
+def traced(name: str):
+    """Decorador (funciones normales o async): la llamada entera es un span `name`."""
+    def decorar(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def envoltura(*args, **kwargs):
+                if _tracer is None:
+                    return await fn(*args, **kwargs)
+                with span(name):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def envoltura(*args, **kwargs):
+                if _tracer is None:
+                    return fn(*args, **kwargs)
+                with span(name):
+                    return fn(*args, **kwargs)
+        return envoltura
+    return decorar
+
+
+def set_attribute(key: str, value):
+    """Atributo en el span actual (p. ej. el camino de extracción, tokens); no hace nada sin traza."""
+    actual = _actual.get()
+    if actual is not None and actual is not _NO_MUESTREADO:
+        actual.set(key, value)
+
+
+def current_trace_id() -> Optional[str]:
+    actual = _actual.get()
+    return None if actual is None or actual is _NO_MUESTREADO else f"{actual.trace_id:032x}"
+
+
+def traced_iter(nuevo: Optional[Span], chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Para respuestas en streaming: el span termina cuando el generador se agota, se cierra o falla."""
+    if nuevo is None:
+        return iter(chunks)
+    return _traced_iter(nuevo, chunks)
+
+
+def _traced_iter(nuevo: Span, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    try:
+        yield from chunks
+    except BaseException as e:
+        nuevo.error(e)
+        raise
+    finally:
+        nuevo.terminar()
+
+
+def _parse_traceparent(value: str):
+    """`00-<trace_id>-<parent_id>-<flags>` -> (trace_id, parent_id, muestreado), o None si no es válido."""
+    partes = value.strip().split("-")
+    if len(partes) != 4 or len(partes[1]) != 32 or len(partes[2]) != 16 or len(partes[3]) != 2:
+        return None
+    try:
+        trace_id, parent_id, flags = int(partes[1], 16), int(partes[2], 16), int(partes[3], 16)
+    except ValueError:
+        return None
+    if trace_id == 0 or parent_id == 0:
+        return None
+    return trace_id, parent_id, bool(flags & 1)
+
+
+class Tracer:
+    """Cola acotada de spans terminados y un hilo que los exporta en lotes (archivo y/o colector)."""
+
+    def __init__(self, path: Optional[str] = None, endpoint: Optional[str] = None,
+                 service_name: str = "factura-backend", sample_rate: float = 1.0,
+                 max_queue: int = 20000, batch_size: int = 512, interval: float = 1.0):
+        self.path = path
+        self.endpoint = endpoint.rstrip("/") + "/v1/traces" if endpoint else None
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.interval = interval
+        self.resource = {"attributes": [
+            {"key": "service.name", "value": {"stringValue": service_name}},
+            {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+        ]}
+        self.max_queue = max_queue
+        self.stats = {"exportados": 0, "descartados": 0, "errores": 0}
+        # SimpleQueue (en C) en vez de Queue: put sin Condition ni locks en Python
+        self._queue = queue.SimpleQueue()
+        self._cerrar = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tracing-export", daemon=True)
+        self._thread.start()
+
+    def exportar(self, terminado: Span):
+        # Si el destino no da abasto se pierden trazas, no latencia ni memoria
+        if self._queue.qsize() >= self.max_queue:
+            self.stats["descartados"] += 1
+            return
+        self._queue.put(terminado)
+
+    def _run(self):
+        # Despierta cada `interval` y no con cada span: así no compite por el GIL con las peticiones
+        while not self._cerrar.wait(self.interval):
+            self._drenar()
+        self._drenar()
+
+    def _drenar(self):
+        while True:
+            lote = []
+            while len(lote) < self.batch_size:
+                try:
+                    lote.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if lote:
+                self._export(lote)
+            if len(lote) < self.batch_size:
+                return
+
+    def payload(self, lote) -> bytes:
+        return json.dumps({"resourceSpans": [{
+            "resource": self.resource,
+            "scopeSpans": [{"scope": {"name": "factura.tracing"}, "spans": [s.otlp() for s in lote]}],
+        }]}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def _export(self, lote):
+        body = self.payload(lote)
+        try:
+            if self.path:
+                with open(self.path, "ab") as f:
+                    f.write(body + b"\n")
+            if self.endpoint:
+                request = urllib.request.Request(self.endpoint, data=body, method="POST",
+                                                 headers={"Content-Type": "application/json"})
+                with urllib.request.urlopen(request, timeout=5) as response:
+                    response.read()
+            self.stats["exportados"] += len(lote)
+        except Exception as e:
+            self.stats["errores"] += 1
+            print(f"⚠️ No se pudieron exportar {len(lote)} spans: {e}")
+
+    def cerrar(self, timeout: Optional[float] = 5.0):
+        """Exporta lo pendiente y detiene el hilo (al apagar el worker)."""
+        self._cerrar.set()
+        self._thread.join(timeout)
+
+
+def tracer_from_env() -> Optional[Tracer]:
+    """Instala el tracer del proceso si TRACE_FILE u OTEL_EXPORTER_OTLP_ENDPOINT están definidos."""
+    global _tracer
+    path = os.getenv("TRACE_FILE", "")
+    endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+    if not path and not endpoint:
+        return None
+    _tracer = Tracer(path or None, endpoint or None,
+                     service_name=os.getenv("OTEL_SERVICE_NAME", "factura-backend"),
+                     sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "1")))
+    return _tracer
+
+
+class TracingMiddleware:
+    """Middleware ASGI puro: un span SERVER por petición con la ruta (plantilla), el método y el
+    estado; devuelve X-Trace-Id para buscar la traza en el colector."""
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    def _route(self, scope) -> Optional[str]:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", None)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        # Sin ruta conocida el nombre es solo el método: la URL concreta no va en el nombre del span
+        route = self._route(scope)
+        attributes = {"http.request.method": scope["method"]}
+        if route is not None:
+            attributes["http.route"] = route
+        raiz = start_span(f"{scope['method']} {route}" if route else scope["method"], SPAN_KIND_SERVER,
+                          traceparent, **attributes)
+        if raiz is None:
+            token = _actual.set(_NO_MUESTREADO)
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                _actual.reset(token)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                raiz.set("http.response.status_code", status)
+                if status >= 500:
+                    raiz.status = (STATUS_ERROR, f"HTTP {status}")
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", b"%032x" % raiz.trace_id)]
+            await send(message)
+
+        with _Scope(raiz):
+            await self.app(scope, receive, send_with_trace)
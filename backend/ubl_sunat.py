@@ -0,0 +1,339 @@
+"""XML UBL 2.1 para SUNAT (factura y boleta) firmado con XML-DSig, a partir de InvoiceData.
+
+Sin DOM: el documento sale de plantillas (f-strings compiladas con el módulo) que
+escriben directamente la forma canónica C14N 1.0: namespaces solo en la raíz,
+atributos en orden, etiquetas vacías sin abreviar y el escapado de C14N. Así la
+firma enveloped no necesita parsear ni canonicalizar nada:
+- DigestValue = hash de los bytes del elemento raíz con el hueco de la firma vacío
+  (la transformación enveloped quita ds:Signature y deja ext:ExtensionContent vacío);
+- SignedInfo canónico = el mismo texto que se escribe, con los namespaces de la raíz
+  declarados en él (C14N inclusiva de un subconjunto hereda los que están en alcance).
+
+La firma va en ext:UBLExtensions con Id "SignSUNAT" y el certificado en KeyInfo.
+El certificado se configura con UBL_CERT_PATH (PEM con clave y certificado, o .pfx/.p12
+con UBL_CERT_PASSWORD). Para pruebas: generar_certificado_prueba().
+
+Lotes: paquete_sunat() arma el ZIP de envío (<RUC>-<tipo>-<serie>-<número>.zip con el
+XML dentro); /generar-xmls y facturar_lote.py --xml lo hacen en el pool de procesos.
+"""
+import base64
+import hashlib
+import io
+import os
+import re
+import zipfile
+from datetime import date
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from registro_facturas import fecha_iso
+from schemas import InvoiceData
+from totales import IGV_RATE, calcular_items, igv_cents, linea_cents
+
+NS = {
+    "": "urn:oasis:names:specification:ubl:schema:xsd:Invoice-2",
+    "cac": "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
+    "cbc": "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
+    "ds": "http://www.w3.org/2000/09/xmldsig#",
+    "ext": "urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2",
+}
+# C14N: declaraciones ordenadas por prefijo, la del namespace por defecto primero
+NS_DECL = "".join(f' xmlns{":" + p if p else ""}="{uri}"' for p, uri in sorted(NS.items()))
+
+C14N = "http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
+ENVELOPED = "http://www.w3.org/2000/09/xmldsig#enveloped-signature"
+# algoritmo -> (DigestMethod, SignatureMethod)
+ALGORITMOS = {
+    "sha256": ("http://www.w3.org/2001/04/xmlenc#sha256", "http://www.w3.org/2001/04/xmldsig-more#rsa-sha256"),
+    "sha1": ("http://www.w3.org/2000/09/xmldsig#sha1", "http://www.w3.org/2000/09/xmldsig#rsa-sha1"),
+}
+SIGNATURE_ID = "SignSUNAT"
+SLOT = "<!--firma-->"  # marca interna, se reemplaza siempre antes de devolver el XML
+
+# Catálogo 03 de SUNAT (unidades de medida) para las abreviaturas que usa el extractor
+UNIDADES = {
+    "UNI": "NIU", "UND": "NIU", "UNIDAD": "NIU", "NIU": "NIU", "ZZ": "ZZ", "SERVICIO": "ZZ",
+    "CJA": "BX", "CAJA": "BX", "SAC": "BG", "SACO": "BG", "BLS": "BG", "BOLSA": "BG",
+    "GLN": "GLL", "GALON": "GLL", "KG": "KGM", "KGM": "KGM", "KILO": "KGM", "G": "GRM", "GR": "GRM",
+    "LT": "LTR", "L": "LTR", "LTR": "LTR", "M": "MTR", "MT": "MTR", "MTR": "MTR", "M2": "MTK",
+    "M3": "MTQ", "DOC": "DZN", "DOCENA": "DZN", "PAR": "PR", "PQT": "PK", "PAQUETE": "PK",
+    "ROL": "RO", "ROLLO": "RO", "TN": "TNE", "HR": "HUR", "HORA": "HUR",
+}
+MONEDAS = {"SOLES": "PEN", "SOL": "PEN", "PEN": "PEN", "S/": "PEN",
+           "DOLARES": "USD", "DÓLARES": "USD", "DOLAR": "USD", "USD": "USD", "EUROS": "EUR", "EUR": "EUR"}
+IGV_PORCENTAJE = f"{IGV_RATE * 100:g}"
+
+# Escapado de C14N para texto; fuera los caracteres de control que XML 1.0 no admite
+_TEXTO = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", "\r": "&#xD;",
+                        **{chr(c): None for c in range(32) if c not in (9, 10, 13)}})
+_SERIE = re.compile(r"^\s*([A-Z0-9]{4})-0*(\d{1,8})\s*$", re.IGNORECASE)
+
+
+def _t(value) -> str:
+    return str(value).translate(_TEXTO)
+
+
+def _monto(cents: int) -> str:
+    signo, cents = ("-", -cents) if cents < 0 else ("", cents)
+    return f"{signo}{cents // 100}.{cents % 100:02d}"
+
+
+def _numero(value: float) -> str:
+    """Cantidades y precios unitarios: hasta 10 decimales, sin ceros de más (mínimo 2 en precios)."""
+    text = f"{value:.10f}".rstrip("0").rstrip(".")
+    return text if text not in ("", "-0") else "0"
+
+
+def _precio(value: float) -> str:
+    text = _numero(value)
+    entero, _, dec = text.partition(".")
+    return f"{entero}.{dec.ljust(2, '0')}"
+
+
+def tipo_documento(invoice: InvoiceData) -> str:
+    """Catálogo 01: 01 factura, 03 boleta."""
+    if invoice.serie_correlativo.strip().upper().startswith("F") or "factura" in invoice.document_type.lower():
+        return "01"
+    return "03"
+
+
+def serie_numero(invoice: InvoiceData) -> Tuple[str, str]:
+    match = _SERIE.match(invoice.serie_correlativo)
+    if not match:
+        raise ValueError(f"Serie y número no válidos para SUNAT: {invoice.serie_correlativo!r}")
+    return match.group(1).upper(), match.group(2)
+
+
+def nombre_archivo(invoice: InvoiceData) -> str:
+    """<RUC>-<tipo>-<serie>-<número>, el nombre que SUNAT espera para el XML y su ZIP."""
+    serie, numero = serie_numero(invoice)
+    return f"{invoice.emisor_ruc}-{tipo_documento(invoice)}-{serie}-{numero}"
+
+
+def xml_filename(index: int, invoice: InvoiceData) -> str:
+    """Nombre en un lote; si la serie no es válida, el error del documento se reporta con este."""
+    try:
+        return nombre_archivo(invoice)
+    except ValueError:
+        return f"Doc_{index:05d}"
+
+
+def _tipo_doc_cliente(documento: str) -> str:
+    """Catálogo 06: 6 RUC, 1 DNI, 0 sin documento."""
+    documento = documento.strip()
+    if documento.isdigit() and len(documento) == 11:
+        return "6"
+    if documento.isdigit() and len(documento) == 8:
+        return "1"
+    return "0"
+
+
+@lru_cache(maxsize=4096)
+def _con_igv(precio: float) -> str:
+    """Precio unitario con IGV (PriceTypeCode 01); los precios se repiten mucho entre documentos."""
+    return _monto(linea_cents(precio, 1 + IGV_RATE))
+
+
+def _impuesto(moneda: str, base: str, igv: str, linea: bool) -> str:
+    categoria = (f"<cbc:Percent>{IGV_PORCENTAJE}</cbc:Percent>"
+                 f"<cbc:TaxExemptionReasonCode>10</cbc:TaxExemptionReasonCode>") if linea else ""
+    return (
+        f'<cac:TaxTotal><cbc:TaxAmount currencyID="{moneda}">{igv}</cbc:TaxAmount>'
+        f'<cac:TaxSubtotal><cbc:TaxableAmount currencyID="{moneda}">{base}</cbc:TaxableAmount>'
+        f'<cbc:TaxAmount currencyID="{moneda}">{igv}</cbc:TaxAmount>'
+        f"<cac:TaxCategory>{categoria}<cac:TaxScheme><cbc:ID>1000</cbc:ID><cbc:Name>IGV</cbc:Name>"
+        f"<cbc:TaxTypeCode>VAT</cbc:TaxTypeCode></cac:TaxScheme></cac:TaxCategory></cac:TaxSubtotal></cac:TaxTotal>"
+    )
+
+
+def _documento(invoice: InvoiceData, hoy: Optional[date] = None) -> str:
+    """El elemento raíz en forma canónica, con SLOT donde va ds:Signature."""
+    moneda = MONEDAS.get(invoice.moneda.strip().upper(), "PEN")
+    serie, numero = serie_numero(invoice)
+    emision = fecha_iso(invoice.fecha_emision, hoy or date.today())
+    vencimiento = fecha_iso(invoice.fecha_vencimiento)
+    totales = calcular_items(invoice.items)
+    credito = invoice.forma_pago.strip().lower().startswith("cr")
+    ruc, emisor = _t(invoice.emisor_ruc), _t(invoice.emisor_nombre)
+
+    partes = [
+        f"<Invoice{NS_DECL}><ext:UBLExtensions><ext:UBLExtension><ext:ExtensionContent>{SLOT}"
+        f"</ext:ExtensionContent></ext:UBLExtension></ext:UBLExtensions>"
+        f"<cbc:UBLVersionID>2.1</cbc:UBLVersionID><cbc:CustomizationID>2.0</cbc:CustomizationID>"
+        f"<cbc:ID>{serie}-{numero}</cbc:ID><cbc:IssueDate>{emision}</cbc:IssueDate>",
+        f"<cbc:DueDate>{vencimiento}</cbc:DueDate>" if vencimiento and vencimiento != emision else "",
+        f'<cbc:InvoiceTypeCode listID="0101">{tipo_documento(invoice)}</cbc:InvoiceTypeCode>'
+        f'<cbc:Note languageLocaleID="1000">{_t(invoice.monto_letras)}</cbc:Note>'
+        f"<cbc:DocumentCurrencyCode>{moneda}</cbc:DocumentCurrencyCode>"
+        f"<cac:Signature><cbc:ID>{ruc}</cbc:ID><cac:SignatoryParty><cac:PartyIdentification>"
+        f"<cbc:ID>{ruc}</cbc:ID></cac:PartyIdentification><cac:PartyName><cbc:Name>{emisor}</cbc:Name>"
+        f"</cac:PartyName></cac:SignatoryParty><cac:DigitalSignatureAttachment><cac:ExternalReference>"
+        f"<cbc:URI>#{SIGNATURE_ID}</cbc:URI></cac:ExternalReference></cac:DigitalSignatureAttachment></cac:Signature>"
+        f'<cac:AccountingSupplierParty><cac:Party><cac:PartyIdentification><cbc:ID schemeID="6">{ruc}</cbc:ID>'
+        f"</cac:PartyIdentification><cac:PartyName><cbc:Name>{emisor}</cbc:Name></cac:PartyName>"
+        f"<cac:PartyLegalEntity><cbc:RegistrationName>{emisor}</cbc:RegistrationName><cac:RegistrationAddress>"
+        f"<cbc:AddressTypeCode>0000</cbc:AddressTypeCode><cac:AddressLine><cbc:Line>{_t(invoice.emisor_direccion)}"
+        f"</cbc:Line></cac:AddressLine></cac:RegistrationAddress></cac:PartyLegalEntity></cac:Party>"
+        f"</cac:AccountingSupplierParty>"
+        f"<cac:AccountingCustomerParty><cac:Party><cac:PartyIdentification>"
+        f'<cbc:ID schemeID="{_tipo_doc_cliente(invoice.client_ruc_dni)}">{_t(invoice.client_ruc_dni)}</cbc:ID>'
+        f"</cac:PartyIdentification><cac:PartyLegalEntity><cbc:RegistrationName>{_t(invoice.client)}"
+        f"</cbc:RegistrationName><cac:RegistrationAddress><cac:AddressLine><cbc:Line>{_t(invoice.client_address)}"
+        f"</cbc:Line></cac:AddressLine></cac:RegistrationAddress></cac:PartyLegalEntity></cac:Party>"
+        f"</cac:AccountingCustomerParty>",
+    ]
+    total = _monto(totales.total_cents)
+    if credito:
+        partes.append(
+            f"<cac:PaymentTerms><cbc:ID>FormaPago</cbc:ID><cbc:PaymentMeansID>Credito</cbc:PaymentMeansID>"
+            f'<cbc:Amount currencyID="{moneda}">{total}</cbc:Amount></cac:PaymentTerms>'
+            f"<cac:PaymentTerms><cbc:ID>FormaPago</cbc:ID><cbc:PaymentMeansID>Cuota001</cbc:PaymentMeansID>"
+            f'<cbc:Amount currencyID="{moneda}">{total}</cbc:Amount>'
+            f"<cbc:PaymentDueDate>{vencimiento or emision}</cbc:PaymentDueDate></cac:PaymentTerms>"
+        )
+    else:
+        partes.append("<cac:PaymentTerms><cbc:ID>FormaPago</cbc:ID><cbc:PaymentMeansID>Contado</cbc:PaymentMeansID>"
+                      "</cac:PaymentTerms>")
+    partes.append(_impuesto(moneda, _monto(totales.subtotal_cents), _monto(totales.igv_cents), linea=False))
+    partes.append(
+        f'<cac:LegalMonetaryTotal><cbc:LineExtensionAmount currencyID="{moneda}">{_monto(totales.subtotal_cents)}'
+        f'</cbc:LineExtensionAmount><cbc:TaxInclusiveAmount currencyID="{moneda}">{total}</cbc:TaxInclusiveAmount>'
+        f'<cbc:PayableAmount currencyID="{moneda}">{total}</cbc:PayableAmount></cac:LegalMonetaryTotal>'
+    )
+    for i, item in enumerate(invoice.items):
+        cents = int(totales.lineas_cents[i])
+        base = _monto(cents)
+        unidad = UNIDADES.get(item.unidad_medida.strip().upper(), "NIU")
+        partes.append(
+            f"<cac:InvoiceLine><cbc:ID>{i + 1}</cbc:ID>"
+            f'<cbc:InvoicedQuantity unitCode="{unidad}">{_numero(item.cantidad)}</cbc:InvoicedQuantity>'
+            f'<cbc:LineExtensionAmount currencyID="{moneda}">{base}</cbc:LineExtensionAmount>'
+            f'<cac:PricingReference><cac:AlternativeConditionPrice><cbc:PriceAmount currencyID="{moneda}">'
+            f"{_con_igv(item.precio_unitario)}</cbc:PriceAmount><cbc:PriceTypeCode>01</cbc:PriceTypeCode>"
+            f"</cac:AlternativeConditionPrice></cac:PricingReference>"
+            f"{_impuesto(moneda, base, _monto(igv_cents(cents)), linea=True)}"
+            f"<cac:Item><cbc:Description>{_t(item.descripcion)}</cbc:Description></cac:Item>"
+            f'<cac:Price><cbc:PriceAmount currencyID="{moneda}">{_precio(item.precio_unitario)}</cbc:PriceAmount>'
+            f"</cac:Price></cac:InvoiceLine>"
+        )
+    partes.append("</Invoice>")
+    return "".join(partes)
+
+
+class Firmante:
+    """Clave privada RSA y certificado X.509 para la firma enveloped."""
+
+    def __init__(self, private_key, certificate, algoritmo: str = "sha256"):
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        if algoritmo not in ALGORITMOS:
+            raise ValueError(f"Algoritmo de firma no soportado: {algoritmo} ({', '.join(ALGORITMOS)})")
+        self.private_key = private_key
+        self.certificate = certificate
+        self.algoritmo = algoritmo
+        self._hash = hashes.SHA256() if algoritmo == "sha256" else hashes.SHA1()
+        self._padding = padding.PKCS1v15()
+        self.certificado_b64 = base64.b64encode(certificate.public_bytes(serialization.Encoding.DER)).decode("ascii")
+        digest_uri, signature_uri = ALGORITMOS[algoritmo]
+        self._signed_info = (
+            f'<ds:CanonicalizationMethod Algorithm="{C14N}"></ds:CanonicalizationMethod>'
+            f'<ds:SignatureMethod Algorithm="{signature_uri}"></ds:SignatureMethod>'
+            f'<ds:Reference URI=""><ds:Transforms><ds:Transform Algorithm="{ENVELOPED}"></ds:Transform>'
+            f'</ds:Transforms><ds:DigestMethod Algorithm="{digest_uri}"></ds:DigestMethod><ds:DigestValue>'
+        )
+
+    @classmethod
+    def desde_archivo(cls, path: str, password: Optional[str] = None, algoritmo: str = "sha256") -> "Firmante":
+        from cryptography import x509
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key, pkcs12
+
+        with open(path, "rb") as f:
+            data = f.read()
+        secret = password.encode("utf-8") if password else None
+        if path.lower().endswith((".pfx", ".p12")):
+            key, cert, _ = pkcs12.load_key_and_certificates(data, secret)
+        else:
+            key, cert = load_pem_private_key(data, secret), x509.load_pem_x509_certificate(data)
+        return cls(key, cert, algoritmo)
+
+    def firma(self, raiz: str) -> str:
+        """ds:Signature para el documento (elemento raíz con SLOT)."""
+        sin_firma = raiz.replace(SLOT, "", 1).encode("utf-8")
+        digest = base64.b64encode(hashlib.new(self.algoritmo, sin_firma).digest()).decode("ascii")
+        signed_info = f"{self._signed_info}{digest}</ds:DigestValue></ds:Reference>"
+        canonico = f"<ds:SignedInfo{NS_DECL}>{signed_info}</ds:SignedInfo>".encode("utf-8")
+        valor = base64.b64encode(self.private_key.sign(canonico, self._padding, self._hash)).decode("ascii")
+        return (
+            f'<ds:Signature Id="{SIGNATURE_ID}"><ds:SignedInfo>{signed_info}</ds:SignedInfo>'
+            f"<ds:SignatureValue>{valor}</ds:SignatureValue><ds:KeyInfo><ds:X509Data>"
+            f"<ds:X509Certificate>{self.certificado_b64}</ds:X509Certificate></ds:X509Data></ds:KeyInfo>"
+            f"</ds:Signature>"
+        )
+
+
+def generar_xml(invoice: InvoiceData, firmante: Optional[Firmante] = None, hoy: Optional[date] = None) -> bytes:
+    """XML UBL 2.1 del documento; sin firmante queda con ext:ExtensionContent vacío."""
+    raiz = _documento(invoice, hoy)
+    firma = firmante.firma(raiz) if firmante is not None else ""
+    return b'<?xml version="1.0" encoding="UTF-8"?>\n' + raiz.replace(SLOT, firma, 1).encode("utf-8")
+
+
+def paquete_sunat(nombre: str, xml: bytes) -> bytes:
+    """ZIP de envío a SUNAT: <nombre>.zip con <nombre>.xml dentro."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(f"{nombre}.xml", xml)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=1)
+def firmante_from_env() -> Optional[Firmante]:
+    """UBL_CERT_PATH vacío: sin firma (los endpoints de XML responden 404)."""
+    path = os.getenv("UBL_CERT_PATH", "")
+    if not path:
+        return None
+    return Firmante.desde_archivo(path, os.getenv("UBL_CERT_PASSWORD") or None,
+                                  os.getenv("UBL_FIRMA_ALGORITMO", "sha256"))
+
+
+def xml_entries(nombre: str, data: dict) -> List[Tuple[str, bytes]]:
+    """Punto de entrada para los procesos del pool: XML firmado y su ZIP de envío.
+    Cada proceso carga el certificado una vez (UBL_CERT_PATH)."""
+    xml = generar_xml(InvoiceData(**data), firmante_from_env())
+    return [(f"xml/{nombre}.xml", xml), (f"sunat/{nombre}.zip", paquete_sunat(nombre, xml))]
+
+
+def escribir_xml(data: dict, carpeta: str) -> str:
+    """Para facturar_lote.py, en el pool: escribe xml/<nombre>.xml y sunat/<nombre>.zip bajo carpeta."""
+    nombre = nombre_archivo(InvoiceData(**data))
+    for ruta, contenido in xml_entries(nombre, data):
+        destino = os.path.join(carpeta, ruta)
+        tmp = f"{destino}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(contenido)
+        os.replace(tmp, destino)
+    return nombre
+
+
+def generar_certificado_prueba(path: str, ruc: str = "20000000001", dias: int = 365) -> str:
+    """Certificado autofirmado RSA-2048 (PEM con clave y certificado) para pruebas y benchmarks."""
+    from datetime import datetime, timedelta, timezone
+
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, f"PRUEBA {ruc}"),
+                      x509.NameAttribute(NameOID.COUNTRY_NAME, "PE")])
+    now = datetime.now(timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now - timedelta(days=1))
+            .not_valid_after(now + timedelta(days=dias)).sign(key, hashes.SHA256()))
+    with open(path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    return path
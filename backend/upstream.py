@@ -0,0 +1,166 @@
+"""Control de las llamadas a Gemini: coalescencia, limitador adaptativo y reintentos.
+
+- SingleFlight: pedidos idénticos que llegan a la vez (la misma plantilla enviada
+  por varias cajas) comparten una sola llamada en vuelo. Si todos los que
+  esperan se van (cliente desconectado), la llamada se cancela.
+- AdaptiveRateLimiter: token bucket por proceso. Ante un 429/5xx reduce el ritmo
+  a la mitad (como mucho una vez por segundo) y vacía el bucket; cada respuesta
+  correcta lo sube un poco, hasta GEMINI_RATE_MAX. Así converge a la cuota real.
+- backoff: espera exponencial con jitter completo entre reintentos.
+
+Los errores del SDK se reconocen por su atributo `code` (google.api_core) o
+`status_code`, sin importar el SDK aquí.
+"""
+import asyncio
+import os
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from metrics import COALESCED, LLM_RATE
+
+RETRYABLE = frozenset({429, 500, 502, 503, 504})
+
+
+class UpstreamError(Exception):
+    """Gemini siguió respondiendo 429/5xx después de todos los reintentos."""
+
+    def __init__(self, status: int, retry_after: Optional[float], detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def upstream_status(exc: BaseException) -> Optional[int]:
+    """Código HTTP de un error del SDK (o del modelo falso), None si no lo trae."""
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return int(value)
+    return None
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    value = getattr(exc, "retry_after", None)
+    return float(value) if value else None
+
+
+def backoff(intento: int, base: float, tope: float, rng=random) -> float:
+    """Espera antes del reintento `intento` (0, 1, ...): uniforme en [0, min(tope, base·2^intento)]."""
+    return rng.uniform(0, min(tope, base * 2 ** intento))
+
+
+class SingleFlight:
+    def __init__(self):
+        # clave -> [tarea, nº de llamadores esperando]
+        self._inflight: Dict[str, list] = {}
+        self.stats = {"llamadas": 0, "compartidas": 0}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable]):
+        entry = self._inflight.get(key)
+        # Una tarea cancelada no se comparte: quien llega después hace su propia llamada
+        if entry is None or entry[0].cancelled():
+            entry = [asyncio.ensure_future(factory()), 0]
+            self._inflight[key] = entry
+
+            def _done(_, entry=entry):
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+
+            entry[0].add_done_callback(_done)
+            self.stats["llamadas"] += 1
+        else:
+            self.stats["compartidas"] += 1
+            COALESCED.inc()
+        entry[1] += 1
+        try:
+            # shield: cancelar a un llamador no cancela la llamada de los demás
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                # La tarea recién termina de cancelarse en la próxima vuelta del loop: la entrada
+                # sale ya, para que nadie se sume a ella en ese intervalo
+                entry[0].cancel()
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+
+    def __len__(self):
+        return len(self._inflight)
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, rate: float, burst: Optional[float] = None, max_rate: Optional[float] = None,
+                 min_rate: float = 0.1, factor: float = 0.5, step: Optional[float] = None):
+        self.enabled = rate > 0
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.max_rate = max_rate or rate
+        self.min_rate = min(min_rate, rate) if self.enabled else 0
+        self.factor = factor
+        # Subida por respuesta correcta: recuperar la cuota completa en ~200 llamadas
+        self.step = step if step is not None else self.max_rate / 200
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._pause_until = 0.0
+        self._last_decrease = 0.0
+        self.stats = {"adquiridos": 0, "esperas": 0, "segundos_espera": 0.0, "reducciones": 0, "rechazos": 0}
+        LLM_RATE.set(rate)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self) -> float:
+        """Espera un token; devuelve los segundos esperados."""
+        if not self.enabled:
+            return 0.0
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._pause_until:
+                wait = self._pause_until - now
+            elif self._tokens >= 1:
+                self._tokens -= 1
+                self.stats["adquiridos"] += 1
+                if waited:
+                    self.stats["esperas"] += 1
+                    self.stats["segundos_espera"] += waited
+                return waited
+            else:
+                wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def on_success(self):
+        if self.enabled and self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.step)
+            LLM_RATE.set(self.rate)
+
+    def on_throttle(self, pausa: Optional[float] = None):
+        """429/5xx: menos ritmo, bucket vacío y, si el servidor lo indica, pausa total."""
+        self.stats["rechazos"] += 1
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens = 0.0
+        if pausa:
+            self._pause_until = max(self._pause_until, now + pausa)
+        # Muchas llamadas en vuelo reciben el mismo 429: se reduce una vez por segundo
+        if now - self._last_decrease >= 1.0:
+            self._last_decrease = now
+            self.rate = max(self.min_rate, self.rate * self.factor)
+            self.stats["reducciones"] += 1
+            LLM_RATE.set(self.rate)
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, ritmo=round(self.rate, 3), ritmo_max=self.max_rate, tokens=round(self._tokens, 2))
+
+
+def limiter_from_env() -> AdaptiveRateLimiter:
+    rate = float(os.getenv("GEMINI_RATE", "10"))
+    max_rate = float(os.getenv("GEMINI_RATE_MAX", str(rate * 4)))
+    burst = float(os.getenv("GEMINI_BURST", str(max(1.0, rate))))
+    return AdaptiveRateLimiter(rate, burst=burst, max_rate=max_rate)
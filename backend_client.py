@@ -0,0 +1,148 @@
+"""HTTP client for the FastAPI backend, shared by the Streamlit apps.
+
+The apps no longer call Gemini or render PDFs themselves: extraction, totals and
+the PDF come from the backend (backend/main.py). One pooled keep-alive session
+per backend URL lives in st.cache_resource, and extraction results and PDFs are
+memoized with st.cache_data keyed by their input, so a rerun after a widget
+click makes no request and a new order makes exactly one extraction.
+
+Extraction returns a draft with a provisional number. Issuing it (the definitive
+SUNAT number and the backend's registry) is never cached, since st.cache_data is
+shared by every session: the apps call issue_invoice once per order and keep the
+result in st.session_state.
+"""
+import json
+import os
+import queue
+import threading
+from typing import Callable, Optional
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+BACKEND_URL = os.getenv("FACTURA_API_URL", "http://localhost:8000")
+
+
+class BackendError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(f"{status}: {detail}")
+        self.status = status
+        self.detail = detail
+
+
+def _raise_for_status(response: requests.Response):
+    if response.ok:
+        return
+    try:
+        detail = response.json().get("detail", response.text)
+    except ValueError:
+        detail = response.text
+    raise BackendError(response.status_code, str(detail))
+
+
+class BackendClient:
+    def __init__(self, base_url: str, pool_size: int = 16, timeout: float = 120.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (5.0, timeout)  # (connect, read)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Flips to False once if the backend has no /procesar-factura/stream
+        self.streaming = True
+
+    def extract(self, text: str, on_event: Optional[Callable[[str, dict], None]] = None) -> dict:
+        """Validated InvoiceData (as a dict) for an order text.
+        With streaming, on_event receives the provisional `campo` / `item` events."""
+        if self.streaming:
+            try:
+                return self._extract_stream(text, on_event)
+            except BackendError as e:
+                if e.status not in (404, 405):
+                    raise
+                self.streaming = False
+        response = self.session.post(f"{self.base_url}/procesar-factura",
+                                     json={"texto_factura": text}, timeout=self.timeout)
+        _raise_for_status(response)
+        return response.json()
+
+    def _extract_stream(self, text: str, on_event) -> dict:
+        with self.session.post(f"{self.base_url}/procesar-factura/stream", json={"texto_factura": text},
+                               stream=True, timeout=self.timeout) as response:
+            _raise_for_status(response)
+            event, data = None, []
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data.append(line[len("data: "):])
+                elif not line and event is not None:
+                    payload = json.loads("\n".join(data))
+                    if event == "factura":
+                        return payload
+                    if event == "error":
+                        raise BackendError(payload.get("status", 500), payload.get("detail", ""))
+                    if on_event is not None:
+                        on_event(event, payload)
+                    event, data = None, []
+        raise BackendError(502, "The stream ended without an invoice")
+
+    def issue(self, invoice: dict) -> dict:
+        """Issues a draft: every call takes the next number of its series."""
+        response = self.session.post(f"{self.base_url}/emitir", json=invoice, timeout=self.timeout)
+        _raise_for_status(response)
+        return response.json()
+
+    def render_pdf(self, invoice: dict) -> bytes:
+        response = self.session.post(f"{self.base_url}/generar-pdf", json=invoice, timeout=self.timeout)
+        _raise_for_status(response)
+        return response.content
+
+
+@st.cache_resource
+def get_backend(base_url: str = BACKEND_URL) -> BackendClient:
+    return BackendClient(base_url)
+
+
+# Arguments starting with "_" are not part of the cache key
+@st.cache_data(max_entries=256, ttl=3600, show_spinner=False)
+def extract_invoice(text: str, base_url: str = BACKEND_URL, _on_event=None) -> dict:
+    return get_backend(base_url).extract(text, _on_event)
+
+
+def issue_invoice(invoice: dict, base_url: str = BACKEND_URL) -> dict:
+    """Not memoized on purpose: see the module docstring."""
+    return get_backend(base_url).issue(invoice)
+
+
+@st.cache_data(max_entries=128, ttl=3600, show_spinner=False)
+def render_pdf(invoice: dict, base_url: str = BACKEND_URL) -> bytes:
+    return get_backend(base_url).render_pdf(invoice)
+
+
+def extract_invoice_live(text: str, on_event: Callable[[str, dict], None], base_url: str = BACKEND_URL) -> dict:
+    """extract_invoice with a live preview: on a cache miss the stream runs in a worker
+    thread and on_event is called here, on the script thread, as events arrive.
+    Cached functions must not touch st elements created outside them, hence the queue."""
+    events = queue.SimpleQueue()
+    outcome = {}
+
+    def run():
+        try:
+            outcome["invoice"] = extract_invoice(text, base_url, _on_event=lambda *e: events.put(e))
+        except Exception as e:
+            outcome["error"] = e
+        finally:
+            events.put(None)
+
+    worker = threading.Thread(target=run, daemon=True)
+    add_script_run_ctx(worker, get_script_run_ctx())
+    worker.start()
+    while (event := events.get()) is not None:
+        on_event(*event)
+    worker.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["invoice"]
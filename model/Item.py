@@ -1,9 +1,33 @@
+from array import array
 from dataclasses import dataclass, asdict
-from typing import Union, List, Any, Dict
+from functools import lru_cache
+from typing import Union, List, Any, Dict, Iterable, Iterator
 import json
 
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
+
+
+def _loads(payload: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(payload)
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        payload = bytes(payload).decode()
+    return json.loads(payload)
+
+
+def _dumps(data: Any) -> str:
+    # Always the stdlib encoder: orjson writes compact JSON (no space after ":" and ","),
+    # which would change the output of to_json
+    return json.dumps(data, ensure_ascii=False)
+
+
 @dataclass
 class Item:
+    __slots__ = ("description", "quantity", "price")
+
     description: str
     quantity: int
     price: float
@@ -12,22 +36,108 @@ class Item:
         return asdict(self)
 
     def to_json(self) -> str:
-        return json.dumps(self.to_dict(), ensure_ascii=False)
+        return _dumps(self.to_dict())
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Item":
         return cls(
-            description=str(data.get("description", "")),
-            quantity=int(data.get("quantity", 0)),
-            price=float(data.get("price", 0.0)),
+            str(data.get("description", "")),
+            int(data.get("quantity", 0)),
+            float(data.get("price", 0.0)),
         )
 
     @classmethod
     def from_json(cls, payload: Union[str, bytes]) -> "Item":
-        if isinstance(payload, (bytes, bytearray)):
-            payload = payload.decode()
-        data = json.loads(payload)
-        return cls.from_dict(data)
+        return cls.from_dict(_loads(payload))
+
+
+class ItemBatch:
+    """
+    Columnar container for many items: descriptions in a list, quantities and
+    prices in compact typed arrays (8 bytes per value, no per-item objects).
+    The arrays expose the buffer protocol, so numpy.asarray(batch.prices)
+    does not copy.
+    """
+    __slots__ = ("descriptions", "quantities", "prices")
+
+    def __init__(self, descriptions: List[str] = None, quantities: Iterable[int] = (), prices: Iterable[float] = ()):
+        self.descriptions = descriptions if descriptions is not None else []
+        self.quantities = quantities if isinstance(quantities, array) else array("q", quantities)
+        self.prices = prices if isinstance(prices, array) else array("d", prices)
+        if not len(self.descriptions) == len(self.quantities) == len(self.prices):
+            raise ValueError("ItemBatch columns must have the same length")
+
+    def __len__(self) -> int:
+        return len(self.descriptions)
+
+    def __getitem__(self, i: int) -> Item:
+        return Item(self.descriptions[i], self.quantities[i], self.prices[i])
+
+    def __iter__(self) -> Iterator[Item]:
+        return map(Item, self.descriptions, self.quantities, self.prices)
+
+    def append(self, item: Item) -> None:
+        self.descriptions.append(item.description)
+        self.quantities.append(item.quantity)
+        self.prices.append(item.price)
+
+    @classmethod
+    def from_items(cls, items: Iterable[Item]) -> "ItemBatch":
+        batch = cls()
+        for item in items:
+            batch.append(item)
+        return batch
+
+    @classmethod
+    def from_dicts(cls, data: List[Dict[str, Any]]) -> "ItemBatch":
+        """Fill the columns straight from decoded JSON objects, one pass per column."""
+        return cls(
+            [str(d.get("description", "")) for d in data],
+            array("q", [int(d.get("quantity", 0)) for d in data]),
+            array("d", [float(d.get("price", 0.0)) for d in data]),
+        )
+
+    @classmethod
+    def from_json(cls, payload: Union[str, bytes]) -> "ItemBatch":
+        data = _loads(payload)
+        if isinstance(data, dict):
+            data = [data]
+        if not isinstance(data, list):
+            raise ValueError("JSON must be an object or array of objects")
+        return cls.from_dicts(data)
+
+    def to_items(self) -> List[Item]:
+        return list(self)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [
+            {"description": d, "quantity": q, "price": p}
+            for d, q, p in zip(self.descriptions, self.quantities, self.prices)
+        ]
+
+    def to_json(self) -> str:
+        return _dumps(self.to_dicts())
+
+    def to_pydantic(self, model_cls, unidad_medida: str = "UNI") -> list:
+        """
+        Convert to the backend Pydantic Item (schemas.Item: descripcion, cantidad,
+        unidad_medida, precio_unitario). This is a conversion, not a view: it builds
+        one dict per item and one model per item, validated in a single
+        pydantic-core call (faster than model_construct per item). Only the
+        description strings are reused rather than duplicated.
+        """
+        rows = [
+            {"descripcion": d, "cantidad": q, "unidad_medida": unidad_medida, "precio_unitario": p}
+            for d, q, p in zip(self.descriptions, self.quantities, self.prices)
+        ]
+        return _list_adapter(model_cls).validate_python(rows)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model_cls):
+    from pydantic import TypeAdapter
+    return TypeAdapter(List[model_cls])
+
 
 def items_from_json(payload: Union[str, bytes]) -> List[Item]:
     """
@@ -35,11 +145,14 @@ def items_from_json(payload: Union[str, bytes]) -> List[Item]:
     - If JSON is an object, returns a list with one Item.
     - If JSON is a list, returns the list of Items.
     """
-    if isinstance(payload, (bytes, bytearray)):
-        payload = payload.decode()
-    data = json.loads(payload)
+    data = _loads(payload)
     if isinstance(data, list):
         return [Item.from_dict(d) for d in data]
     if isinstance(data, dict):
         return [Item.from_dict(data)]
-    raise ValueError("JSON must be an object or array of objects")
\ No newline at end of file
+    raise ValueError("JSON must be an object or array of objects")
+
+
+def batch_from_json(payload: Union[str, bytes]) -> ItemBatch:
+    """Like items_from_json, but decodes into a columnar ItemBatch."""
+    return ItemBatch.from_json(payload)